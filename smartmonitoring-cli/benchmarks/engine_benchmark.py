@@ -0,0 +1,179 @@
+"""
+Compares the docker-py and the asyncio docker backend against a local stub engine. The stub answers the endpoints of
+the status dashboard and the image checks, stats requests are delayed like on a real engine, which samples twice.
+Run from the smartmonitoring-cli directory with:
+python -m benchmarks.engine_benchmark --containers 3 --images 3 --runs 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import smartmonitoring_cli.const_settings as cs
+from smartmonitoring_cli.models.update_manifest import ContainerConfig
+
+
+class StubEngine:
+    def __init__(self, socket_path: str, containers: int, stats_delay: float):
+        """
+        Minimal docker engine that serves a fixed set of running containers and images over a unix socket
+        :param socket_path: Path of the unix socket to listen on
+        :param containers: Number of containers the engine reports
+        :param stats_delay: Time in seconds each stats request takes
+        """
+        self.socket_path = socket_path
+        self.names = [f'bench-{i}' for i in range(containers)]
+        self.stats_delay = stats_delay
+        self.requests = 0
+        self.__loop = asyncio.new_event_loop()
+        self.__started = threading.Event()
+
+    def start(self) -> None:
+        """Serves the engine api on a background thread"""
+        threading.Thread(target=self.__serve, daemon=True, name="stub-engine").start()
+        self.__started.wait()
+
+    def __serve(self) -> None:
+        asyncio.set_event_loop(self.__loop)
+        self.__loop.run_until_complete(asyncio.start_unix_server(self.__handle, path=self.socket_path))
+        self.__started.set()
+        self.__loop.run_forever()
+
+    async def __handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Answers the requests of a connection, keep-alive connections of docker-py are supported
+        :param reader: Reader of the connection
+        :param writer: Writer of the connection
+        """
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, target, _ = request_line.decode("ascii").split(" ", 2)
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if int(headers.get("content-length", 0)):
+                await reader.readexactly(int(headers["content-length"]))
+            self.requests += 1
+            status, content_type, body = await self.__route(method, re.sub(r'^/v[0-9.]+', '', urlsplit(target).path))
+            writer.write(f'HTTP/1.1 {status} -\r\nContent-Type: {content_type}\r\n'
+                         f'Content-Length: {len(body)}\r\n\r\n'.encode("ascii") + body)
+            await writer.drain()
+            if headers.get("connection", "").lower() == "close":
+                break
+        writer.close()
+
+    async def __route(self, method: str, path: str) -> tuple[int, str, bytes]:
+        """
+        Composes the response of an endpoint
+        :param method: HTTP method
+        :param path: Path of the endpoint without api version
+        :return: Status code, content type and body
+        """
+        if path == "/_ping":
+            return 200, "text/plain", b"OK"
+        if path == "/version":
+            return self.__json({"ApiVersion": cs.DOCKER_ENGINE_API_VERSION, "MinAPIVersion": "1.12",
+                                "Version": "stub"})
+        if path == "/containers/json":
+            return self.__json([{"Id": name, "Names": [f'/{name}'], "State": "running", "Status": "Up",
+                                 "Labels": {cs.CONTAINER_LABEL_STACK: cs.CONTAINER_STACK_NAME}}
+                                for name in self.names])
+        match = re.fullmatch(r'/containers/([^/]+)/(json|stats)', path)
+        if match is not None and match.group(1) in self.names:
+            name, endpoint = match.groups()
+            if endpoint == "json":
+                return self.__json({"Id": name, "Name": f'/{name}', "State": {"Status": "running", "Running": True},
+                                    "Config": {"Labels": {}}})
+            await asyncio.sleep(self.stats_delay)
+            return self.__json({
+                "memory_stats": {"usage": 64 * 1024 * 1024},
+                "cpu_stats": {"cpu_usage": {"total_usage": 2000}, "system_cpu_usage": 20000, "online_cpus": 2},
+                "precpu_stats": {"cpu_usage": {"total_usage": 1000}, "system_cpu_usage": 10000}
+            })
+        match = re.fullmatch(r'/images/(.+)/json', path)
+        if match is not None:
+            return self.__json({"Id": f'sha256:{match.group(1)}', "RepoTags": [match.group(1)]})
+        return 404, "application/json", json.dumps({"message": f'{method} {path} not found'}).encode("utf-8")
+
+    def __json(self, body) -> tuple[int, str, bytes]:
+        return 200, "application/json", json.dumps(body).encode("utf-8")
+
+
+def measure_import_time(module: str, attempts: int = 3) -> float:
+    """
+    Measures the time a fresh interpreter needs to import a module
+    :param module: Name of the module
+    :param attempts: Number of measurements, the fastest is returned
+    :return: Time in seconds
+    """
+    timings = []
+    for _ in range(attempts):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f'import {module}'], check=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_benchmark(containers: int, images: int, stats_delay: float, runs: int) -> dict:
+    """
+    Runs the container snapshot, container stats and image checks with both backends against a stub engine
+    :param containers: Number of containers
+    :param images: Number of images
+    :param stats_delay: Time in seconds each stats request of the stub engine takes
+    :param runs: Number of runs per backend
+    :return: Dict with the backend as key and the average seconds per run and engine requests as value
+    """
+    import docker
+    from smartmonitoring_cli.handlers.docker_handler import DockerHandler
+
+    socket_path = os.path.join(tempfile.mkdtemp(), "engine.sock")
+    engine = StubEngine(socket_path, containers, stats_delay)
+    engine.start()
+    os.environ["DOCKER_HOST"] = f'unix://{socket_path}'
+    conf_containers = [ContainerConfig(name, "bench", f'bench/image-{i % images}:1.0', False, None)
+                       for i, name in enumerate(engine.names)]
+
+    results = {}
+    for backend in ("docker-py", "asyncio"):
+        client = docker.DockerClient(base_url=f'unix://{socket_path}', version=cs.DOCKER_ENGINE_API_VERSION)
+        dock = DockerHandler(client, backend=backend)
+        requests_before = engine.requests
+        start = time.perf_counter()
+        for _ in range(runs):
+            dock.invalidate_snapshot()
+            dock.get_containers_stats(conf_containers)
+            dock.get_missing_images(conf_containers)
+        results[backend] = {"seconds": (time.perf_counter() - start) / runs,
+                            "requests": (engine.requests - requests_before) / runs}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compares the docker-py and the asyncio docker backend")
+    parser.add_argument("--containers", type=int, default=3, help="Number of containers of the stub engine")
+    parser.add_argument("--images", type=int, default=3, help="Number of images that are checked")
+    parser.add_argument("--stats-delay", type=float, default=0.5, help="Seconds each stats request takes")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs per backend")
+    args = parser.parse_args()
+
+    print(f'{"Import":<45}{"Seconds":>12}')
+    for module in ("docker", "smartmonitoring_cli.handlers.engine_client"):
+        print(f'{module:<45}{round(measure_import_time(module), 3):>12}')
+    print()
+    print(f'{"Backend":<45}{"Seconds per run":>18}{"Requests per run":>18}')
+    for backend, result in run_benchmark(args.containers, args.images, args.stats_delay, args.runs).items():
+        print(f'{backend:<45}{round(result["seconds"], 3):>18}{result["requests"]:>18}')
+
+
+if __name__ == "__main__":
+    main()
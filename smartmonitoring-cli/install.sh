@@ -211,9 +211,10 @@ Interface Agent:\e[33m zabbix-agent2-container\e[34m
 "
 }
 
-# creates a hourly running cron job
+# creates the cron jobs for auto-update and hourly image prefetch
 function create_cron_job() {
   echo "*/5   * * * *   root    /usr/local/bin/smartmonitoring update -s" >> /etc/crontab
+  echo "17    * * * *   root    /usr/local/bin/smartmonitoring prefetch -s" >> /etc/crontab
 }
 
 # downloads and installs smartmonitoring_cli sdist package
@@ -1,32 +1,45 @@
 import logging as lg
 import os
 import sys
+from typing import TYPE_CHECKING
 
 import click
-from rich.console import Console
 
+import smartmonitoring_cli.const_settings as cs
 import smartmonitoring_cli.helpers.log_helper as lh
-from smartmonitoring_cli.main_logic import MainLogic
+import smartmonitoring_cli.helpers.profile_helper as ph
+
+# MainLogic and all handlers are imported on demand inside the commands, so that each subcommand only pays the
+# import cost of the modules it actually uses (docker, rich, cerberus ...).
+if TYPE_CHECKING:
+    from smartmonitoring_cli.main_logic import MainLogic
 
 
 @click.group()
-def main():
+@click.option("--profile", is_flag=True, default=False,
+              help="Logs the wall time of each phase (imports, config load, docker connect, image pull ...)")
+@click.option("--profile-dump", is_flag=True, default=False,
+              help="Like --profile, additionally saves a cProfile file and the top memory allocations to the log dir")
+def main(profile: bool, profile_dump: bool):
     # Check if run as root on linux systems and exit if not
     if sys.platform.startswith("linux"):
         if os.geteuid() != 0:
             print("You need to have root privileges to run this application.")
             print("Please try again, this time using 'sudo'.")
             sys.exit(1)
+    if profile or profile_dump:
+        ph.start_profiling(dump=profile_dump)
 
 
 @main.command()
 @click.option("-s", "--silent", is_flag=True, default=False,
               help="Specify if you want to run the application in silent mode, which writes all output to the log file")
 @click.option("-v", "--verbose", is_flag=True, default=False, help="Prints more information")
+@ph.recording()
 def restart(silent: bool, verbose: bool):
     """Restarts all Containers of the current deployment."""
     main_logic = prepare_cli("Restarting all containers of deployment...", verbose, silent)
-    command_executer(verbose, silent, main_logic.restart_application)
+    command_executer(verbose, silent, main_logic.execute, "restart", main_logic.restart_application)
 
 
 @main.command()
@@ -41,16 +54,23 @@ def validate_config(verbose: bool):
 @click.option("-v", "--verbose", is_flag=True, default=False, help="Prints more information")
 @click.option("-s", "--silent", is_flag=True, default=False,
               help="Specify if you want to run the application in silent mode, which writes all output to the log file")
+@ph.recording()
 def apply_config(verbose: bool, silent: bool):
     """Validates the local config file and applies it if valid."""
     main_logic = prepare_cli("Applying new local config", verbose, silent)
-    command_executer(verbose, silent, main_logic.validate_and_apply_config, silent)
+    if silent:
+        # Only silent runs are forwarded to the agent, since the confirmation prompt needs the local terminal
+        command_executer(verbose, silent, main_logic.execute, "apply-config", main_logic.validate_and_apply_config,
+                         {"silent": silent})
+    else:
+        command_executer(verbose, silent, main_logic.validate_and_apply_config, silent)
 
 
 @main.command()
 @click.option("-s", "--silent", is_flag=True, default=False,
               help="Specify if you want to run the application in silent mode, which writes all output to the log file")
 @click.option("-v", "--verbose", is_flag=True, default=False, help="Prints more information")
+@ph.recording()
 def deploy(silent: bool, verbose: bool):
     """Deploys SmartMonitoring on this System."""
     main_logic = prepare_cli("Deploying SmartMonitoring", verbose, silent)
@@ -61,6 +81,7 @@ def deploy(silent: bool, verbose: bool):
 @click.option("-s", "--silent", is_flag=True, default=False,
               help="Specify if you want to run the application in silent mode, which writes all output to the log file")
 @click.option("-v", "--verbose", is_flag=True, default=False, help="Prints more information")
+@ph.recording()
 def undeploy(silent: bool, verbose: bool):
     """Removes the SmartMonitoring Deployment from this system."""
     main_logic = prepare_cli("Removing SmartMonitoring deployment", verbose, silent)
@@ -73,10 +94,43 @@ def undeploy(silent: bool, verbose: bool):
 @click.option("-v", "--verbose", is_flag=True, default=False, help="Prints more information")
 @click.option("-f", "--force", is_flag=True, default=False,
               help="Applies the remote manifest even if it is not newer than the local one")
+@ph.recording()
 def update(silent: bool, verbose: bool, force: bool):
     """Checks if a newer SmartMonitoring Deployment is available and updates it if so."""
     main_logic = prepare_cli("Updating SmartMonitoring deployment", verbose, silent)
-    command_executer(verbose, silent, main_logic.update_application, force)
+    command_executer(verbose, silent, main_logic.execute, "update", main_logic.update_application, {"force": force})
+
+
+@main.command()
+@click.option("-s", "--silent", is_flag=True, default=False,
+              help="Specify if you want to run the application in silent mode, which writes all output to the log file")
+@click.option("-v", "--verbose", is_flag=True, default=False, help="Prints more information")
+@ph.recording()
+def rollback(silent: bool, verbose: bool):
+    """Restores the previous SmartMonitoring Deployment from local images, without internet access."""
+    main_logic = prepare_cli("Rolling back SmartMonitoring deployment", verbose, silent)
+    command_executer(verbose, silent, main_logic.execute, "rollback", main_logic.rollback_application)
+
+
+@main.command()
+@click.option("-s", "--silent", is_flag=True, default=False,
+              help="Specify if you want to run the application in silent mode, which writes all output to the log file")
+@click.option("-v", "--verbose", is_flag=True, default=False, help="Prints more information")
+@ph.recording()
+def prefetch(silent: bool, verbose: bool):
+    """Pulls the images of the update manifest in advance, so that a later update has nothing to download."""
+    main_logic = prepare_cli("Prefetching images of update manifest", verbose, silent)
+    command_executer(verbose, silent, main_logic.execute, "prefetch", main_logic.prefetch_images)
+
+
+@main.command()
+@click.option("-s", "--silent", is_flag=True, default=False,
+              help="Specify if you want to run the application in silent mode, which writes all output to the log file")
+@click.option("-v", "--verbose", is_flag=True, default=False, help="Prints more information")
+def watch(silent: bool, verbose: bool):
+    """Records crashes, oom kills, restarts and health changes of the containers in the status file."""
+    main_logic = prepare_cli("Watching container events", verbose, silent)
+    command_executer(verbose, silent, main_logic.watch_events)
 
 
 @main.command()
@@ -84,11 +138,35 @@ def update(silent: bool, verbose: bool, force: bool):
 @click.option("--disable-refresh", is_flag=True, default=False, help="Disables automatic refresh of the Dashboard")
 @click.option("--banner-version", is_flag=True, default=False,
               help="Prints reduced information for the shell login banner")
-def status(verbose: bool, disable_refresh: bool, banner_version: bool):
+@click.option("--measure-overhead", is_flag=True, default=False,
+              help="Shows the CPU and memory usage of the dashboard itself")
+@click.option("--interval", type=click.FloatRange(min=0.5), default=cs.DASHBOARD_INTERVAL_SECONDS,
+              show_default=True, help="Seconds between two collections of the dashboard data")
+@click.option("--duration", type=click.IntRange(min=1), default=cs.DASHBOARD_DURATION_SECONDS,
+              show_default=True, help="Seconds after which the dashboard exits")
+@click.option("--json", "output_format", flag_value="json", default=None,
+              help="Prints the status as json document instead of the dashboard")
+@click.option("--openmetrics", "output_format", flag_value="openmetrics",
+              help="Prints the status in the OpenMetrics text format instead of the dashboard")
+def status(verbose: bool, disable_refresh: bool, banner_version: bool, measure_overhead: bool, interval: float,
+           duration: int, output_format: str):
     """Shows a status dashboard with important metrics."""
     if verbose: disable_refresh = True
-    main_logic = prepare_cli("Showing status dashboard", verbose, False, only_critical=True)
-    command_executer(verbose, False, main_logic.print_status, disable_refresh, banner_version)
+    # Machine-readable output must not be mixed with log messages, therefore they are only written to the log file
+    silent = output_format is not None
+    main_logic = prepare_cli("Showing status dashboard", verbose, silent, only_critical=True)
+    command_executer(verbose, silent, main_logic.print_status, disable_refresh, banner_version, measure_overhead,
+                     interval, duration, output_format)
+
+
+@main.command()
+@click.option("-s", "--silent", is_flag=True, default=False,
+              help="Specify if you want to run the application in silent mode, which writes all output to the log file")
+@click.option("-v", "--verbose", is_flag=True, default=False, help="Prints more information")
+def agent(silent: bool, verbose: bool):
+    """Runs a resident agent that serves status, update, rollback, restart, prefetch and apply-config over a socket."""
+    main_logic = prepare_cli("Running SmartMonitoring agent", verbose, silent)
+    command_executer(verbose, silent, main_logic.run_agent)
 
 
 def exit_with_error(code: int) -> None:
@@ -100,7 +178,7 @@ def exit_with_error(code: int) -> None:
     exit(code)
 
 
-def prepare_cli(action: str, verbose: bool, silent: bool, only_critical: bool = False) -> MainLogic:
+def prepare_cli(action: str, verbose: bool, silent: bool, only_critical: bool = False) -> 'MainLogic':
     """
     Prepares the CLI for the main command.
     :param action: Name of action that will be performed
@@ -109,8 +187,13 @@ def prepare_cli(action: str, verbose: bool, silent: bool, only_critical: bool =
     :param only_critical: Only logs critical messages to console
     :return: MainLogic object
     """
+    with ph.phase("Imports"):
+        from smartmonitoring_cli.main_logic import MainLogic
     main_logic = MainLogic()
-    command_executer(verbose, silent, main_logic.setup_logging, verbose, silent, only_critical, print_finish=False)
+    ph.output_dir = main_logic.smartmonitoring_log_dir
+    with ph.phase("Setup logging"):
+        command_executer(verbose, silent, main_logic.setup_logging, verbose, silent, only_critical,
+                         print_finish=False)
     lh.log_start(action)
     return main_logic
 
@@ -131,6 +214,7 @@ def command_executer(verbose: bool, silent: bool, function, *args, print_finish:
     except Exception as e:
         lg.critical(f'Critical Error occurred: {e}')
         if verbose and not silent:
+            from rich.console import Console
             Console().print_exception(show_locals=True)
         elif verbose and silent:
             lg.debug(f'Stack trace: ', exc_info=True)
@@ -138,4 +222,6 @@ def command_executer(verbose: bool, silent: bool, function, *args, print_finish:
             lg.info('Run the command with the --verbose flag to get more information.')
         exit_with_error(1)
     finally:
-        if print_finish: lh.log_finish()
+        if print_finish:
+            ph.finish_profiling()
+            lh.log_finish()
@@ -7,27 +7,193 @@ LOG_FILE_NAME = 'smartmonitoring_cli-helper.log'
 # Name of the update status file
 STATUS_FILE_NAME = 'update-status.json'
 
+# Name of the lock file that serializes the updates of the status file across processes
+STATUS_LOCK_FILE_NAME = 'update-status.lock'
+
 # Name of the local config file
 LOCAL_CONF_FILE_NAME = 'smartmonitoring_config.yaml'
 
 # Name of the Stack file.
 DEPLOYED_STACK_FILE_NAME = 'installed_stack.json'
 
+# Name of the file with the stack that was installed before the current one, used by the rollback command
+PREVIOUS_STACK_FILE_NAME = 'installed_stack.previous.json'
+
+# Name of the file with the fingerprint of the last successfully validated stack file
+STACK_VALIDATION_CACHE_FILE_NAME = 'installed_stack.validated.json'
+
+# Name of the file with the pre-computed information for the login banner
+BANNER_SNAPSHOT_FILE_NAME = 'banner_snapshot.json'
+
+# Time in Minutes, after which the login banner marks its snapshot as stale
+BANNER_SNAPSHOT_STALE_AFTER_MINUTES = 60
+
+# Name of the file in which the resolved local and public ip addresses are cached
+IP_ADDRESS_CACHE_FILE_NAME = 'ip_addresses.json'
+
+# Time in seconds a resolved ip address is used before it is refreshed in the background
+LOCAL_IP_ADDRESS_TTL_SECONDS = 300
+PUBLIC_IP_ADDRESS_TTL_SECONDS = 3600
+
+# Time in seconds before a failed ip address lookup is retried
+IP_ADDRESS_RETRY_SECONDS = 60
+
+# Time in seconds the public ip address service may take to accept the connection and to answer
+PUBLIC_IP_CONNECT_TIMEOUT_SECONDS = 2
+PUBLIC_IP_READ_TIMEOUT_SECONDS = 3
+
 # Text that is printed as Logo
 CLI_LOGO_TEXT = "SmartMonitoring by btc."
 
 # Name of this App. Used all over the place in the cli
 APP_NAME = "SmartMonitoring-CLI"
 
-# Time in Minutes, after which a "Deploying" status is considered as no longer valid
-DEPLOYMENT_REPAIR_TIMEOUT_MINUTES = 10
+# Name of the journal file with the completed steps of the running deployment
+DEPLOYMENT_JOURNAL_FILE_NAME = 'deployment_journal.jsonl'
+
+# Number of times an interrupted deployment is resumed, before its journal is discarded
+DEPLOYMENT_MAX_RESUMES = 2
+
+# Number of deployment runs whose metrics are kept in the status file
+DEPLOYMENT_METRICS_HISTORY = 10
 
 # Max size of a log file for each container that is generated by docker
 CONTAINER_LOG_FILE_SIZE = "500m"
 
+# Name of the root-only file in which the dynamic secrets are persisted across deployments
+SECRETS_FILE_NAME = 'secrets.json'
+
+# Prefix of the named docker volumes created for the containers, the volume name from the manifest is appended
+VOLUME_NAME_PREFIX = 'smartmonitoring_'
+
+# Label of the named docker volumes created by SmartMonitoring
+MANAGED_VOLUME_LABEL = 'smartmonitoring.managed'
+
+# Labels of the containers created by SmartMonitoring, the stack label is used to list the whole deployment at once
+CONTAINER_LABEL_STACK = 'smartmonitoring.stack'
+CONTAINER_LABEL_VERSION = 'smartmonitoring.version'
+CONTAINER_LABEL_SPEC_HASH = 'smartmonitoring.spec_hash'
+
+# Value of the stack label of the containers created by SmartMonitoring
+CONTAINER_STACK_NAME = 'smartmonitoring'
+
 # Number of characters each generated dynamic secret has
 DYNAMIC_SECRET_KEY_LENGTH = 16
 
+# Max number of containers that are created, started, stopped or removed at the same time
+MAX_PARALLEL_CONTAINER_OPERATIONS = 4
+
+# Max number of images that are pulled at the same time
+MAX_PARALLEL_IMAGE_PULLS = 3
+
+# Name of the file with the images that have been pre-pulled for the next update by the prefetch command
+PREFETCH_RECORD_FILE_NAME = 'prefetched_images.json'
+
+# Name of the file that records which images belong to which deployed package version
+IMAGE_REGISTRY_FILE_NAME = 'image_registry.json'
+
+# Number of deployed package versions whose images are kept on the host, including the current version
+IMAGE_RETENTION_VERSIONS = 2
+
+# Used disk space in percent, from which only the images of the current version are kept
+IMAGE_RETENTION_DISK_PRESSURE_PERCENT = 85
+
+# Pre-create new containers under temporary names while the old ones are still running, then swap them.
+# If disabled, the old containers are removed before the new ones are created.
+SWAP_CONTAINERS_ON_DEPLOYMENT = True
+
+# Suffixes of the container names used while swapping containers
+SWAP_NEW_CONTAINER_SUFFIX = '_swap_new'
+SWAP_OLD_CONTAINER_SUFFIX = '_swap_old'
+
+# Time in seconds a container may take to become ready, if its readiness check defines no timeout
+READINESS_DEFAULT_TIMEOUT_SECONDS = 180
+
+# Time in seconds between two readiness probes of a container, starts short and doubles up to the maximum
+READINESS_INITIAL_BACKOFF_SECONDS = 0.5
+READINESS_MAX_BACKOFF_SECONDS = 5
+
+# Time in seconds a single tcp readiness probe may take
+READINESS_PROBE_TIMEOUT_SECONDS = 2
+
+# Number of restarts after which a container is considered as crash-looping and not ready
+READINESS_MAX_RESTARTS = 3
+
+# Time in seconds to wait for the local docker engine to answer, e.g. when the cli runs right after a reboot
+DOCKER_ENGINE_READY_TIMEOUT_SECONDS = 120
+
+# Time in seconds between two pings of the docker engine, starts short and doubles up to the maximum
+DOCKER_ENGINE_INITIAL_BACKOFF_SECONDS = 0.05
+DOCKER_ENGINE_MAX_BACKOFF_SECONDS = 0.8
+
+# Backend for the docker engine api, "docker-py" or "asyncio". The asyncio backend serves the container snapshot,
+# container stats, image checks and image pulls concurrently on one event loop. Can be overridden by the env variable
+DOCKER_BACKEND = "docker-py"
+DOCKER_BACKEND_ENV_VARIABLE = "SMARTMONITORING_DOCKER_BACKEND"
+
+# Version of the docker engine api that is requested by the asyncio backend
+DOCKER_ENGINE_API_VERSION = '1.41'
+
+# Socket of the local docker engine, if DOCKER_HOST is not set
+DOCKER_DEFAULT_SOCKET = '/var/run/docker.sock'
+
+# Number of stats samples of each container that are kept by the stats collector of the agent
+STATS_HISTORY_SAMPLES = 30
+
+# Time in seconds before the stats stream of a container that is not available is reopened
+STATS_RETRY_SECONDS = 5
+
+# Time in seconds a status request waits for the first stats samples of newly watched containers
+STATS_FIRST_SAMPLE_TIMEOUT_SECONDS = 3
+
+# Container events that are recorded in the status file by the events watcher
+CONTAINER_EVENTS = ["die", "oom", "restart", "health_status"]
+
+# Number of recent container events that are kept in the status file
+CONTAINER_EVENTS_HISTORY = 20
+
+# Time in seconds before the events watcher reconnects to the docker engine after the event stream was interrupted
+CONTAINER_EVENTS_RECONNECT_SECONDS = 5
+
+# Time in seconds between two collections of the status dashboard data
+DASHBOARD_INTERVAL_SECONDS = 2
+
+# Time in seconds after which the status dashboard exits
+DASHBOARD_DURATION_SECONDS = 200
+
+# Max time in seconds between two redraws of the status dashboard, so that the age of the data stays current
+DASHBOARD_RENDER_INTERVAL_SECONDS = 1
+
+# Time in seconds after which the data of a dashboard panel, whose collection is still running, is marked as stale
+DASHBOARD_COLLECTOR_TIMEOUT_SECONDS = 10
+
+# Number of samples of each host metric from which the status dashboard derives min, avg and max
+HOST_METRICS_HISTORY_SAMPLES = 30
+
+# Min time in seconds between two host metric samples, so that the first cpu usage and rates are meaningful
+HOST_METRICS_MIN_INTERVAL_SECONDS = 0.5
+
+# Filesystems that are not shown as mounts in the status dashboard
+HOST_METRICS_IGNORED_FILESYSTEMS = ["squashfs", "overlay", "tmpfs", "devtmpfs"]
+
+# Data-root of the docker engine, used if the engine can not be asked for it
+DOCKER_DEFAULT_ROOT_DIR = '/var/lib/docker'
+
+# Number of top memory allocations that are saved when profiling with --profile-dump
+PROFILE_TOP_ALLOCATIONS = 25
+
+# Max number of phases and of marks per event that are kept of a recording, older entries are discarded
+PROFILE_MAX_ENTRIES = 10000
+
+# Name of the unix socket the resident agent listens on
+AGENT_SOCKET_FILE_NAME = 'agent.sock'
+
+# Time in seconds a client waits to connect to the agent before falling back to in-process execution
+AGENT_CONNECT_TIMEOUT_SECONDS = 1
+
+# Time in seconds the status dashboard waits for container statistics from the agent
+AGENT_STATUS_TIMEOUT_SECONDS = 10
+
 
 class ConfigDefaults:
     # Default values for the local config file
@@ -111,6 +111,63 @@ class ValidationSchemas:
                         'nullable': True,
                         'type': 'list'
                     },
+                    'depends_on': {
+                        'required': False,
+                        'nullable': True,
+                        'type': 'list',
+                        'schema': {
+                            'type': 'string'
+                        }
+                    },
+                    'volumes': {
+                        'type': 'list',
+                        'required': False,
+                        'nullable': True,
+                        'schema': {
+                            'type': 'dict',
+                            'schema': {
+                                'name': {
+                                    'required': True,
+                                    'type': 'string',
+                                    'regex': '^[a-zA-Z0-9_.-]+$'
+                                },
+                                'container_path': {
+                                    'required': True,
+                                    'type': 'string'
+                                }
+                            }
+                        }
+                    },
+                    'readiness': {
+                        'required': False,
+                        'nullable': True,
+                        'type': 'dict',
+                        'schema': {
+                            'type': {
+                                'required': True,
+                                'type': 'string',
+                                'allowed': ['running', 'healthcheck', 'tcp', 'log']
+                            },
+                            'port': {
+                                'required': False,
+                                'nullable': True,
+                                'type': 'integer',
+                                'min': 1,
+                                'max': 65535
+                            },
+                            'pattern': {
+                                'required': False,
+                                'nullable': True,
+                                'type': 'string'
+                            },
+                            'timeout': {
+                                'required': False,
+                                'nullable': True,
+                                'type': 'integer',
+                                'min': 1
+                            }
+                        }
+                    },
                 }
             }
         }
@@ -0,0 +1,104 @@
+import logging as lg
+import threading
+import time
+
+import smartmonitoring_cli.const_settings as cs
+import smartmonitoring_cli.helpers.helper_functions as hf
+from smartmonitoring_cli.handlers.data_handler import DataHandler
+
+
+class AddressResolver:
+    def __init__(self, cfh: DataHandler):
+        """
+        Resolves the local and public ip address of the host through a cache in the var dir. A cached address is
+        returned even if it is expired, it is then refreshed on a background thread. If no address was ever resolved,
+        the local address is looked up in the foreground, since this only needs a route lookup. The public address is
+        then reported as unknown until the background lookup has finished, unless the caller waits for it.
+        :param cfh: DataHandler instance
+        """
+        self.cfh = cfh
+        self.__lock = threading.Lock()
+        self.__refreshing = set()
+        self.__lookups = {
+            "local_ip": (hf.get_local_ip_address, cs.LOCAL_IP_ADDRESS_TTL_SECONDS),
+            "public_ip": (hf.get_public_ip_address, cs.PUBLIC_IP_ADDRESS_TTL_SECONDS)
+        }
+
+    def get_local_ip_address(self) -> str:
+        """
+        Get the local ip address of the host
+        :return: Local ip address as string, "unknown" if it could not be resolved
+        """
+        return self.__get_address("local_ip")
+
+    def get_public_ip_address(self, wait: bool = False) -> str:
+        """
+        Get the public ip address of the host
+        :param wait: Looks the address up in the foreground if none is cached, bounded by the connect and read deadlines
+        :return: Public ip address as string, "unknown" if it could not be resolved
+        """
+        return self.__get_address("public_ip", wait)
+
+    def __get_address(self, name: str, wait: bool = True) -> str:
+        """
+        Get an address from the cache, refreshes it in the background if it is expired
+        :param name: Name of the address in the cache
+        :param wait: Looks the address up in the foreground if none is cached
+        :return: Address as string, "unknown" if it could not be resolved
+        """
+        entry = self.cfh.get_ip_address_cache().get(name)
+        if entry is None and wait:
+            lg.debug(f'No cached {name} address, resolving it now')
+            return self.__refresh(name)
+        if entry is None:
+            self.__start_refresh(name)
+            return "unknown"
+        if entry["expires_at"] < time.time():
+            self.__start_refresh(name)
+        return entry["value"]
+
+    def __start_refresh(self, name: str) -> None:
+        """
+        Refreshes an address on a background thread, unless it is already being refreshed. The thread is no daemon,
+        so that short-lived commands still save the refreshed address after their output was printed.
+        :param name: Name of the address in the cache
+        """
+        with self.__lock:
+            if name in self.__refreshing:
+                return
+            self.__refreshing.add(name)
+        lg.debug(f'Refreshing {name} address in the background')
+        threading.Thread(target=self.__refresh, args=(name,), name=f'address-refresh-{name}').start()
+
+    def __refresh(self, name: str) -> str:
+        """
+        Resolves an address and saves it in the cache. If the lookup fails, the previous address is kept and the lookup
+        is retried after a short delay.
+        :param name: Name of the address in the cache
+        :return: Resolved address, the previous one if the lookup failed
+        """
+        lookup, ttl = self.__lookups[name]
+        try:
+            address = lookup()
+            with self.__lock:
+                cache = self.cfh.get_ip_address_cache()
+                previous = cache.get(name, {}).get("value", "unknown")
+                if address == "unknown":
+                    cache[name] = {"value": previous, "expires_at": time.time() + cs.IP_ADDRESS_RETRY_SECONDS}
+                else:
+                    cache[name] = {"value": address, "expires_at": time.time() + ttl}
+                self.__save_cache(cache)
+            return cache[name]["value"]
+        finally:
+            with self.__lock:
+                self.__refreshing.discard(name)
+
+    def __save_cache(self, cache: dict) -> None:
+        """
+        Saves the cache, errors are only logged since the addresses can be resolved again
+        :param cache: Content of the cache
+        """
+        try:
+            self.cfh.save_ip_address_cache(cache)
+        except OSError as e:
+            lg.debug(f'Error saving ip address cache: {e}')
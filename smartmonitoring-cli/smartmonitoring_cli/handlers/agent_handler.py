@@ -0,0 +1,228 @@
+import contextvars
+import itertools
+import json
+import logging as lg
+import os
+import socket
+import socketserver
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+import smartmonitoring_cli.const_settings as cs
+
+# Id of the request whose command is executed in the current context. Worker threads of a command run in a copy of
+# its context, so that their log records are forwarded to the client as well.
+_request_id = contextvars.ContextVar("agent_request_id", default=None)
+_request_ids = itertools.count(1)
+
+
+class AgentUnavailable(Exception):
+    pass
+
+
+class AgentRequestError(Exception):
+    pass
+
+
+def _send_message(wfile, message: dict) -> None:
+    """
+    Sends a single message as json line over the agent socket
+    :param wfile: Writable file object of the socket
+    :param message: Message to send as dict
+    """
+    wfile.write((json.dumps(message, default=str) + "\n").encode("utf-8"))
+    wfile.flush()
+
+
+class _LogForwarder(lg.Handler):
+    """
+    Forwards the log records of a request to the client that requested the command. Records are forwarded if they
+    are emitted in the context of the request, also by the worker threads of the command. Records of other threads,
+    e.g. the events watcher or concurrent status requests, are not sent to the client.
+    """
+
+    def __init__(self, wfile, request_id: int):
+        super().__init__(level=lg.DEBUG)
+        self.wfile = wfile
+        self.request_id = request_id
+
+    def filter(self, record: lg.LogRecord) -> bool:
+        return _request_id.get() == self.request_id and super().filter(record)
+
+    def emit(self, record: lg.LogRecord) -> None:
+        try:
+            _send_message(self.wfile, {"type": "log", "level": record.levelno, "message": record.getMessage()})
+        except OSError:
+            # Client disconnected, the command is still executed to the end
+            pass
+
+
+class _AgentRequestHandler(socketserver.StreamRequestHandler):
+    server: '_AgentSocketServer'
+
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            # Connection was only opened to check if the agent is running
+            return
+        try:
+            request = json.loads(line)
+            command = request["command"]
+            kwargs = request.get("args") or {}
+        except (ValueError, KeyError, TypeError) as e:
+            _send_message(self.wfile, {"type": "result", "success": False, "error": f'Invalid request: {e}'})
+            return
+        if command not in self.server.commands:
+            _send_message(self.wfile, {"type": "result", "success": False, "error": f'Unknown command: {command}'})
+            return
+        lg.debug(f'Agent received command: {command} with args: {kwargs}')
+        if command in self.server.read_only_commands:
+            self.__execute(command, kwargs)
+            return
+        # Commands that change the deployment are executed one after another and stream their logs to the client
+        with self.server.operation_lock:
+            request_id = next(_request_ids)
+            token = _request_id.set(request_id)
+            forwarder = _LogForwarder(self.wfile, request_id)
+            lg.getLogger().addHandler(forwarder)
+            try:
+                self.__execute(command, kwargs)
+            finally:
+                lg.getLogger().removeHandler(forwarder)
+                _request_id.reset(token)
+
+    def __execute(self, command: str, kwargs: dict) -> None:
+        """
+        Executes a command of the agent and sends the result to the client
+        :param command: Name of the command to execute
+        :param kwargs: Keyword arguments for the command
+        """
+        try:
+            data = self.server.commands[command](**kwargs)
+        except Exception as e:
+            lg.error(f'Agent command {command} failed: {e}')
+            lg.debug('Stack trace: ', exc_info=True)
+            result = {"type": "result", "success": False, "error": str(e)}
+        else:
+            result = {"type": "result", "success": True, "data": data}
+        try:
+            _send_message(self.wfile, result)
+        except OSError:
+            lg.debug(f'Client disconnected before the result of command {command} could be sent')
+
+
+class _AgentSocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_file: Path, commands: dict[str, Callable], read_only_commands: list[str]):
+        self.commands = commands
+        self.read_only_commands = read_only_commands
+        self.operation_lock = threading.Lock()
+        super().__init__(str(socket_file), _AgentRequestHandler)
+
+
+class AgentServer:
+    def __init__(self, socket_file: Path, commands: dict[str, Callable], read_only_commands: list[str] = None):
+        """
+        Resident agent that serves the given commands over a local unix socket.
+        :param socket_file: Path of the unix socket
+        :param commands: Dict with the command name as key and the function to execute as value
+        :param read_only_commands: Commands that do not change the deployment and can run in parallel
+        """
+        self.socket_file = socket_file
+        self.commands = commands
+        self.read_only_commands = read_only_commands or []
+
+        self.server = None
+
+    def bind(self) -> None:
+        """
+        Binds the unix socket. The socket is created with a restrictive umask, so that it is never accessible by other
+        users. The umask applies to the whole process, therefore the socket must be bound before any other thread of
+        the agent is started that writes files.
+        """
+        if AgentClient(self.socket_file).is_running():
+            raise AgentUnavailable(f'Another agent is already listening on {self.socket_file}')
+        if os.path.exists(self.socket_file):
+            lg.debug(f'Removing stale agent socket: {self.socket_file}')
+            os.remove(self.socket_file)
+        umask = os.umask(0o177)
+        try:
+            self.server = _AgentSocketServer(self.socket_file, self.commands, self.read_only_commands)
+        finally:
+            os.umask(umask)
+
+    def serve_forever(self) -> None:
+        """Serves requests until the process is terminated, binds the unix socket if this was not done before"""
+        if self.server is None:
+            self.bind()
+        try:
+            lg.info(f'SmartMonitoring agent listening on {self.socket_file}')
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.socket_file):
+                os.remove(self.socket_file)
+            lg.info("SmartMonitoring agent stopped")
+
+
+class AgentClient:
+    def __init__(self, socket_file: Path):
+        self.socket_file = socket_file
+
+    def __connect(self) -> socket.socket:
+        """
+        Opens a connection to the agent socket
+        :return: Connected socket
+        """
+        if not hasattr(socket, "AF_UNIX") or not os.path.exists(self.socket_file):
+            raise AgentUnavailable(f'No agent socket found at {self.socket_file}')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(cs.AGENT_CONNECT_TIMEOUT_SECONDS)
+        try:
+            sock.connect(str(self.socket_file))
+        except OSError as e:
+            sock.close()
+            raise AgentUnavailable(f'Agent not reachable on {self.socket_file}: {e}') from e
+        return sock
+
+    def is_running(self) -> bool:
+        """
+        Checks if an agent is listening on the socket
+        :return: True if an agent is running, False otherwise
+        """
+        try:
+            self.__connect().close()
+        except AgentUnavailable as e:
+            lg.debug(f'{e}')
+            return False
+        return True
+
+    def request(self, command: str, timeout: Optional[float] = None, **kwargs):
+        """
+        Executes a command on the agent. Log messages of the agent are re-emitted with the local logger.
+        Raises an AgentRequestError if the command failed on the agent.
+        :param command: Name of the command
+        :param timeout: Max time in seconds to wait for the result, waits forever if None
+        :param kwargs: Arguments for the command
+        :return: Data returned by the command
+        """
+        sock = self.__connect()
+        try:
+            sock.settimeout(timeout)
+            with sock.makefile("rwb") as stream:
+                _send_message(stream, {"command": command, "args": kwargs})
+                for line in stream:
+                    message = json.loads(line)
+                    if message["type"] == "log":
+                        lg.log(message["level"], message["message"])
+                    elif message["type"] == "result":
+                        if not message["success"]:
+                            raise AgentRequestError(message["error"])
+                        return message.get("data")
+        except (OSError, ValueError) as e:
+            raise AgentUnavailable(f'Connection to agent lost: {e}') from e
+        finally:
+            sock.close()
+        raise AgentUnavailable("Agent closed the connection without sending a result")
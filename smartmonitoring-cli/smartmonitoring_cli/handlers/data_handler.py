@@ -1,21 +1,24 @@
 import tempfile
+from contextlib import contextmanager
 from datetime import datetime
 
 import smartmonitoring_cli.const_settings as cs
-import yaml as yaml
-import requests
 import os
 import json
+import hashlib
 import secrets
+import shutil
+import threading
 from pathlib import Path
+from typing import Optional
 import logging as lg
-from cerberus import Validator
-from deepdiff import DeepDiff
 import smartmonitoring_cli.helpers.helper_functions as hf
+import smartmonitoring_cli.helpers.profile_helper as ph
+import smartmonitoring_cli.helpers.dependency_graph as dg
 from smartmonitoring_cli import __version__
+from smartmonitoring_cli.handlers.journal_handler import JournalHandler
 from smartmonitoring_cli.models.local_config import LocalConfig
 from smartmonitoring_cli.models.update_manifest import UpdateManifest, ContainerConfig, MappedFile
-from requests.exceptions import ConnectionError, Timeout, HTTPError
 from smartmonitoring_cli.const_settings import ConfigDefaults as cfd
 from smartmonitoring_cli.dict_validation_schemas import ValidationSchemas
 
@@ -37,12 +40,32 @@ class InstalledStackInvalid(Exception):
 
 
 class DataHandler:
-    def __init__(self, config_file: Path, stack_file: Path, status_file: Path):
+    def __init__(self, config_file: Path, stack_file: Path, status_file: Path, var_dir: Path):
         self.config_file = config_file
         self.stack_file = stack_file
         self.status_file = status_file
+        self.banner_file = Path(os.path.join(var_dir, cs.BANNER_SNAPSHOT_FILE_NAME))
+        self.ip_address_cache_file = Path(os.path.join(var_dir, cs.IP_ADDRESS_CACHE_FILE_NAME))
+        self.prefetch_file = Path(os.path.join(var_dir, cs.PREFETCH_RECORD_FILE_NAME))
+        self.secrets_file = Path(os.path.join(var_dir, cs.SECRETS_FILE_NAME))
+        self.image_registry_file = Path(os.path.join(var_dir, cs.IMAGE_REGISTRY_FILE_NAME))
+        self.journal = JournalHandler(Path(os.path.join(var_dir, cs.DEPLOYMENT_JOURNAL_FILE_NAME)))
+        self.stack_validation_file = Path(os.path.join(var_dir, cs.STACK_VALIDATION_CACHE_FILE_NAME))
+        self.previous_stack_file = Path(os.path.join(var_dir, cs.PREVIOUS_STACK_FILE_NAME))
+        # Validated installed stack, kept in memory as long as the fingerprint of the stack file does not change
+        self.__installed_stack = None
+        self.__installed_spec_hashes = {}
+        self.__installed_stack_fingerprint = None
+        # Last downloaded update manifest with its http cache headers, used for conditional downloads
+        self.__manifest_cache = {}
+        # Serializes the updates of the status file, which the agent writes from several threads. Other processes,
+        # e.g. the watch command and a cron update, are serialized through a lock file.
+        self.status_lock_file = Path(os.path.join(var_dir, cs.STATUS_LOCK_FILE_NAME))
+        self.__status_lock = threading.RLock()
+        self.__status_lock_fd = None
 
     def __load_yaml_from_file(self, file: Path) -> dict:
+        import yaml
         lg.debug(f'Loading yaml from file: {file}')
         try:
             with open(file, 'r') as stream:
@@ -51,21 +74,37 @@ class DataHandler:
             lg.error(f'Error loading file: {file}, error message: {e}')
             raise
 
+    @ph.phase("Manifest download")
     def __load_yaml_from_web(self, url: str) -> dict:
         """
         Loads a yaml file from a given url and parses it to a dict
         :param url: URL to load yaml from as string
         :return: Dict of yaml file
         """
+        import requests
+        headers = {}
+        cached = self.__manifest_cache.get(url)
+        if cached is not None:
+            if cached["etag"] is not None: headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"] is not None: headers["If-Modified-Since"] = cached["last_modified"]
         tf, file = tempfile.mkstemp(suffix=".yaml")
         lg.debug(f'Downloading yaml from: {url} to: {file}')
         try:
-            r = requests.get(url)
+            r = requests.get(url, headers=headers)
             r.raise_for_status()
+            if r.status_code == 304 and cached is not None:
+                lg.debug(f'Yaml at: {url} not modified since last download, using cached version')
+                return cached["data"]
             with open(file, 'wb') as f:
                 f.write(r.content)
             lg.debug(f'Completed download of yaml from: {url} to: {file}')
-            return self.__load_yaml_from_file(Path(file))
+            data = self.__load_yaml_from_file(Path(file))
+            self.__manifest_cache[url] = {
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "data": data
+            }
+            return data
         finally:
             os.close(tf)
             hf.delete_file_if_exists(file)
@@ -77,6 +116,8 @@ class DataHandler:
         :param local_config: LocalConfig object for which to load the update manifest
         :return: Returns the update manifest as UpdateManifest object
         """
+        import yaml
+        from requests.exceptions import ConnectionError, Timeout, HTTPError
         lg.debug(f'Loading update manifest for channel: {local_config.update_channel}')
         try:
             manifest = self.__load_yaml_from_web(local_config.update_manifest_url)
@@ -89,12 +130,14 @@ class DataHandler:
             raise ManifestError(f'Update channel: {local_config.update_channel} not found in update manifest') from e
         return self.process_update_manifest(stack)
 
+    @ph.phase("Config load")
     def get_local_config(self) -> LocalConfig:
         """
         Loads the local config from the local file system.
         Raises a ConfigError on failure.
         :return: LocalConfig object
         """
+        import yaml
         lg.debug(f'Loading local config from: {self.config_file}')
         try:
             config = self.__load_yaml_from_file(self.config_file)
@@ -108,6 +151,7 @@ class DataHandler:
         self.__set_default_values_in_local_config(smartmonitoring_config)
         return self.process_local_config(smartmonitoring_config)
 
+    @ph.phase("Validation")
     def process_update_manifest(self, update_manifest: dict) -> UpdateManifest:
         """
         Validates the manifest and converts it to an UpdateManifest object.
@@ -124,9 +168,42 @@ class DataHandler:
         except Exception as e:
             lg.error(f'Error phrasing update manifest from dict to object: {e}')
             raise ManifestError(f'Error phrasing update manifest from dict to object: {e}') from e
+        self.__validate_container_dependencies(manifest)
+        self.__validate_readiness_checks(manifest)
         lg.debug('Update manifest dict successfully processed to object')
         return manifest
 
+    def __validate_container_dependencies(self, manifest: UpdateManifest) -> None:
+        """
+        Validates that all dependencies of the containers exist and do not form a cycle.
+        Raises a ManifestError on failure.
+        :param manifest: UpdateManifest object to validate
+        """
+        names = [container.name for container in manifest.containers]
+        for container in manifest.containers:
+            for dependency in container.depends_on or []:
+                if dependency not in names:
+                    raise ManifestError(f'Container {container.name} depends on unknown container: {dependency}')
+        cycle = dg.find_dependency_cycle(dg.build_dependency_graph(manifest.containers))
+        if cycle is not None:
+            raise ManifestError(f'Dependency cycle found between containers: {" -> ".join(cycle)}')
+
+    def __validate_readiness_checks(self, manifest: UpdateManifest) -> None:
+        """
+        Validates that each readiness check has the settings its type requires.
+        Raises a ManifestError on failure.
+        :param manifest: UpdateManifest object to validate
+        """
+        for container in manifest.containers:
+            check = container.readiness
+            if check is None:
+                continue
+            if check.type == "tcp" and check.port is None:
+                raise ManifestError(f'Readiness check of container {container.name} of type tcp requires a port')
+            if check.type == "log" and check.pattern is None:
+                raise ManifestError(f'Readiness check of container {container.name} of type log requires a pattern')
+
+    @ph.phase("Validation")
     def validate_config_against_manifest(self, config: LocalConfig, manifest: UpdateManifest,
                                          check_files: bool = True) -> None:
         """
@@ -144,6 +221,7 @@ class DataHandler:
             if container.files is not None and check_files:
                 self.compose_mapped_files(container, config)
 
+    @ph.phase("Validation")
     def process_local_config(self, local_config: dict) -> LocalConfig:
         """
         Validates the local config and converts it to a LocalConfig object.
@@ -306,6 +384,7 @@ class DataHandler:
         :param schema: schema as dict to validate against
         :return: Tuple of bool and str. Bool indicates if the validation was successful, str contains the error message
         """
+        from cerberus import Validator
         v = Validator(schema)
         if v.validate(data):
             lg.debug("Dict successfully validated with schema: " + str(schema))
@@ -342,22 +421,106 @@ class DataHandler:
         manifest = self.get_update_manifest(config)
         return config, manifest
 
-    def save_installed_stack(self, config: LocalConfig, manifest: UpdateManifest) -> None:
+    def save_installed_stack(self, config: LocalConfig, manifest: UpdateManifest, spec_hashes: dict = None) -> None:
         """
         Saves both, the local config and the manifest combined in a file serialized as json.
         :param config: LocalConfig object to save
         :param manifest: UpdateManifest object to save
+        :param spec_hashes: Dict with the hash of the effective spec of each deployed container
         """
         lg.debug(f'Saving  stack to file: {self.stack_file}')
+        if spec_hashes is None: spec_hashes = {}
         try:
             stack = {
                 "manifest": manifest.to_dict(),
-                "config": config.to_dict()
+                "config": config.to_dict(),
+                "spec_hashes": spec_hashes
             }
         except Exception as e:
             lg.error(f'Error composing dict to save to stack file: {self.stack_file}')
             raise InstalledStackInvalid(f'Error composing stack to dict {e}')
+        self.__retain_previous_stack(stack)
         self.__save_json_file(self.stack_file, stack)
+        # Config and manifest were validated before they got deployed, so the new file can be marked as validated
+        with open(self.stack_file, 'rb') as f:
+            fingerprint = self.__get_stack_fingerprint(f.read())
+        self.__save_stack_validation(fingerprint)
+        self.__installed_stack = config, manifest
+        self.__installed_spec_hashes = spec_hashes
+        self.__installed_stack_fingerprint = fingerprint
+
+    def __retain_previous_stack(self, new_stack: dict) -> None:
+        """
+        Copies the current stack file to the previous stack file, if the new stack differs from it.
+        :param new_stack: Stack as dict that is about to be saved
+        """
+        if not self.stack_file.exists():
+            return
+        try:
+            if self.__load_json_file(self.stack_file) == new_stack:
+                return
+        except Exception:
+            lg.warning(f'Current stack file: {self.stack_file} is not readable, previous stack is not retained')
+            return
+        lg.debug(f'Retaining current stack as previous stack in file: {self.previous_stack_file}')
+        shutil.copy2(self.stack_file, self.previous_stack_file)
+
+    def get_previous_stack(self) -> Optional[tuple[LocalConfig, UpdateManifest]]:
+        """
+        Loads the stack that was installed before the current one from the previous stack file.
+        :return: Tuple of LocalConfig and UpdateManifest objects or None if no previous stack exists
+        """
+        if not self.previous_stack_file.exists():
+            return None
+        try:
+            stack = self.__load_json_file(self.previous_stack_file)
+            config = self.process_local_config(stack["config"])
+            manifest = self.process_update_manifest(stack["manifest"])
+        except Exception as e:
+            raise InstalledStackInvalid(f'Error getting previous stack from file: {self.previous_stack_file}, '
+                                        f'message: {e}')
+        return config, manifest
+
+    def compose_container_spec_hash(self, config: LocalConfig, container: ContainerConfig) -> str:
+        """
+        Composes a hash over the effective spec of a container: image, hostname, composed env. variables, mapped
+        files, ports, volumes, commands and privileged flag.
+        Secrets are included by their name only, so that secret values never end up in the stack file.
+        :param config: LocalConfig object the container is deployed with
+        :param container: ContainerConfig object to hash
+        :return: Hash of the effective spec as hex string
+        """
+        secret_placeholders = {secret: f'<secret:{secret}>' for secret in self.get_container_secret_names(container)}
+        spec = {
+            "image": container.image,
+            "hostname": container.hostname,
+            "env": self.compose_env_variables(config, container, secret_placeholders),
+            "files": [file.to_dict() for file in self.compose_mapped_files(container, config)]
+            if container.files is not None else None,
+            "ports": [port.to_dict() for port in container.ports] if container.ports is not None else None,
+            "volumes": [volume.to_dict() for volume in container.volumes] if container.volumes is not None else None,
+            "commands": container.commands,
+            "privileged": container.privileged
+        }
+        return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get_container_secret_names(self, container: ContainerConfig) -> set[str]:
+        """
+        Returns the names of the global dynamic secrets a container uses.
+        :param container: ContainerConfig object
+        :return: Set of secret names
+        """
+        if container.config.secrets is None:
+            return set()
+        return set(container.config.secrets.values())
+
+    def get_installed_spec_hashes(self) -> dict:
+        """
+        Returns the hashes of the effective container specs that were saved with the installed stack.
+        :return: Dict with the container name as key and the spec hash as value, empty for stacks without hashes
+        """
+        self.get_installed_stack()
+        return self.__installed_spec_hashes
 
     def compose_mapped_files(self, container: ContainerConfig, config: LocalConfig) -> list[MappedFile]:
         """
@@ -382,75 +545,216 @@ class DataHandler:
 
         return container_files
 
+    @ph.phase("Installed stack load")
     def get_installed_stack(self) -> tuple[LocalConfig, UpdateManifest]:
         """
         Loads the installed stack from the stack file and processes the local config and manifest from it back to
         objects.
+        The schema validation is skipped if the stack file has the same fingerprint (mtime, size and content hash) as
+        the last validated version, either in memory or in the validation cache file.
         :return: Tuple of LocalConfig and UpdateManifest objects
         """
         try:
-            stack = self.__load_json_file(self.stack_file)
-            config = self.process_local_config(stack["config"])
-            manifest = self.process_update_manifest(stack["manifest"])
-            return config, manifest
+            stat = os.stat(self.stack_file)
+            cached = self.__installed_stack_fingerprint
+            if self.__installed_stack is not None and cached["mtime_ns"] == stat.st_mtime_ns \
+                    and cached["size"] == stat.st_size:
+                lg.debug(f'Stack file: {self.stack_file} unchanged, using validated stack from memory')
+                return self.__installed_stack
+            with open(self.stack_file, 'rb') as f:
+                raw_stack = f.read()
+            fingerprint = self.__get_stack_fingerprint(raw_stack, stat)
+            if self.__installed_stack is not None and cached["sha256"] == fingerprint["sha256"]:
+                lg.debug(f'Content of stack file: {self.stack_file} unchanged, using validated stack from memory')
+                self.__installed_stack_fingerprint = fingerprint
+                return self.__installed_stack
+            stack = json.loads(raw_stack)
+            if self.__check_stack_validated(fingerprint):
+                lg.debug(f'Stack file: {self.stack_file} already validated, skipping schema validation')
+                config = LocalConfig.from_dict(stack["config"])
+                manifest = UpdateManifest.from_dict(stack["manifest"])
+            else:
+                config = self.process_local_config(stack["config"])
+                manifest = self.process_update_manifest(stack["manifest"])
+                self.__save_stack_validation(fingerprint)
+            spec_hashes = stack.get("spec_hashes") or {}
         except Exception as e:
             raise InstalledStackInvalid(f'Error getting installed stack from file: {self.stack_file}, message: {e}')
+        self.__installed_stack = config, manifest
+        self.__installed_spec_hashes = spec_hashes
+        self.__installed_stack_fingerprint = fingerprint
+        return config, manifest
+
+    def __get_stack_fingerprint(self, raw_stack: bytes, stat: os.stat_result = None) -> dict:
+        """
+        Composes the fingerprint of the stack file.
+        :param raw_stack: Content of the stack file
+        :param stat: Result of os.stat for the stack file, read from the file if None
+        :return: Dict with mtime, size, content hash and the version of this application
+        """
+        if stat is None: stat = os.stat(self.stack_file)
+        return {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": hashlib.sha256(raw_stack).hexdigest(),
+            "smartmonitoring_version": __version__
+        }
+
+    def __check_stack_validated(self, fingerprint: dict) -> bool:
+        """
+        Checks if a stack file with the given fingerprint already passed the schema validation.
+        The mtime is ignored here, since a copied or touched file with the same content is still valid.
+        :param fingerprint: Fingerprint of the current stack file
+        :return: True if the stack file was already validated, False otherwise
+        """
+        if not self.stack_validation_file.exists():
+            return False
+        try:
+            validated = self.__load_json_file(self.stack_validation_file)
+        except Exception:
+            return False
+        return validated.get("sha256") == fingerprint["sha256"] and validated.get("size") == fingerprint["size"] \
+            and validated.get("smartmonitoring_version") == fingerprint["smartmonitoring_version"]
 
-    def save_status(self, status: str, upd_channel: str = None, pkg_version: str = None, error_msg: str = "-") -> None:
+    def __save_stack_validation(self, fingerprint: dict) -> None:
+        """
+        Saves the fingerprint of a successfully validated stack file. Errors are only logged, since the cache is
+        optional.
+        :param fingerprint: Fingerprint of the validated stack file
+        """
+        try:
+            self.__save_json_file(self.stack_validation_file, fingerprint)
+        except OSError as e:
+            lg.warning(f'Could not save stack validation cache: {self.stack_validation_file}, message: {e}')
+
+    def save_status(self, status: str, upd_channel: str = None, pkg_version: str = None, error_msg: str = "-",
+                    metrics: dict = None) -> None:
         """
         Saves the status file with the given status, update channel, package version and error message.
+        If the metrics of a finished deployment run are given, they are saved as last run and appended to the runs
+        of the metrics block, of which only the most recent ones are kept.
         :param status: Status of the current deployment process
         :param upd_channel: Channel of the current deployment
         :param pkg_version: Version of the current deployment
         :param error_msg: Error message that occurred during the deployment process
-        """
-        deployment_start = None
-
-        # Check if a not allowed status is given
-        allowed_statuses = ["Deployed", "Deploying", "DeploymentError"]
-        if status not in allowed_statuses:
-            raise ValueError(f'Invalid status: {status}, allowed statuses: {allowed_statuses}')
-
-        if not self.status_file.exists():
-            if pkg_version is None: pkg_version = "-"
-            if upd_channel is None: upd_channel = "-"
-            if status == "Deployed":
-                last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            elif status == "Deploying":
-                last_update = "-"
-                deployment_start = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        :param metrics: Metrics of the deployment run that finished with this status
+        """
+        with self.__lock_status_file():
+            deployment_start = None
+
+            # Check if a not allowed status is given
+            allowed_statuses = ["Deployed", "Deploying", "DeploymentError"]
+            if status not in allowed_statuses:
+                raise ValueError(f'Invalid status: {status}, allowed statuses: {allowed_statuses}')
+
+            if not self.status_file.exists():
+                if pkg_version is None: pkg_version = "-"
+                if upd_channel is None: upd_channel = "-"
+                if status == "Deployed":
+                    last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                elif status == "Deploying":
+                    last_update = "-"
+                    deployment_start = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                else:
+                    last_update = "-"
+                data = {
+                    "status": status,
+                    "error_msg": error_msg,
+                    "smartmonitoring_version": __version__,
+                    "update_channel": upd_channel,
+                    "package_version": pkg_version,
+                    "last_update": last_update,
+                    "deployment_start": deployment_start
+                }
             else:
-                last_update = "-"
-            data = {
-                "status": status,
-                "error_msg": error_msg,
-                "smartmonitoring_version": __version__,
-                "update_channel": upd_channel,
-                "package_version": pkg_version,
-                "last_update": last_update,
-                "deployment_start": deployment_start
-            }
-        else:
+                data = self.get_status()
+                if pkg_version is None: pkg_version = data["package_version"]
+                if upd_channel is None: upd_channel = data["update_channel"]
+                if status == "Deployed":
+                    last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                elif status == "Deploying":
+                    last_update = data["last_update"]
+                    deployment_start = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                else:
+                    last_update = data["last_update"]
+                data["status"] = status
+                data["error_msg"] = error_msg
+                data["smartmonitoring_version"] = __version__
+                data["update_channel"] = upd_channel
+                data["package_version"] = pkg_version
+                data["last_update"] = last_update
+                data["deployment_start"] = deployment_start
+
+            if metrics is not None:
+                runs = (data.get("metrics") or {}).get("runs", []) + [metrics]
+                data["metrics"] = {"last_run": metrics, "runs": runs[-cs.DEPLOYMENT_METRICS_HISTORY:]}
+
+            lg.debug(f'Saving status: {status}')
+            self.__save_json_file(self.status_file, data)
+
+    def save_time_to_ready(self, time_to_ready: dict) -> None:
+        """
+        Adds the measured time until each container was ready to the status file.
+        :param time_to_ready: Dict with the container name as key and the seconds until it was ready as value
+        """
+        with self.__lock_status_file():
+            data = self.get_status()
+            data["time_to_ready"] = (data.get("time_to_ready") or {}) | time_to_ready
+            lg.debug(f'Saving time to ready: {time_to_ready}')
+            self.__save_json_file(self.status_file, data)
+
+    def save_container_event(self, container_name: str, event: str, event_time: str, exit_code: str = None) -> None:
+        """
+        Records an event of a container in the status file. Die, oom and restart events increase the counters of the
+        container and the totals, health status events update its health. The most recent events are kept as well.
+        Events are only recorded while SmartMonitoring is deployed.
+        :param container_name: Name of the container
+        :param event: Name of the event, e.g. die or health_status: unhealthy
+        :param event_time: Time of the event
+        :param exit_code: Exit code of the container for die events
+        """
+        with self.__lock_status_file():
+            if not self.status_file.exists():
+                lg.debug(f'Status file does not exist, skip recording event {event} of container {container_name}')
+                return
             data = self.get_status()
-            if pkg_version is None: pkg_version = data["package_version"]
-            if upd_channel is None: upd_channel = data["update_channel"]
-            if status == "Deployed":
-                last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            elif status == "Deploying":
-                last_update = data["last_update"]
-                deployment_start = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            events = data.get("container_events") or {"totals": {}, "containers": {}, "recent": []}
+            container = events["containers"].setdefault(container_name, {
+                "die": 0, "oom": 0, "restart": 0, "health_status": "-", "last_event": "-", "last_event_time": "-"
+            })
+            if event.startswith("health_status"):
+                container["health_status"] = event.split(":", 1)[1].strip()
             else:
-                last_update = data["last_update"]
-            data["status"] = status
-            data["error_msg"] = error_msg
-            data["smartmonitoring_version"] = __version__
-            data["update_channel"] = upd_channel
-            data["package_version"] = pkg_version
-            data["last_update"] = last_update
-            data["deployment_start"] = deployment_start
-
-        lg.debug(f'Saving status: {status}')
-        self.__save_json_file(self.status_file, data)
+                container[event] += 1
+            container["last_event"] = event
+            container["last_event_time"] = event_time
+            events["totals"] = {counter: sum(c[counter] for c in events["containers"].values())
+                                for counter in ("die", "oom", "restart")}
+            events["recent"] = (events["recent"] + [{"time": event_time, "container": container_name, "event": event,
+                                                     "exit_code": exit_code}])[-cs.CONTAINER_EVENTS_HISTORY:]
+            data["container_events"] = events
+            lg.debug(f'Saving event {event} of container {container_name}')
+            self.__save_json_file(self.status_file, data)
+
+    @contextmanager
+    def __lock_status_file(self):
+        """
+        Locks the status file for a read-modify-write update, within this process and across processes. The lock can
+        be taken again by the thread that holds it.
+        """
+        import fcntl
+        with self.__status_lock:
+            if self.__status_lock_fd is not None:
+                yield
+                return
+            fd = os.open(self.status_lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                self.__status_lock_fd = fd
+                yield
+            finally:
+                self.__status_lock_fd = None
+                os.close(fd)
 
     def get_status(self) -> dict:
         """
@@ -465,15 +769,130 @@ class DataHandler:
             lg.error(f'Error getting status from file: {self.status_file}')
             raise
 
-    def __save_json_file(self, file: os.path, data: dict) -> None:
+    def save_banner_snapshot(self, snapshot: dict) -> None:
+        """
+        Saves the pre-computed information for the login banner.
+        :param snapshot: Dict with all values shown in the login banner
+        """
+        lg.debug(f'Saving banner snapshot to file: {self.banner_file}')
+        self.__save_json_file(self.banner_file, snapshot)
+
+    def get_banner_snapshot(self) -> Optional[dict]:
+        """
+        Loads the pre-computed information for the login banner.
+        :return: Content of the banner snapshot as dict or None if no valid snapshot exists
+        """
+        if not self.banner_file.exists():
+            return None
+        try:
+            return self.__load_json_file(self.banner_file)
+        except Exception:
+            return None
+
+    def save_ip_address_cache(self, cache: dict) -> None:
+        """
+        Saves the resolved ip addresses.
+        :param cache: Dict with the name of the address as key and its value and expiry time as value
+        """
+        lg.debug(f'Saving ip address cache to file: {self.ip_address_cache_file}')
+        self.__save_json_file(self.ip_address_cache_file, cache)
+
+    def get_ip_address_cache(self) -> dict:
+        """
+        Loads the resolved ip addresses.
+        :return: Content of the ip address cache as dict, empty if no valid cache exists
+        """
+        if not self.ip_address_cache_file.exists():
+            return {}
+        try:
+            return self.__load_json_file(self.ip_address_cache_file)
+        except Exception:
+            return {}
+
+    def save_prefetch_record(self, package_version: str, update_channel: str, images: list[str],
+                             pulled: list[str]) -> None:
+        """
+        Saves which images of a package version are present on the host after a prefetch.
+        :param package_version: Package version of the prefetched manifest
+        :param update_channel: Update channel of the prefetched manifest
+        :param images: All images of the manifest, which are now present on the host
+        :param pulled: Images that had to be pulled by the prefetch
+        """
+        record = {
+            "package_version": package_version,
+            "update_channel": update_channel,
+            "images": images,
+            "pulled": pulled,
+            "prefetched_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        lg.debug(f'Saving prefetch record to file: {self.prefetch_file}')
+        self.__save_json_file(self.prefetch_file, record)
+
+    def get_prefetch_record(self) -> Optional[dict]:
+        """
+        Loads the record of the last prefetch.
+        :return: Content of the prefetch record as dict or None if no valid record exists
+        """
+        if not self.prefetch_file.exists():
+            return None
+        try:
+            return self.__load_json_file(self.prefetch_file)
+        except Exception:
+            return None
+
+    def register_image_version(self, manifest: UpdateManifest, installed: bool = True) -> None:
+        """
+        Records the images of a package version as the newest entry of the image registry. The images of a version
+        are registered as not installed before they are pulled, so that the retention policy also removes the images
+        of a deployment that failed.
+        :param manifest: UpdateManifest object of the version
+        :param installed: True if the version has been deployed, False if its images are about to be pulled
+        """
+        versions = self.get_image_registry()
+        if not installed and any(entry["package_version"] == manifest.package_version for entry in versions):
+            return
+        versions = [entry for entry in versions if entry["package_version"] != manifest.package_version]
+        versions.append({
+            "package_version": manifest.package_version,
+            "images": list(dict.fromkeys(container.image for container in manifest.containers)),
+            "installed": installed,
+            "deployed_at" if installed else "pulled_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        })
+        self.save_image_registry(versions)
+
+    def save_image_registry(self, versions: list[dict]) -> None:
+        """
+        Saves the image registry.
+        :param versions: List of registry entries, ordered from the oldest to the newest deployed version
+        """
+        lg.debug(f'Saving image registry to file: {self.image_registry_file}')
+        self.__save_json_file(self.image_registry_file, {"versions": versions})
+
+    def get_image_registry(self) -> list[dict]:
+        """
+        Loads the image registry, which lists the images of each deployed package version and of the versions whose
+        images have been pulled for a deployment that has not finished.
+        :return: List of registry entries, ordered from the oldest to the newest version
+        """
+        if not self.image_registry_file.exists():
+            return []
+        return self.__load_json_file(self.image_registry_file)["versions"]
+
+    def __save_json_file(self, file: os.path, data: dict, private: bool = False) -> None:
         """
         Saves the given data as json to the given file.
         :param file: File to save the data to
         :param data: Data as dict to save as json
+        :param private: Only allow the owner to read and write the file
         """
         lg.debug(f'Saving data to json file: {file}')
-        with open(file, 'w') as f:
+        # Write to a temporary file first, so that readers never see a partially written file
+        tmp_file = f'{file}.tmp'
+        if os.path.exists(tmp_file): os.remove(tmp_file)
+        mode = 0o600 if private else 0o644
+        with os.fdopen(os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode), 'w') as f:
             json.dump(data, f, indent=4)
+        os.replace(tmp_file, file)
 
     def __load_json_file(self, file: os.path) -> dict:
         """
@@ -497,9 +916,67 @@ class DataHandler:
         if os.path.exists(self.stack_file):
             lg.debug(f'Removing stack file: {self.stack_file}')
             os.remove(self.stack_file)
+        if os.path.exists(self.stack_validation_file):
+            lg.debug(f'Removing stack validation cache: {self.stack_validation_file}')
+            os.remove(self.stack_validation_file)
+        self.__installed_stack = None
+        if os.path.exists(self.previous_stack_file):
+            lg.debug(f'Removing previous stack file: {self.previous_stack_file}')
+            os.remove(self.previous_stack_file)
         if os.path.exists(self.status_file):
             lg.debug(f'Removing status file: {self.status_file}')
             os.remove(self.status_file)
+        if os.path.exists(self.banner_file):
+            lg.debug(f'Removing banner snapshot file: {self.banner_file}')
+            os.remove(self.banner_file)
+        if os.path.exists(self.ip_address_cache_file):
+            lg.debug(f'Removing ip address cache file: {self.ip_address_cache_file}')
+            os.remove(self.ip_address_cache_file)
+        if os.path.exists(self.prefetch_file):
+            lg.debug(f'Removing prefetch record file: {self.prefetch_file}')
+            os.remove(self.prefetch_file)
+        if os.path.exists(self.secrets_file):
+            lg.debug(f'Removing secrets file: {self.secrets_file}')
+            os.remove(self.secrets_file)
+        if os.path.exists(self.image_registry_file):
+            lg.debug(f'Removing image registry file: {self.image_registry_file}')
+            os.remove(self.image_registry_file)
+        if os.path.exists(self.journal.ended_file):
+            lg.debug(f'Removing deployment journal end time file: {self.journal.ended_file}')
+            os.remove(self.journal.ended_file)
+
+    def get_dynamic_secrets(self, secret_names: list[str]) -> dict:
+        """
+        Returns the persisted password for each secret name in the given list. Passwords for secrets that have not
+        been persisted yet are generated and saved to the secrets file, which is only readable by root.
+        :param secret_names: List of secret names to get a password for
+        :return: Dict of all secrets with key as name and value as password
+        """
+        persisted = self.__load_persisted_secrets()
+        missing = self.get_unpersisted_secret_names(secret_names)
+        if missing:
+            lg.info(f'Generating new dynamic secrets: {", ".join(missing)}')
+            persisted = persisted | self.generate_dynamic_secrets(missing)
+            self.__save_json_file(self.secrets_file, persisted, private=True)
+        return {secret: persisted[secret] for secret in secret_names or []}
+
+    def get_unpersisted_secret_names(self, secret_names: list[str]) -> list[str]:
+        """
+        Returns the secret names from the given list for which no password has been persisted yet.
+        :param secret_names: List of secret names
+        :return: List of secret names without a persisted password
+        """
+        persisted = self.__load_persisted_secrets()
+        return [secret for secret in secret_names or [] if secret not in persisted]
+
+    def __load_persisted_secrets(self) -> dict:
+        """
+        Loads the persisted dynamic secrets.
+        :return: Dict of all persisted secrets with key as name and value as password
+        """
+        if not self.secrets_file.exists():
+            return {}
+        return self.__load_json_file(self.secrets_file)
 
     def generate_dynamic_secrets(self, secret_names: list[str]) -> dict:
         """
@@ -533,6 +1010,7 @@ class DataHandler:
         :return: Tuple of bool and string. Bool is True if dicts are equal, False if not. String is a message containing
         all found changes.
         """
+        from deepdiff import DeepDiff
         difference = DeepDiff(old_dict, new_dict)
         difference.items()
         if not difference:
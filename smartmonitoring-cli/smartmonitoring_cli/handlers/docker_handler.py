@@ -1,5 +1,11 @@
+import asyncio
+import contextvars
+import json
 import logging as lg
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional
 
 import docker
@@ -7,9 +13,12 @@ from docker import errors
 from docker.errors import NotFound, APIError
 from docker.models import containers
 from docker.types import Mount, LogConfig
+from docker.utils import parse_repository_tag
 
-from smartmonitoring_cli.models.update_manifest import ContainerConfig, MappedFile, Port
+from smartmonitoring_cli.models.update_manifest import ContainerConfig, MappedFile, Port, Volume
 import smartmonitoring_cli.const_settings as cs
+import smartmonitoring_cli.helpers.profile_helper as ph
+import smartmonitoring_cli.helpers.dependency_graph as dg
 
 class DockerInstanceUnavailable(Exception):
     pass
@@ -23,47 +32,214 @@ class ImageDoesNotExist(Exception):
     pass
 
 
+class PortBindingConflict(ContainerCreateError):
+    pass
+
+
+class ContainerNotReady(ContainerCreateError):
+    pass
+
+
 class DockerHandler:
-    def __init__(self, client: docker = None):
+    # Client of the local docker instance, shared by all handlers of the same process
+    __shared_client = None
+    __shared_client_pid = None
+
+    def __init__(self, client: docker = None, backend: str = None):
+        self.__snapshot = None
+        self.__snapshot_lock = threading.Lock()
+        self.engine = None
         if client is None:
-            self.__connect_to_local_docker_instance()
-
-    def __connect_to_local_docker_instance(self, attempt: int = 1) -> None:
-        """
-        Connect to the local docker instance
-        :param attempt: Amount of attempts to connect to the docker instance
-        before a DockerInstanceUnavailable exception is raised
-        """
-        retries = 3
-        if attempt > retries:
-            lg.error("Could not connect to local docker instance")
-            raise DockerInstanceUnavailable("Could not connect to local docker instance")
+            with ph.phase("Docker connect"):
+                self.__connect_to_local_docker_instance()
+        else:
+            self.client = client
+        if backend is None: backend = os.environ.get(cs.DOCKER_BACKEND_ENV_VARIABLE, cs.DOCKER_BACKEND)
+        if backend == "asyncio":
+            self.__use_engine_client()
+        elif backend != "docker-py":
+            lg.warning(f'Unknown docker backend {backend}, using docker-py')
+
+    def __use_engine_client(self) -> None:
+        """
+        Enables the asyncio backend, which talks to the engine socket directly for the concurrent operations
+        """
+        socket_path = self.__get_engine_socket_path()
+        if socket_path is None:
+            lg.warning("The asyncio docker backend requires a unix socket, using docker-py")
+            return
+        from smartmonitoring_cli.handlers.engine_client import EngineClient
+        lg.debug(f'Using asyncio docker backend on socket {socket_path}')
+        self.engine = EngineClient(socket_path)
+
+    def __connect_to_local_docker_instance(self) -> None:
+        """
+        Connect to the local docker instance. The client of a previous handler of this process is reused, otherwise
+        the engine is pinged with a short, growing backoff until it answers. Raises a DockerInstanceUnavailable
+        exception if the engine does not answer within the deadline.
+        """
+        if DockerHandler.__shared_client is not None and DockerHandler.__shared_client_pid == os.getpid():
+            self.client = DockerHandler.__shared_client
+            return
+        start = time.perf_counter()
+        deadline = start + cs.DOCKER_ENGINE_READY_TIMEOUT_SECONDS
+        delay = cs.DOCKER_ENGINE_INITIAL_BACKOFF_SECONDS
+        socket_path = self.__get_engine_socket_path()
+        self.client = None
+        attempts = 0
+        while True:
+            attempts += 1
+            error = self.__ping_engine(socket_path)
+            if error is None:
+                break
+            if time.perf_counter() + delay > deadline:
+                lg.error("Could not connect to local docker instance")
+                if self.client is not None:
+                    self.client.close()
+                raise DockerInstanceUnavailable(f'Local docker instance did not answer within '
+                                                f'{cs.DOCKER_ENGINE_READY_TIMEOUT_SECONDS}s: {error}')
+            if attempts == 1:
+                lg.warning(f'Local docker instance is not ready, waiting up to '
+                           f'{cs.DOCKER_ENGINE_READY_TIMEOUT_SECONDS}s for it...')
+            lg.debug(f'Docker engine not ready: {error}, retry in {delay}s')
+            time.sleep(delay)
+            delay = min(delay * 2, cs.DOCKER_ENGINE_MAX_BACKOFF_SECONDS)
+        if attempts > 1:
+            lg.info(f'Local docker instance ready after {round(time.perf_counter() - start, 2)}s and {attempts} pings')
+        DockerHandler.__shared_client = self.client
+        DockerHandler.__shared_client_pid = os.getpid()
+
+    def __ping_engine(self, socket_path: Optional[str]) -> Optional[str]:
+        """
+        Pings the docker engine once. The engine socket has to exist before the client is created, the client is
+        only created once and reused by all further pings.
+        :param socket_path: Path of the unix socket of the engine, None if the engine is not reached over a socket
+        :return: None if the engine answered, the reason why it did not answer otherwise
+        """
+        if socket_path is not None and not os.path.exists(socket_path):
+            return f'socket {socket_path} does not exist yet'
         try:
-            self.client = docker.from_env()
-        except errors.DockerException as e:
-            lg.warning(f'Error connecting to local docker instance, attempt {attempt} of {retries}, retry in 10s.')
-            lg.debug(f'Message: {e}')
-            time.sleep(10)
-            self.__connect_to_local_docker_instance(attempt + 1)
+            if self.client is None:
+                self.client = docker.from_env()
+            self.client.ping()
+            return None
+        except (errors.DockerException, OSError) as e:
+            return str(e)
+
+    def __get_engine_socket_path(self) -> Optional[str]:
+        """
+        Get the path of the unix socket of the local docker engine
+        :return: Path of the socket, None if DOCKER_HOST points to a non-socket address
+        """
+        host = os.environ.get("DOCKER_HOST")
+        if not host:
+            return cs.DOCKER_DEFAULT_SOCKET
+        if host.startswith("unix://"):
+            return host[len("unix://"):]
+        return None
+
+    def get_snapshot(self) -> dict[str, containers.Container]:
+        """
+        Get all containers of the SmartMonitoring deployment. They are listed with a single api call filtered by the
+        stack label and cached until the snapshot is invalidated. Containers that are created, renamed or removed
+        through this handler are updated in the cached snapshot.
+        The container objects only carry the attributes of the container list, their name, id, status and labels are
+        set, but Config and the full State are not. Callers that need them must reload the container, e.g. through
+        get_container_attributes.
+        :return: Dict with the container name as key and the docker container object as value
+        """
+        with self.__snapshot_lock:
+            if self.__snapshot is None:
+                label = f'{cs.CONTAINER_LABEL_STACK}={cs.CONTAINER_STACK_NAME}'
+                with ph.phase("Container snapshot"):
+                    if self.engine is not None:
+                        listed = [self.client.containers.prepare_model(attrs) for attrs in asyncio.run(
+                            self.engine.request("GET", "/containers/json",
+                                                {"all": "1", "filters": json.dumps({"label": [label]})}))]
+                    else:
+                        listed = self.client.containers.list(all=True, sparse=True, filters={"label": label})
+                for container in listed:
+                    # The container list has no Name attribute, without it the name of the container object is None
+                    container.attrs["Name"] = container.attrs["Names"][0]
+                self.__snapshot = {container.name: container for container in listed}
+                lg.debug(f'Container snapshot with {len(self.__snapshot)} containers loaded')
+            return self.__snapshot
+
+    def invalidate_snapshot(self) -> None:
+        """
+        Discards the cached container snapshot, so that the next operation lists the containers again
+        """
+        with self.__snapshot_lock:
+            self.__snapshot = None
+
+    def __update_snapshot(self, container_name: str, container: Optional[containers.Container]) -> None:
+        """
+        Updates a container in the cached snapshot after it was changed through this handler
+        :param container_name: Name of the container as string
+        :param container: Docker container object, None if the container no longer exists under this name
+        """
+        with self.__snapshot_lock:
+            if self.__snapshot is None:
+                return
+            if container is None:
+                self.__snapshot.pop(container_name, None)
+            else:
+                self.__snapshot[container_name] = container
 
     def get_container(self, container_name: str) -> containers.Container:
         """
-        Get a container by its name
+        Get a container by its name from the container snapshot. Containers without the stack label, e.g. created
+        by an older version, are looked up by their name and added to the snapshot.
         :param container_name: Name of the container as string
         :return: Docker container object
         """
+        snapshot = self.get_snapshot()
+        if container_name in snapshot:
+            return snapshot[container_name]
         try:
             lg.debug(f'Getting container {container_name}')
-            return self.client.containers.get(container_name)
+            container = self.client.containers.get(container_name)
         except NotFound:
             lg.debug("Container " + container_name + " not found")
             raise
+        self.__update_snapshot(container_name, container)
+        return container
+
+    def check_if_container_exists(self, container_name: str) -> bool:
+        """
+        Check if a container exists in the local docker instance
+        :param container_name: Name of the container as string
+        :return: True if the container exists, False otherwise
+        """
+        try:
+            self.get_container(container_name)
+            return True
+        except NotFound:
+            return False
+
+    def get_container_attributes(self, container_name: str) -> dict:
+        """
+        Get the current low-level attributes of a container, including its state and network settings
+        :param container_name: Name of the container as string
+        :return: Dict with the attributes as returned by the docker api
+        """
+        container = self.get_container(container_name)
+        container.reload()
+        return container.attrs
+
+    def get_container_logs(self, container_name: str) -> str:
+        """
+        Get the logs a container has written to stdout and stderr since it was created
+        :param container_name: Name of the container as string
+        :return: Logs of the container as string
+        """
+        return self.get_container(container_name).logs().decode("utf-8", errors="replace")
 
     def get_containers_from_config(self, conf_containers: list[ContainerConfig]) -> list[containers.Container]:
         """
         Get a list of Docker container objects from a list of ContainerConfig objects
         :param conf_containers: List of ContainerConfig objects
-        :return: List of Docker container objects
+        :return: List of Docker container objects, with the attributes of the container snapshot
         """
         containers = []
         for container in conf_containers:
@@ -76,26 +252,78 @@ class DockerHandler:
         :param container_config: ContainerConfig object
         :return: Dict with statistics of the container
         """
-        container = None
         try:
             container = self.get_container(container_config.name)
-            name = container.name
-            status = container.status
-            image = container_config.image
         except NotFound:
-            name = container_config.name
+            return self.__compose_container_stats(container_config, None, None)
+        return self.__compose_container_stats(container_config, container.status,
+                                              container.stats(decode=False, stream=False))
+
+    def get_containers_stats(self, conf_containers: list[ContainerConfig],
+                             executor: ThreadPoolExecutor = None) -> list[dict]:
+        """
+        Get statistics of several containers. The engine needs one to two seconds per sample, with the asyncio
+        backend or an executor all containers are sampled concurrently.
+        :param conf_containers: List of ContainerConfig objects
+        :param executor: Executor on which the samples of the docker-py backend are taken, e.g. for a dashboard
+        :return: List of dicts with statistics of each container
+        """
+        if self.engine is None:
+            if executor is not None:
+                return list(executor.map(self.get_container_stats, conf_containers))
+            return [self.get_container_stats(container) for container in conf_containers]
+        statuses = {}
+        for container in conf_containers:
+            try:
+                statuses[container.name] = self.get_container(container.name).status
+            except NotFound:
+                statuses[container.name] = None
+        return asyncio.run(self.__get_containers_stats_async(conf_containers, statuses))
+
+    async def __get_containers_stats_async(self, conf_containers: list[ContainerConfig], statuses: dict) -> list[dict]:
+        """
+        Samples the statistics of all existing containers concurrently over the engine socket
+        :param conf_containers: List of ContainerConfig objects
+        :param statuses: Dict with the container name as key and its status as value, None if it does not exist
+        :return: List of dicts with statistics of each container
+        """
+        from smartmonitoring_cli.handlers.engine_client import EngineResourceNotFound
+
+        async def sample(container: ContainerConfig) -> dict:
+            if statuses[container.name] is None:
+                return self.__compose_container_stats(container, None, None)
+            try:
+                stats = await self.engine.request("GET", f'/containers/{container.name}/stats', {"stream": "false"})
+            except EngineResourceNotFound:
+                return self.__compose_container_stats(container, None, None)
+            return self.__compose_container_stats(container, statuses[container.name], stats)
+
+        return list(await asyncio.gather(*(sample(container) for container in conf_containers)))
+
+    def __compose_container_stats(self, container_config: ContainerConfig, status: Optional[str],
+                                  stats: Optional[dict]) -> dict:
+        """
+        Composes the statistics of a container from a sample of the stats api
+        :param container_config: ContainerConfig object
+        :param status: Status of the container, None if it does not exist
+        :param stats: Sample of the stats api, None if the container does not exist
+        :return: Dict with statistics of the container, the raw values are in the metrics dict
+        """
+        name = container_config.name
+        metrics = {}
+        if status is None:
             status = "Not found"
             image = "-"
             mem_usage_mb = "-"
             mem_usage_percent = "-"
-
-        if container is not None:
+        else:
+            image = container_config.image
             try:
-                stats = container.stats(decode=False, stream=False)
-                mem_usage_mb = str(round(stats['memory_stats']['usage'] / 1024 / 1024, 2)) + " MB"
-                mem_usage_percent = str(self.__calculate_cpu_usage(stats)) + " %"
+                metrics = {"mem_bytes": stats['memory_stats']['usage'], "cpu_percent": self.calculate_cpu_usage(stats)}
+                mem_usage_mb = str(round(metrics["mem_bytes"] / 1024 / 1024, 2)) + " MB"
+                mem_usage_percent = str(metrics["cpu_percent"]) + " %"
             except KeyError as e:
-                lg.debug(f'Error getting statistics for Container {container.name} {e}')
+                lg.debug(f'Error getting statistics for Container {name} {e}')
                 mem_usage_mb = "N/A"
                 mem_usage_percent = "N/A"
 
@@ -104,10 +332,13 @@ class DockerHandler:
             'status': status,
             'image': image,
             "mem_usg_mb": mem_usage_mb,
-            "cpu_usg_present": mem_usage_percent
+            "cpu_usg_present": mem_usage_percent,
+            "net_io": "-",
+            "block_io": "-",
+            "metrics": metrics
         }
 
-    def __calculate_cpu_usage(self, stats: dict) -> float:
+    def calculate_cpu_usage(self, stats: dict) -> float:
         """
         Calculate the cpu usage of a container based on the stats form docker api
         :param stats: Stats dict of a container
@@ -128,9 +359,13 @@ class DockerHandler:
             lg.info(f'Starting Container {container_name}...')
             container = self.get_container(container_name)
             container.start()
+            ph.mark("Container started")
             lg.debug(f'Container {container_name} started')
         except APIError as e:
-            lg.critical(f'Error stopping container: {container_name}')
+            lg.critical(f'Error starting container: {container_name}')
+            if "port is already allocated" in str(e) or "address already in use" in str(e):
+                raise PortBindingConflict(f'Container {container_name} could not be started, because a host port '
+                                          f'it binds is already in use: {e}') from e
             raise e
 
     def stop_container(self, container_name: str):
@@ -142,6 +377,7 @@ class DockerHandler:
             container = self.get_container(container_name)
             lg.info(f'Stopping container {container_name}...')
             container.stop()
+            ph.mark("Container stopped")
             lg.debug(f'Container {container_name} stopped')
         except NotFound:
             lg.info(f'Skip stopping container {container_name} because it does not exist')
@@ -149,6 +385,25 @@ class DockerHandler:
             lg.error(f'Error stopping container: {container_name}')
             raise
 
+    def rename_container(self, container_name: str, new_name: str) -> None:
+        """
+        Rename a container
+        :param container_name: Current name of the container as string
+        :param new_name: New name of the container as string
+        """
+        lg.debug(f'Renaming container {container_name} to {new_name}')
+        try:
+            container = self.get_container(container_name)
+        except NotFound:
+            if not self.check_if_container_exists(new_name):
+                raise
+            lg.debug(f'Container {container_name} has already been renamed to {new_name}')
+            return
+        container.rename(new_name)
+        container.attrs["Name"] = f'/{new_name}'
+        self.__update_snapshot(container_name, None)
+        self.__update_snapshot(new_name, container)
+
     def restart_container(self, container_name: str) -> None:
         """
         Restart a container by its name
@@ -163,39 +418,42 @@ class DockerHandler:
             lg.error(f'Error restarting container: {container_name}')
             raise
 
+    @ph.phase("Container restart")
     def restart_containers(self, conf_containers: list[ContainerConfig]) -> None:
         """
-        Restart a list of containers
+        Restart a list of containers concurrently, dependencies are restarted before their dependents
         :param conf_containers: List of ContainerConfig objects
         """
-        for container in conf_containers:
-            self.restart_container(container.name)
+        dg.run_in_dependency_order(conf_containers, lambda c: self.restart_container(c.name), "Restart")
 
+    @ph.phase("Container stop")
     def stop_containers(self, conf_containers: list[ContainerConfig]) -> None:
         """
-        Stop a list of containers
+        Stop a list of containers concurrently, dependents are stopped before their dependencies
         :param conf_containers: List of ContainerConfig objects
         """
-        for container in conf_containers:
-            self.stop_container(container.name)
+        dg.run_in_dependency_order(conf_containers, lambda c: self.stop_container(c.name), "Stop", reverse=True)
 
+    @ph.phase("Container start")
     def start_containers(self, conf_containers: list[ContainerConfig]) -> None:
         """
-        Start a list of containers
+        Start a list of containers concurrently, dependencies are started before their dependents
         :param conf_containers: List of ContainerConfig objects
         """
-        for container in conf_containers:
-            self.start_container(container.name)
+        dg.run_in_dependency_order(conf_containers, lambda c: self.start_container(c.name), "Start")
 
+    @ph.phase("Container remove")
     def remove_containers(self, conf_containers: list[ContainerConfig]) -> None:
         """
-        Remove a list of containers
+        Stop and remove a list of containers concurrently, dependents are removed before their dependencies
         :param conf_containers: List of ContainerConfig objects
         """
-        self.stop_containers(conf_containers)
-        for container in conf_containers:
+        def stop_and_remove(container: ContainerConfig) -> None:
+            self.stop_container(container.name)
             self.remove_container(container.name)
 
+        dg.run_in_dependency_order(conf_containers, stop_and_remove, "Removal", reverse=True)
+
     def remove_container(self, container_name: str) -> None:
         """
         Remove a container by its name
@@ -204,8 +462,10 @@ class DockerHandler:
         try:
             container = self.get_container(container_name)
             lg.info(f'Removing container {container_name}...')
-            container.remove(force=True)
+            container.remove(force=True, v=True)
+            self.__update_snapshot(container_name, None)
         except NotFound:
+            self.__update_snapshot(container_name, None)
             lg.debug(f'Skipping removal of container {container_name} because it does not exist')
 
     def create_inter_network(self) -> None:
@@ -240,28 +500,58 @@ class DockerHandler:
         network.connect(container)
         lg.debug(f'Container {container.name} connected to SmartMonitoring bridge network')
 
-    def perform_cleanup(self) -> None:
+    @ph.phase("Cleanup")
+    def perform_cleanup(self, images: list[str]) -> None:
         """
-        Perform a cleanup of all unused images and volumes
+        Remove the given images, images that are still used by a container are skipped
+        :param images: List of image names to remove
         """
-        self.__remove_unused_images()
-        self.__remove_unused_volumes()
+        removed = [image for image in images if self.__remove_image_if_unused(image)]
+        if removed:
+            lg.debug(f'Removed {len(removed)} images: {removed}')
 
-    def __remove_unused_images(self) -> None:
+    def __remove_image_if_unused(self, image: str) -> bool:
         """
-        Remove all unused images
+        Remove an image if it exists and no container uses it
+        :param image: Name of the image as string
+        :return: True if the image was removed, False otherwise
         """
-        images = self.client.images.prune(filters={'dangling': False})
-        if images["ImagesDeleted"] is None: return
-        lg.debug(f'Removed {len(images["ImagesDeleted"])} images and freed {images["SpaceReclaimed"]} bytes')
+        try:
+            self.client.images.remove(image)
+            lg.info(f'Image {image} removed')
+            return True
+        except NotFound:
+            lg.debug(f'Skipping removal of image {image} because it does not exist')
+        except APIError as e:
+            lg.debug(f'Skipping removal of image {image} because it is still in use: {e}')
+        return False
 
-    def __remove_unused_volumes(self) -> None:
+    def stream_container_events(self, actions: list[str]):
         """
-        Remove all unused volumes
+        Subscribe to the events of the containers of the SmartMonitoring deployment
+        :param actions: Names of the events to subscribe to, e.g. die or oom
+        :return: Generator that blocks until the next event and yields it as dict
         """
-        volumes = self.client.volumes.prune()
-        if volumes["VolumesDeleted"] is None: return
-        lg.debug(f'Removed {len(volumes["VolumesDeleted"])} volumes and freed {volumes["SpaceReclaimed"]} bytes')
+        return self.client.events(decode=True, filters={
+            "type": "container",
+            "event": actions,
+            "label": f'{cs.CONTAINER_LABEL_STACK}={cs.CONTAINER_STACK_NAME}'
+        })
+
+    def get_docker_root_dir(self) -> str:
+        """
+        Get the data-root directory of the docker engine
+        :return: Path of the data-root
+        """
+        return self.client.info()["DockerRootDir"]
+
+    def get_disk_usage_percent(self) -> float:
+        """
+        Get the usage of the disk docker stores its images on
+        :return: Used disk space in percent
+        """
+        import psutil
+        return psutil.disk_usage(self.get_docker_root_dir()).percent
 
     def __check_if_image_exists(self, image_name: str) -> bool:
         """
@@ -277,39 +567,142 @@ class DockerHandler:
             lg.debug(f'Image {image_name} does not exist in local docker instance')
             return False
 
-    def pull_images(self, containers_config: list[ContainerConfig]) -> None:
+    def get_missing_images(self, containers_config: list[ContainerConfig]) -> list[str]:
+        """
+        Get the images of a list of containers that do not exist in the local docker instance
+        :param containers_config: List of ContainerConfig objects
+        :return: List of missing image names
+        """
+        images = list(dict.fromkeys(container.image for container in containers_config))
+        if self.engine is not None:
+            exists = asyncio.run(self.__check_if_images_exist_async(images))
+            return [image for image, found in zip(images, exists) if not found]
+        return [image for image in images if not self.__check_if_image_exists(image)]
+
+    async def __check_if_images_exist_async(self, images: list[str]) -> list[bool]:
+        """
+        Checks concurrently over the engine socket if images exist in the local docker instance
+        :param images: List of image names
+        :return: List with True for each image that exists, False otherwise
+        """
+        from smartmonitoring_cli.handlers.engine_client import EngineResourceNotFound
+
+        async def check(image: str) -> bool:
+            try:
+                await self.engine.request("GET", f'/images/{image}/json')
+                return True
+            except EngineResourceNotFound:
+                lg.debug(f'Image {image} does not exist in local docker instance')
+                return False
+
+        return list(await asyncio.gather(*(check(image) for image in images)))
+
+    @ph.phase("Image pull")
+    def pull_images(self, containers_config: list[ContainerConfig]) -> list[str]:
         """
-        Pull all images for a list of containers. If an image is not found on Docker Hub, a ImageDoesNotExist exception
-        is raised
+        Pull all missing images for a list of containers concurrently. If an image is not found on Docker Hub, a
+        ImageDoesNotExist exception is raised after all other pulls have finished.
         :param containers_config: List of ContainerConfig objects
+        :return: List of images that had to be pulled
         """
-        exist = True
+        images = list(dict.fromkeys(container.image for container in containers_config))
+        missing = self.get_missing_images(containers_config)
+        if not missing:
+            lg.debug(f'All {len(images)} images already exist, skip pulling')
+            return []
+
         not_found_images = []
-        for container in containers_config:
-            if not self.__check_if_image_exists(container.image):
-                try:
-                    self.__pull_image_if_not_exists(container.image)
-                except ImageDoesNotExist:
-                    not_found_images.append(container.image)
-                    exist = False
-        if not exist:
+        if self.engine is not None:
+            not_found_images = asyncio.run(self.__pull_images_async(missing))
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(missing), cs.MAX_PARALLEL_IMAGE_PULLS)) as pool:
+                futures = {pool.submit(contextvars.copy_context().run, self.__pull_image, image): image
+                           for image in missing}
+                for future in as_completed(futures):
+                    if future.exception() is not None:
+                        not_found_images.append(futures[future])
+        if not_found_images:
             raise ImageDoesNotExist(f'Error pulling the following images from Docker hub: {not_found_images}')
+        return missing
 
-    def __pull_image_if_not_exists(self, image: str) -> None:
+    def __pull_image(self, image: str) -> None:
         """
-        Pull an image from Docker Hub if it does not exist in local docker instance
+        Pull an image from Docker Hub through the streaming api and log the progress of each layer
         :param image: Name of the image as string
         """
-        if not self.__check_if_image_exists(image):
-            try:
+        repository, tag = parse_repository_tag(image)
+        lg.info(f'Pulling image {image} from docker hub...')
+        layers = {}
+        try:
+            for event in self.client.api.pull(repository, tag=tag, stream=True, decode=True):
+                if "error" in event:
+                    raise APIError(event["error"])
+                self.__log_pull_progress(image, event, layers)
+        except APIError as e:
+            lg.error(f'Error pulling image {image}: {e}')
+            raise ImageDoesNotExist(e)
+        self.__log_pulled_image(image, layers)
+
+    async def __pull_images_async(self, images: list[str]) -> list[str]:
+        """
+        Pulls images concurrently over the engine socket, at most MAX_PARALLEL_IMAGE_PULLS at the same time
+        :param images: List of image names
+        :return: List of images that could not be pulled
+        """
+        from smartmonitoring_cli.handlers.engine_client import EngineRequestError
+        semaphore = asyncio.Semaphore(cs.MAX_PARALLEL_IMAGE_PULLS)
+
+        async def pull(image: str) -> Optional[str]:
+            async with semaphore:
+                repository, tag = parse_repository_tag(image)
                 lg.info(f'Pulling image {image} from docker hub...')
-                self.client.images.pull(image)
-                lg.debug(f'Image {image} pulled from docker hub')
-            except APIError as e:
-                lg.error(f'Error pulling image {image}')
-                raise ImageDoesNotExist(e)
-        else:
-            lg.debug(f'Image {image} already exists, skip pulling')
+                layers = {}
+                try:
+                    async for event in self.engine.stream("POST", "/images/create",
+                                                          {"fromImage": repository, "tag": tag or "latest"}):
+                        if "error" in event:
+                            raise EngineRequestError(event["error"])
+                        self.__log_pull_progress(image, event, layers)
+                except (EngineRequestError, OSError) as e:
+                    lg.error(f'Error pulling image {image}: {e}')
+                    return image
+                self.__log_pulled_image(image, layers)
+                return None
+
+        return [image for image in await asyncio.gather(*(pull(image) for image in images)) if image is not None]
+
+    def __log_pulled_image(self, image: str, layers: dict) -> None:
+        """
+        Logs and counts the downloaded bytes of a pulled image
+        :param image: Name of the image as string
+        :param layers: Dict with the download progress of each layer
+        """
+        downloaded = sum(layer["total"] for layer in layers.values())
+        ph.count("Image pull bytes", downloaded)
+        lg.info(f'Image {image} pulled, {len(layers)} layers with {round(downloaded / 1024 / 1024, 2)} MB downloaded')
+
+    def __log_pull_progress(self, image: str, event: dict, layers: dict) -> None:
+        """
+        Logs the progress of a layer from an event of the streaming pull api
+        :param image: Name of the image that is pulled
+        :param event: Decoded event of the pull api
+        :param layers: Dict with the download progress of each layer, updated with the event
+        """
+        layer_id = event.get("id")
+        status = event.get("status", "")
+        if layer_id is None or layer_id == image.split(":")[-1]:
+            return
+        if status == "Downloading":
+            detail = event.get("progressDetail") or {}
+            total = detail.get("total") or 0
+            layer = layers.setdefault(layer_id, {"total": total, "step": 0})
+            layer["total"] = total
+            step = int(detail.get("current", 0) * 4 / total) if total else 0
+            if step > layer["step"]:
+                layer["step"] = step
+                lg.debug(f'{image}: layer {layer_id} {step * 25}% of {round(total / 1024 / 1024, 2)} MB')
+        elif status in ("Download complete", "Already exists", "Pull complete"):
+            lg.debug(f'{image}: layer {layer_id} {status.lower()}')
 
     def __compose_files(self, files: list[MappedFile]) -> Optional[list[Mount]]:
         """
@@ -328,6 +721,55 @@ class DockerHandler:
         lg.debug(f'Docker mounts objects created: {mount_files}')
         return mount_files
 
+    def __compose_volumes(self, volumes: list[Volume]) -> list[Mount]:
+        """
+        Compose a list of Mount objects from a list of Volume objects and create the named volumes if necessary
+        :param volumes: List of Volume objects to compose
+        :return: List of Docker Mount objects
+        """
+        if volumes is None: return []
+        mount_volumes = []
+        for volume in volumes:
+            volume_name = self.get_volume_name(volume)
+            self.__create_volume_if_not_exists(volume_name)
+            mount_volumes.append(Mount(source=volume_name, target=volume.container_path, type='volume'))
+        lg.debug(f'Docker volume mounts created: {mount_volumes}')
+        return mount_volumes
+
+    def __create_volume_if_not_exists(self, volume_name: str) -> None:
+        """
+        Create a named volume with the SmartMonitoring label if it does not exist
+        :param volume_name: Name of the volume as string
+        """
+        try:
+            self.client.volumes.get(volume_name)
+            lg.debug(f'Volume {volume_name} already exists')
+        except NotFound:
+            self.client.volumes.create(volume_name, labels={cs.MANAGED_VOLUME_LABEL: "true"})
+            lg.info(f'Volume {volume_name} created')
+
+    def get_volume_name(self, volume: Volume) -> str:
+        """
+        Get the name of the docker volume for a volume of the manifest
+        :param volume: Volume object
+        :return: Name of the docker volume
+        """
+        return f'{cs.VOLUME_NAME_PREFIX}{volume.name}'
+
+    def remove_volumes(self, conf_containers: list[ContainerConfig]) -> None:
+        """
+        Remove the named volumes of a list of containers
+        :param conf_containers: List of ContainerConfig objects
+        """
+        for container in conf_containers:
+            for volume in container.volumes or []:
+                volume_name = self.get_volume_name(volume)
+                try:
+                    self.client.volumes.get(volume_name).remove(force=True)
+                    lg.info(f'Volume {volume_name} removed')
+                except NotFound:
+                    lg.debug(f'Skipping removal of volume {volume_name} because it does not exist')
+
     def __compose_ports(self, ports: list[Port]) -> Optional[dict]:
         """
         Compose a dictionary of ports from a list of Port objects
@@ -353,21 +795,24 @@ class DockerHandler:
             'labels': f'{container_name}_log'
         })
 
-    def create_container(self, container: ContainerConfig, env_vars: dict, files: list[MappedFile] = None) -> None:
+    @ph.phase("Container create")
+    def create_container(self, container: ContainerConfig, env_vars: dict, files: list[MappedFile] = None,
+                         labels: dict = None) -> None:
         """
         Create a container from a ContainerConfig object
         :param container: ContainerConfig object
         :param env_vars: Environment variables to pass to the container
         :param files: List of MappedFile objects to mount in the container
+        :param labels: Labels of the container, the stack label is always added
         """
         self.remove_container(container.name)
         try:
-            mapped_files = self.__compose_files(files)
+            mapped_files = (self.__compose_files(files) or []) + self.__compose_volumes(container.volumes)
             mapped_ports = self.__compose_ports(container.ports)
             lg.debug(
                 f'Creating container {container.name} with image {container.image}, hostname {container.hostname} and '
                 f'env {env_vars}')
-            container = self.client.containers.create(
+            created = self.client.containers.create(
                 container.image,
                 command=container.commands,
                 name=container.name,
@@ -378,8 +823,10 @@ class DockerHandler:
                 log_config=self.__create_container_logger(container.name),
                 restart_policy={"Name": "unless-stopped"},
                 privileged=container.privileged,
+                labels=(labels or {}) | {cs.CONTAINER_LABEL_STACK: cs.CONTAINER_STACK_NAME},
                 detach=True)
-            self.__connect_container_to_inter_network(container)
+            self.__update_snapshot(container.name, created)
+            self.__connect_container_to_inter_network(created)
         except (APIError, ImageDoesNotExist) as e:
             lg.error(f'Error creating container {container.name}')
             raise ContainerCreateError(e) from e
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import logging as lg
+from typing import Any, AsyncIterator, Optional
+from urllib.parse import urlencode, quote
+
+import smartmonitoring_cli.const_settings as cs
+
+
+class EngineRequestError(Exception):
+    pass
+
+
+class EngineResourceNotFound(EngineRequestError):
+    pass
+
+
+class EngineClient:
+    def __init__(self, socket_path: str):
+        """
+        Minimal asyncio client for the Docker Engine API over its unix socket. Each request uses its own connection,
+        therefore any number of requests can run concurrently on one event loop without threads.
+        :param socket_path: Path of the unix socket of the docker engine
+        """
+        self.socket_path = socket_path
+
+    async def request(self, method: str, path: str, params: dict = None, body: Any = None) -> Any:
+        """
+        Sends a request to the engine and reads the whole response
+        :param method: HTTP method
+        :param path: Path of the endpoint without api version, e.g. /containers/json
+        :param params: Query parameters
+        :param body: Body that is sent as json
+        :return: Decoded json response, the raw body if the response is not json or None if it is empty
+        """
+        reader, writer = await self.__send(method, path, params, body)
+        try:
+            status, headers = await self.__read_head(reader)
+            payload = b"".join([chunk async for chunk in self.__read_body(reader, headers)])
+        finally:
+            writer.close()
+        self.__raise_for_status(status, payload, path)
+        if not payload:
+            return None
+        if headers.get("content-type", "").startswith("application/json"):
+            return json.loads(payload)
+        return payload
+
+    async def stream(self, method: str, path: str, params: dict = None) -> AsyncIterator[dict]:
+        """
+        Sends a request to an endpoint that streams json objects, e.g. stats, events or image pulls
+        :param method: HTTP method
+        :param path: Path of the endpoint without api version
+        :param params: Query parameters
+        :return: Async iterator that yields each decoded json object as soon as it was received
+        """
+        reader, writer = await self.__send(method, path, params, None)
+        try:
+            status, headers = await self.__read_head(reader)
+            if status >= 400:
+                payload = b"".join([chunk async for chunk in self.__read_body(reader, headers)])
+                self.__raise_for_status(status, payload, path)
+            buffer = b""
+            async for chunk in self.__read_body(reader, headers):
+                buffer += chunk
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    if line.strip():
+                        yield json.loads(line)
+            if buffer.strip():
+                yield json.loads(buffer)
+        finally:
+            writer.close()
+
+    async def __send(self, method: str, path: str, params: Optional[dict],
+                     body: Any) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """
+        Opens a connection to the engine and sends the request
+        :param method: HTTP method
+        :param path: Path of the endpoint without api version
+        :param params: Query parameters
+        :param body: Body that is sent as json
+        :return: Reader and writer of the connection
+        """
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        target = f'/v{cs.DOCKER_ENGINE_API_VERSION}{quote(path)}'
+        if params:
+            target += f'?{urlencode(params)}'
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        head = f'{method} {target} HTTP/1.1\r\nHost: docker\r\nConnection: close\r\nContent-Length: {len(data)}\r\n'
+        if body is not None:
+            head += "Content-Type: application/json\r\n"
+        lg.debug(f'Engine request: {method} {target}')
+        writer.write(head.encode("ascii") + b"\r\n" + data)
+        await writer.drain()
+        return reader, writer
+
+    async def __read_head(self, reader: asyncio.StreamReader) -> tuple[int, dict]:
+        """
+        Reads the status line and the headers of a response
+        :param reader: Reader of the connection
+        :return: Status code and dict with the lower-case header names as key
+        """
+        status_line = await reader.readline()
+        if not status_line:
+            raise EngineRequestError("Docker engine closed the connection without response")
+        status = int(status_line.split(b" ", 2)[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return status, headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    async def __read_body(self, reader: asyncio.StreamReader, headers: dict) -> AsyncIterator[bytes]:
+        """
+        Reads the body of a response, either chunked, with a content length or until the connection is closed
+        :param reader: Reader of the connection
+        :param headers: Headers of the response
+        :return: Async iterator over the received parts of the body
+        """
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    await reader.readline()
+                    return
+                yield await reader.readexactly(size)
+                await reader.readexactly(2)
+        elif "content-length" in headers:
+            length = int(headers["content-length"])
+            if length:
+                yield await reader.readexactly(length)
+        else:
+            while chunk := await reader.read(65536):
+                yield chunk
+
+    def __raise_for_status(self, status: int, payload: bytes, path: str) -> None:
+        """
+        Raises an exception if the engine answered with an error
+        :param status: Status code of the response
+        :param payload: Body of the response
+        :param path: Path of the endpoint, used for the error message
+        """
+        if status < 400:
+            return
+        try:
+            message = json.loads(payload)["message"]
+        except (ValueError, KeyError, TypeError):
+            message = payload.decode("utf-8", errors="replace")
+        if status == 404:
+            raise EngineResourceNotFound(f'{path}: {message}')
+        raise EngineRequestError(f'{path} failed with status {status}: {message}')
@@ -0,0 +1,80 @@
+import logging as lg
+import threading
+from datetime import datetime
+
+from docker.errors import APIError
+
+import smartmonitoring_cli.const_settings as cs
+from smartmonitoring_cli.handlers.data_handler import DataHandler
+from smartmonitoring_cli.handlers.docker_handler import DockerHandler
+
+
+class EventsWatcher:
+    def __init__(self, dock: DockerHandler, cfh: DataHandler):
+        """
+        Watches the event stream of the docker engine for crashes, oom kills, restarts and health changes of the
+        SmartMonitoring containers and records them in the status file as soon as they happen.
+        :param dock: DockerHandler instance
+        :param cfh: DataHandler instance
+        """
+        self.dock = dock
+        self.cfh = cfh
+        self.__stopped = threading.Event()
+
+    def start(self) -> None:
+        """Watches the events on a background thread"""
+        threading.Thread(target=self.run, daemon=True, name="events-watcher").start()
+
+    def stop(self) -> None:
+        """Stops watching, the watcher ends with the next event or reconnect"""
+        self.__stopped.set()
+
+    def run(self) -> None:
+        """
+        Watches the events until the watcher is stopped. If the event stream is interrupted, e.g. because the docker
+        engine restarts, the watcher reconnects after a short delay.
+        """
+        lg.info(f'Watching container events: {", ".join(cs.CONTAINER_EVENTS)}')
+        while not self.__stopped.is_set():
+            try:
+                for event in self.dock.stream_container_events(cs.CONTAINER_EVENTS):
+                    if self.__stopped.is_set():
+                        return
+                    self.__record_event(event)
+                lg.warning("Docker event stream ended")
+            except (APIError, OSError, ValueError) as e:
+                lg.warning(f'Docker event stream interrupted: {e}')
+            self.__stopped.wait(cs.CONTAINER_EVENTS_RECONNECT_SECONDS)
+
+    def __record_event(self, event: dict) -> None:
+        """
+        Records an event in the status file. Containers that die or restart during a journaled operation, i.e. a
+        deployment or a restart, are stopped on purpose, therefore these events are only logged. Events are delivered
+        with a delay, so events that happened before the last operation ended are treated the same way.
+        :param event: Event as decoded from the event stream
+        """
+        attributes = event["Actor"]["Attributes"]
+        name, action = attributes.get("name", event["Actor"]["ID"][:12]), event["Action"]
+        event_time = datetime.fromtimestamp(event["time"]).strftime("%Y-%m-%d %H:%M:%S")
+        if action in ("die", "restart") and self.__is_caused_by_operation(event):
+            lg.debug(f'Container {name}: {action} during a deployment or restart, event not recorded')
+            return
+        if action == "die":
+            lg.warning(f'Container {name} died with exit code {attributes.get("exitCode")}')
+        elif action == "oom":
+            lg.warning(f'Container {name} ran out of memory')
+        else:
+            lg.info(f'Container {name}: {action}')
+        self.cfh.save_container_event(name, action, event_time, attributes.get("exitCode"))
+
+    def __is_caused_by_operation(self, event: dict) -> bool:
+        """
+        Checks if an event happened while a journaled operation was running
+        :param event: Event as decoded from the event stream
+        :return: True if an operation is running or ended after the event happened, False otherwise
+        """
+        if self.cfh.journal.is_owner_alive():
+            return True
+        ended = self.cfh.journal.get_end_time()
+        happened = event["timeNano"] / 1e9 if "timeNano" in event else event["time"]
+        return ended is not None and happened <= ended
@@ -0,0 +1,225 @@
+import os
+import time
+from collections import deque
+from typing import Optional
+
+import psutil
+
+import smartmonitoring_cli.const_settings as cs
+
+
+class HostMetricsSampler:
+    def __init__(self, docker_root: str = None, samples: int = cs.HOST_METRICS_HISTORY_SAMPLES):
+        """
+        Samples the cpu, memory, mount and I/O metrics of the host. Each call of sample takes one snapshot of all
+        metrics, the values and rates are kept in ring buffers of fixed size from which min, avg and max are derived.
+        The counters are read once on creation, so that the first sample already has a baseline.
+        :param docker_root: Data-root of the docker engine, its mount is always sampled
+        :param samples: Number of samples that are kept of each metric
+        """
+        self.samples = samples
+        self.mounts = self.__get_mounts(docker_root)
+        self.__history = {}
+        self.__previous = self.__read_counters()
+        self.__previous_time = time.monotonic()
+        psutil.cpu_percent(interval=None)
+
+    def sample(self) -> None:
+        """Takes a snapshot of all metrics and derives the rates from the previous snapshot"""
+        baseline_age = time.monotonic() - self.__previous_time
+        if baseline_age < cs.HOST_METRICS_MIN_INTERVAL_SECONDS:
+            time.sleep(cs.HOST_METRICS_MIN_INTERVAL_SECONDS - baseline_age)
+        cpu_percent = psutil.cpu_percent(interval=None)
+        counters = self.__read_counters()
+        now = time.monotonic()
+        elapsed = now - self.__previous_time
+
+        self.__record("CPU", "cpu", {}, cpu_percent, None, psutil.cpu_count())
+        memory = counters["memory"]
+        self.__record("Memory", "memory", {}, memory["percent"], self.__get_rate(counters, "memory", "used", elapsed),
+                      memory["total"])
+        for mountpoint, label in self.mounts.items():
+            usage = counters["mounts"].get(mountpoint)
+            if usage is None:
+                continue
+            labels = {"mountpoint": mountpoint, "docker": str(label != mountpoint).lower()}
+            self.__record(f'Disk {label}', "disk", labels, usage["percent"],
+                          self.__get_rate(counters, "mounts", mountpoint, elapsed), usage["total"])
+        for name, counter in (("Disk Read", "disk_read"), ("Disk Write", "disk_write"),
+                              ("Network RX", "net_rx"), ("Network TX", "net_tx")):
+            if counters[counter] is None:
+                continue
+            rate = self.__get_rate(counters, counter, None, elapsed)
+            self.__record(name, counter, {}, rate, rate, counters[counter], is_rate=True)
+        self.__previous, self.__previous_time = counters, now
+
+    def get_values(self) -> list[dict]:
+        """
+        Get the raw values of the last sample with min, avg and max over the kept samples
+        :return: List of dicts with name, key, labels and unit of each metric and its value, rate, total, min, avg and
+        max. Rates are in bytes per second, the total is the core count, the capacity in bytes or the bytes transferred
+        """
+        values = []
+        for name, history in self.__history.items():
+            samples = [value for value in history["values"] if value is not None]
+            values.append({
+                "name": name,
+                "key": history["key"],
+                "labels": history["labels"],
+                "unit": "bytes_per_second" if history["is_rate"] else "percent",
+                "value": history["values"][-1],
+                "rate": history["rate"],
+                "total": history["total"],
+                "min": min(samples) if samples else None,
+                "avg": sum(samples) / len(samples) if samples else None,
+                "max": max(samples) if samples else None
+            })
+        return values
+
+    def get_rows(self) -> list[dict]:
+        """
+        Get the metrics of the last sample with min, avg and max over the kept samples
+        :return: List of dicts with name, current value, rate, min, avg and max of each metric as string
+        """
+        rows = []
+        for metric in self.get_values():
+            if metric["key"] == "cpu":
+                current = f'{metric["value"]} % of {metric["total"]} cores'
+            elif metric["unit"] == "percent":
+                current = f'{metric["value"]} % of {self.__format_bytes(metric["total"])}'
+            else:
+                current = f'{self.__format_bytes(metric["total"])} total'
+            rows.append({
+                "name": metric["name"],
+                "current": current,
+                "rate": self.__format_rate(metric["rate"], signed=metric["unit"] == "percent"),
+                "min": self.__format_value(metric["min"], metric["unit"]),
+                "avg": self.__format_value(metric["avg"], metric["unit"]),
+                "max": self.__format_value(metric["max"], metric["unit"])
+            })
+        return rows
+
+    def __record(self, name: str, key: str, labels: dict, value: Optional[float], rate: Optional[float],
+                 total: float, is_rate: bool = False) -> None:
+        """
+        Stores the value of a metric in its ring buffer
+        :param name: Name of the metric
+        :param key: Key of the metric, the same for all mounts
+        :param labels: Labels that distinguish metrics with the same key
+        :param value: Value from which min, avg and max are derived
+        :param rate: Change per second, None if the metric has no rate
+        :param total: Core count, capacity in bytes or bytes transferred
+        :param is_rate: True if the value itself is a rate in bytes per second
+        """
+        history = self.__history.setdefault(name, {"key": key, "labels": labels, "is_rate": is_rate,
+                                                   "values": deque(maxlen=self.samples)})
+        history["values"].append(value)
+        history["rate"], history["total"] = rate, total
+
+    def __get_rate(self, counters: dict, group: str, key: Optional[str], elapsed: float) -> Optional[float]:
+        """
+        Calculates the change per second of a counter since the previous snapshot
+        :param counters: Counters of the current snapshot
+        :param group: Name of the counter or of the group of counters
+        :param key: Key of the counter within the group, None if the group is the counter itself
+        :param elapsed: Time in seconds since the previous snapshot
+        :return: Change per second, None if the counter was not available in the previous snapshot
+        """
+        current, previous = counters.get(group), self.__previous.get(group)
+        if key is not None:
+            current = (current or {}).get(key)
+            previous = (previous or {}).get(key)
+            if isinstance(current, dict):
+                current, previous = current["used"], (previous or {}).get("used")
+        if current is None or previous is None or elapsed <= 0:
+            return None
+        return (current - previous) / elapsed
+
+    def __read_counters(self) -> dict:
+        """
+        Reads the memory, mount and I/O counters of the host, each only once
+        :return: Dict with the counters
+        """
+        memory = psutil.virtual_memory()
+        mounts = {}
+        for mountpoint in self.mounts:
+            try:
+                usage = psutil.disk_usage(mountpoint)
+            except OSError:
+                continue
+            mounts[mountpoint] = {"total": usage.total, "used": usage.used, "percent": usage.percent}
+        disk_io = psutil.disk_io_counters()
+        net_io = psutil.net_io_counters()
+        return {
+            "memory": {"total": memory.total, "used": memory.total - memory.available, "percent": memory.percent},
+            "mounts": mounts,
+            "disk_read": disk_io.read_bytes if disk_io is not None else None,
+            "disk_write": disk_io.write_bytes if disk_io is not None else None,
+            "net_rx": net_io.bytes_recv if net_io is not None else None,
+            "net_tx": net_io.bytes_sent if net_io is not None else None
+        }
+
+    def __get_mounts(self, docker_root: Optional[str]) -> dict[str, str]:
+        """
+        Get the mounts that are sampled. Pseudo filesystems and bind mounts of an already listed device are skipped,
+        the mount of the docker data-root is always included.
+        :param docker_root: Data-root of the docker engine
+        :return: Dict with the mountpoint as key and its label as value
+        """
+        partitions = sorted(psutil.disk_partitions(all=False), key=lambda p: len(p.mountpoint))
+        mounts, devices = {}, set()
+        for partition in partitions:
+            if partition.fstype in cs.HOST_METRICS_IGNORED_FILESYSTEMS or partition.device in devices:
+                continue
+            devices.add(partition.device)
+            mounts[partition.mountpoint] = partition.mountpoint
+        if docker_root is None or not os.path.isdir(docker_root):
+            return mounts
+        docker_mount = max((p.mountpoint for p in partitions if self.__contains(p.mountpoint, docker_root)),
+                           key=len, default=docker_root)
+        mounts[docker_mount] = f'{docker_mount} (docker)'
+        return mounts
+
+    def __contains(self, mountpoint: str, path: str) -> bool:
+        """
+        Checks if a path is located on a mountpoint
+        :param mountpoint: Mountpoint
+        :param path: Absolute path
+        :return: True if the path is on or below the mountpoint
+        """
+        return path == mountpoint or path.startswith(mountpoint.rstrip("/") + "/")
+
+    def __format_value(self, value: Optional[float], unit: str) -> str:
+        """
+        Formats a value of a ring buffer
+        :param value: Value, None if not available
+        :param unit: "percent" or "bytes_per_second"
+        :return: Value with unit as string
+        """
+        if unit == "bytes_per_second" or value is None:
+            return self.__format_rate(value)
+        return f'{round(value, 1)} %'
+
+    def __format_rate(self, rate: Optional[float], signed: bool = False) -> str:
+        """
+        Formats a rate in bytes per second
+        :param rate: Rate in bytes per second, None if not available
+        :param signed: Prefixes positive rates with a plus, used for the change of used space
+        :return: Rate with a suitable unit as string
+        """
+        if rate is None:
+            return "-"
+        sign = "+" if signed and rate > 0 else ""
+        if abs(rate) >= 1024 * 1024:
+            return f'{sign}{round(rate / 1024 / 1024, 2)} MB/s'
+        return f'{sign}{round(rate / 1024, 2)} KB/s'
+
+    def __format_bytes(self, amount: float) -> str:
+        """
+        Formats an amount of bytes
+        :param amount: Amount in bytes
+        :return: Amount with a suitable unit as string
+        """
+        if amount >= 1073741824:
+            return f'{round(amount / 1073741824, 2)} GB'
+        return f'{round(amount / 1024 / 1024, 2)} MB'
@@ -0,0 +1,240 @@
+import json
+import logging as lg
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+
+class DeploymentInProgress(Exception):
+    pass
+
+
+class JournalHandler:
+    def __init__(self, journal_file: Path):
+        """
+        Append-only journal of the steps of a deployment. Each entry is written as a single json line and flushed to
+        disk, so that a deployment that was interrupted can be resumed from the last completed step.
+        The process that owns the deployment is recorded with its pid and start time, which allows to detect a dead
+        owner immediately.
+        :param journal_file: Path of the journal file
+        """
+        self.journal_file = journal_file
+        # Time at which the last journaled operation ended, events of the containers until then were caused by it
+        self.ended_file = journal_file.with_name(f'{journal_file.name}.ended')
+        self.data = None
+        self.__completed = set()
+        self.__active = False
+        self.resuming = False
+
+    def begin(self, operation: str, data: dict) -> None:
+        """
+        Starts the journal of a new deployment. Raises a DeploymentInProgress exception if another living process
+        owns a journal.
+        :param operation: Name of the operation, e.g. deploy or replace
+        :param data: Everything that is required to resume the operation
+        """
+        if self.journal_file.exists():
+            self.__discard_dead_journal()
+        entry = {"event": "begin", "operation": operation, "data": data} | self.__get_owner()
+        self.__append(entry, exclusive=True)
+        self.data = entry
+        self.__completed = set()
+        self.__active = True
+        self.resuming = False
+
+    def resume(self) -> dict:
+        """
+        Takes over the journal of an interrupted deployment. The journal is locked while it is checked that its owner
+        is not running anymore, so that only one process can take it over. Raises a DeploymentInProgress exception if
+        another process has taken it over or finished it in the meantime.
+        :return: Begin entry of the interrupted deployment with operation and data
+        """
+        import fcntl
+        try:
+            fd = os.open(self.journal_file, os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            raise DeploymentInProgress(f'Deployment journal {self.journal_file} has been finished by another process')
+        try:
+            # The lock is released when the file is closed, also if the process dies
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if not self.journal_file.exists() or self.is_owner_alive():
+                raise DeploymentInProgress(f'Deployment journal {self.journal_file} has been taken over or finished '
+                                           f'by another process')
+            entries = self.__load_entries()
+            self.__append({"event": "resume"} | self.__get_owner())
+        finally:
+            os.close(fd)
+        self.data = entries[0]
+        self.__completed = {(e["step"], e["container"]) for e in entries if e["event"] == "step"}
+        self.__active = True
+        self.resuming = True
+        return self.data
+
+    def get_interrupted(self) -> Optional[dict]:
+        """
+        Checks if a deployment has been interrupted, i.e. a journal exists whose owner is no longer running.
+        :return: Dict with the begin entry, the amount of completed steps and resumes, None if nothing was interrupted
+        """
+        if not self.journal_file.exists() or self.is_owner_alive():
+            return None
+        entries = self.__load_entries()
+        if not entries or entries[0]["event"] != "begin":
+            lg.warning(f'Deployment journal {self.journal_file} is incomplete and is discarded')
+            os.remove(self.journal_file)
+            return None
+        return entries[0] | {
+            "completed_steps": len([e for e in entries if e["event"] == "step"]),
+            "resumes": len([e for e in entries if e["event"] == "resume"])
+        }
+
+    def is_owner_alive(self) -> bool:
+        """
+        Checks if the process that owns the journal is still running
+        :return: True if a running process owns the journal, False otherwise
+        """
+        if not self.journal_file.exists():
+            return False
+        owners = [e for e in self.__load_entries() if e["event"] in ("begin", "resume", "interrupted")]
+        if not owners or owners[-1]["event"] == "interrupted":
+            return False
+        owner = owners[-1]
+        if owner["pid"] == os.getpid():
+            # A journal of this process that is not active anymore belongs to an operation that failed unexpectedly
+            return self.__active
+        import psutil
+        try:
+            return psutil.Process(owner["pid"]).create_time() == owner["pid_started"]
+        except psutil.NoSuchProcess:
+            return False
+
+    def is_completed(self, step: str, container_name: str) -> bool:
+        """
+        Checks if a step was already completed for a container before the deployment was interrupted
+        :param step: Name of the step
+        :param container_name: Name of the container
+        :return: True if the step is already completed, False otherwise
+        """
+        return (step, container_name) in self.__completed
+
+    def complete(self, step: str, container_name: str) -> None:
+        """
+        Records that a step has been completed for a container
+        :param step: Name of the step
+        :param container_name: Name of the container
+        """
+        if not self.__active:
+            return
+        self.__append({"event": "step", "step": step, "container": container_name,
+                       "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+        self.__completed.add((step, container_name))
+
+    def interrupt(self) -> bool:
+        """
+        Releases the journal of the current deployment after an unexpected error. The journal is kept, so that the
+        deployment can be resumed explicitly, but it is no longer owned by this process.
+        :return: True if a journal was released, False if no deployment was active
+        """
+        if not self.__active:
+            return False
+        self.__append({"event": "interrupted"} | self.__get_owner())
+        self.__save_end_time()
+        self.data = None
+        self.__completed = set()
+        self.__active = False
+        self.resuming = False
+        return True
+
+    def finish(self) -> None:
+        """Ends the journal of the current deployment, it is not resumed anymore"""
+        if not self.__active:
+            return
+        if self.journal_file.exists():
+            os.remove(self.journal_file)
+        self.__save_end_time()
+        self.data = None
+        self.__completed = set()
+        self.__active = False
+        self.resuming = False
+
+    def get_end_time(self) -> Optional[float]:
+        """
+        Get the time at which the last journaled operation of any process was finished or interrupted
+        :return: Unix timestamp, None if no operation has ended yet
+        """
+        try:
+            with open(self.ended_file) as f:
+                return float(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def __save_end_time(self) -> None:
+        """Saves the current time as end of the last journaled operation"""
+        tmp_file = f'{self.ended_file}.{os.getpid()}.tmp'
+        with open(tmp_file, "w") as f:
+            f.write(str(time.time()))
+        os.replace(tmp_file, self.ended_file)
+
+    def __discard_dead_journal(self) -> None:
+        """
+        Removes the journal of a dead process. The journal is locked like on resume, so that it is not removed while
+        another process takes it over. Raises a DeploymentInProgress exception if a running process owns the journal.
+        """
+        import fcntl
+        try:
+            fd = os.open(self.journal_file, os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if self.is_owner_alive():
+                raise DeploymentInProgress(f'Deployment journal {self.journal_file} is owned by a running process')
+            if self.journal_file.exists():
+                lg.debug(f'Discarding deployment journal of a dead process: {self.journal_file}')
+                os.remove(self.journal_file)
+        finally:
+            os.close(fd)
+
+    def __get_owner(self) -> dict:
+        """
+        Composes the owner information of the current process
+        :return: Dict with pid, start time of the process and current time
+        """
+        import psutil
+        return {
+            "pid": os.getpid(),
+            "pid_started": psutil.Process().create_time(),
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    def __append(self, entry: dict, exclusive: bool = False) -> None:
+        """
+        Appends an entry as single write to the journal and flushes it to disk
+        :param entry: Entry to append
+        :param exclusive: Fail if the journal file already exists
+        """
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | (os.O_EXCL if exclusive else 0)
+        try:
+            fd = os.open(self.journal_file, flags, 0o600)
+        except FileExistsError:
+            raise DeploymentInProgress(f'Deployment journal {self.journal_file} has been created by another process')
+        try:
+            os.write(fd, (json.dumps(entry) + "\n").encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def __load_entries(self) -> list[dict]:
+        """
+        Loads all entries of the journal. A last line that was only partially written is ignored.
+        :return: List of journal entries
+        """
+        entries = []
+        with open(self.journal_file) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    lg.debug(f'Ignoring incomplete line in deployment journal: {line}')
+        return entries
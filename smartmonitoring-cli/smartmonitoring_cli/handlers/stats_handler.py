@@ -0,0 +1,176 @@
+import logging as lg
+import threading
+import time
+from collections import deque
+
+from docker.errors import NotFound, APIError
+
+import smartmonitoring_cli.const_settings as cs
+from smartmonitoring_cli.handlers.docker_handler import DockerHandler
+from smartmonitoring_cli.models.update_manifest import ContainerConfig
+
+
+class StatsCollector:
+    def __init__(self, dock: DockerHandler):
+        """
+        Collects the statistics of containers in the background. A streaming stats request is kept open for each
+        container on its own thread, so that the engine does not have to sample twice for every query. Only the latest
+        sample and a short history of the derived values are kept, queries are answered from memory.
+        :param dock: DockerHandler instance
+        """
+        self.dock = dock
+        self.__watched = set()
+        self.__threads = {}
+        self.__latest = {}
+        self.__history = {}
+        self.__condition = threading.Condition()
+        self.__stopped = threading.Event()
+
+    def watch(self, conf_containers: list[ContainerConfig]) -> None:
+        """
+        Starts collecting the statistics of the given containers. Collection of containers that are not part of the
+        list anymore is stopped.
+        :param conf_containers: List of ContainerConfig objects to collect the statistics for
+        """
+        with self.__condition:
+            self.__watched = {container.name for container in conf_containers}
+            for name in self.__watched:
+                if name in self.__threads and self.__threads[name].is_alive():
+                    continue
+                lg.debug(f'Starting stats collection of container {name}')
+                self.__threads[name] = threading.Thread(target=self.__collect, args=(name,), daemon=True,
+                                                        name=f'stats-{name}')
+                self.__threads[name].start()
+
+    def wait_for_samples(self, timeout: float) -> None:
+        """
+        Waits until a first sample of each watched container has been collected
+        :param timeout: Max time to wait in seconds
+        """
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__watched <= set(self.__latest), timeout=timeout)
+
+    def stop(self) -> None:
+        """Stops the collection of all containers, the threads end with the next sample of their stream"""
+        self.__stopped.set()
+
+    def get_stats(self, container_config: ContainerConfig) -> dict:
+        """
+        Get the latest statistics of a container without waiting for the docker engine
+        :param container_config: ContainerConfig object
+        :return: Dict with status, memory and cpu usage and the network and block I/O rates of the container, the raw
+        values are in the metrics dict
+        """
+        try:
+            status = self.dock.get_container(container_config.name).status
+            image = container_config.image
+        except NotFound:
+            status = "Not found"
+            image = "-"
+        with self.__condition:
+            latest = self.__latest.get(container_config.name)
+        if status == "Not found" or latest is None:
+            value = "-" if status == "Not found" else "N/A"
+            return {'name': container_config.name, 'status': status, 'image': image, "mem_usg_mb": value,
+                    "cpu_usg_present": value, "net_io": value, "block_io": value, "metrics": {}}
+        derived = latest["derived"]
+        return {
+            'name': container_config.name,
+            'status': status,
+            'image': image,
+            "mem_usg_mb": f'{round(derived["mem_bytes"] / 1024 / 1024, 2)} MB',
+            "cpu_usg_present": f'{derived["cpu_percent"]} %',
+            "net_io": f'{self.__format_rate(derived["net_rx_rate"])} / {self.__format_rate(derived["net_tx_rate"])}',
+            "block_io": f'{self.__format_rate(derived["blk_read_rate"])} / '
+                        f'{self.__format_rate(derived["blk_write_rate"])}',
+            "metrics": {key: value for key, value in derived.items() if key != "time"}
+        }
+
+    def get_history(self, container_name: str) -> list[dict]:
+        """
+        Get the derived values of the last samples of a container
+        :param container_name: Name of the container
+        :return: List of dicts with time, cpu percent, memory bytes and the I/O rates in bytes per second
+        """
+        with self.__condition:
+            return list(self.__history.get(container_name, []))
+
+    def __collect(self, name: str) -> None:
+        """
+        Reads the stats stream of a container until the collection is stopped. The stream is reopened after a short
+        delay if the container is not available, e.g. while it is being recreated.
+        :param name: Name of the container
+        """
+        while self.__is_watched(name):
+            try:
+                for sample in self.dock.get_container(name).stats(stream=True, decode=True):
+                    if not self.__is_watched(name):
+                        return
+                    self.__process_sample(name, sample)
+            except NotFound:
+                lg.debug(f'Container {name} not found, retrying stats collection in {cs.STATS_RETRY_SECONDS}s')
+                self.dock.invalidate_snapshot()
+            except (APIError, OSError, ValueError) as e:
+                lg.debug(f'Stats stream of container {name} failed: {e}')
+            with self.__condition:
+                self.__latest.pop(name, None)
+            self.__stopped.wait(cs.STATS_RETRY_SECONDS)
+
+    def __is_watched(self, name: str) -> bool:
+        """
+        Checks if the statistics of a container should still be collected
+        :param name: Name of the container
+        :return: True if the container is watched, False otherwise
+        """
+        with self.__condition:
+            return not self.__stopped.is_set() and name in self.__watched
+
+    def __process_sample(self, name: str, sample: dict) -> None:
+        """
+        Derives the cpu usage and the I/O rates from a sample and its predecessor and stores them
+        :param name: Name of the container
+        :param sample: Decoded sample of the stats stream
+        """
+        received = time.monotonic()
+        counters = self.__get_counters(sample)
+        with self.__condition:
+            previous = self.__latest.get(name)
+        try:
+            cpu_percent = self.dock.calculate_cpu_usage(sample)
+        except (KeyError, ZeroDivisionError):
+            cpu_percent = 0.0
+        derived = {"time": time.time(), "cpu_percent": cpu_percent,
+                   "mem_bytes": (sample.get("memory_stats") or {}).get("usage", 0)}
+        elapsed = received - previous["received"] if previous is not None else 0
+        for counter, value in counters.items():
+            rate = (value - previous["counters"][counter]) / elapsed if elapsed > 0 else 0.0
+            derived[f'{counter}_rate'] = max(rate, 0.0)
+        with self.__condition:
+            self.__latest[name] = {"received": received, "counters": counters, "derived": derived}
+            self.__history.setdefault(name, deque(maxlen=cs.STATS_HISTORY_SAMPLES)).append(derived)
+            self.__condition.notify_all()
+
+    def __get_counters(self, sample: dict) -> dict:
+        """
+        Sums up the network and block I/O byte counters of a sample
+        :param sample: Decoded sample of the stats stream
+        :return: Dict with the received, transmitted, read and written bytes
+        """
+        networks = (sample.get("networks") or {}).values()
+        block_io = (sample.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []
+        return {
+            "net_rx": sum(network.get("rx_bytes", 0) for network in networks),
+            "net_tx": sum(network.get("tx_bytes", 0) for network in networks),
+            "blk_read": sum(entry["value"] for entry in block_io if entry["op"].lower() == "read"),
+            "blk_write": sum(entry["value"] for entry in block_io if entry["op"].lower() == "write")
+        }
+
+    def __format_rate(self, rate: float) -> str:
+        """
+        Formats a rate in bytes per second
+        :param rate: Rate in bytes per second
+        :return: Rate with a suitable unit as string
+        """
+        if rate >= 1024 * 1024:
+            return f'{round(rate / 1024 / 1024, 2)} MB/s'
+        return f'{round(rate / 1024, 2)} KB/s'
@@ -0,0 +1,83 @@
+import socket
+from datetime import datetime
+from typing import Optional
+
+import smartmonitoring_cli.const_settings as cs
+
+# This module is used on every shell login, therefore it must not import any heavy dependencies
+# and must not perform any network or docker requests.
+
+SNAPSHOT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def compose_banner_snapshot(logo: str, status: str, version: str, channel: str, local_ip: str,
+                            public_ip: str) -> dict:
+    """
+    Composes the snapshot that the login banner is rendered from
+    :param logo: Pre-rendered logo text
+    :param status: Status of the deployment
+    :param version: Package version of the deployment
+    :param channel: Update channel of the deployment
+    :param local_ip: Local ip address of the host
+    :param public_ip: Public ip address of the host
+    :return: Dict with all values of the login banner
+    """
+    return {
+        "logo": logo,
+        "status": status,
+        "package_version": version,
+        "update_channel": channel,
+        "hostname": socket.gethostname(),
+        "local_ip": local_ip,
+        "public_ip": public_ip,
+        "generated_at": datetime.now().strftime(SNAPSHOT_TIME_FORMAT)
+    }
+
+
+def __get_snapshot_age_note(generated_at: str) -> Optional[str]:
+    """
+    Checks the age of a snapshot
+    :param generated_at: Time the snapshot was generated as string
+    :return: A note about the staleness of the snapshot or None if the snapshot is up-to-date
+    """
+    try:
+        age = datetime.now() - datetime.strptime(generated_at, SNAPSHOT_TIME_FORMAT)
+    except (TypeError, ValueError):
+        return "Banner information is stale, time of last refresh unknown"
+    if age.total_seconds() < cs.BANNER_SNAPSHOT_STALE_AFTER_MINUTES * 60:
+        return None
+    hours = int(age.total_seconds() // 3600)
+    minutes = int(age.total_seconds() % 3600 // 60)
+    return f'Banner information is stale, last refreshed {hours}h {minutes}m ago ({generated_at})'
+
+
+def print_logon_banner(snapshot: dict = None) -> None:
+    """
+    Prints a reduced status dashboard for log-in banners from the pre-computed banner snapshot
+    :param snapshot: Banner snapshot as dict, None if no snapshot exists
+    """
+    if snapshot is None:
+        snapshot = {
+            "status": "Unknown",
+            "package_version": "-",
+            "update_channel": "-",
+            "hostname": socket.gethostname(),
+            "local_ip": "-",
+            "public_ip": "-",
+            "generated_at": None
+        }
+        note = "No banner information available yet, it is refreshed by 'smartmonitoring update'"
+    else:
+        print(snapshot.get("logo", ""))
+        note = __get_snapshot_age_note(snapshot.get("generated_at"))
+
+    rows = [
+        ("Deployment Status: ", snapshot.get("status", "-"), "Hostname: ", snapshot.get("hostname", "-")),
+        ("Package Version: ", snapshot.get("package_version", "-"), "Local IP: ", snapshot.get("local_ip", "-")),
+        ("Update Channel: ", snapshot.get("update_channel", "-"), "Public IP: ", snapshot.get("public_ip", "-")),
+    ]
+    print("".center(cs.CLI_WIDTH - 10, "-"))
+    for left_label, left_value, right_label, right_value in rows:
+        print(f'{left_label:<19}{left_value:>16}        {right_label:<11}{right_value:>16}')
+    if note is not None:
+        print(f'\x1b[38;5;226m{note}\x1b[0m')
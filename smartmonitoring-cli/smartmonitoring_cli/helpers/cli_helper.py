@@ -1,7 +1,8 @@
+import logging as lg
 import platform
-import socket
+import threading
 import time
-from multiprocessing import Pool
+from typing import Any, Callable, Optional
 
 import psutil
 from pyfiglet import Figlet
@@ -11,18 +12,26 @@ from rich.prompt import Confirm
 from rich.table import Table
 
 import smartmonitoring_cli.const_settings as cs
-import smartmonitoring_cli.helpers.helper_functions as hf
-from smartmonitoring_cli import __version__
+import smartmonitoring_cli.helpers.status_helper as sh
+from smartmonitoring_cli.handlers.agent_handler import AgentClient
 from smartmonitoring_cli.handlers.data_handler import DataHandler
-from smartmonitoring_cli.handlers.docker_handler import DockerHandler
+from smartmonitoring_cli.handlers.host_metrics_handler import HostMetricsSampler
 from smartmonitoring_cli.models.local_config import LocalConfig
-from smartmonitoring_cli.models.update_manifest import UpdateManifest, ContainerConfig
+from smartmonitoring_cli.models.update_manifest import UpdateManifest
+
+
+def render_logo() -> str:
+    """
+    Renders the SmartMonitoring logo
+    :return: Logo as multi-line string
+    """
+    f = Figlet(font='standard', width=cs.CLI_WIDTH, justify='center')
+    return f.renderText(cs.CLI_LOGO_TEXT)
 
 
 def print_logo() -> None:
     """Prints the SmartMonitoring logo"""
-    f = Figlet(font='standard', width=cs.CLI_WIDTH, justify='center')
-    print(f.renderText(cs.CLI_LOGO_TEXT))
+    print(render_logo())
 
 
 def print_paragraph(text: str) -> None:
@@ -51,50 +60,166 @@ def print_system_status(cfh: DataHandler, config: LocalConfig = None, manifest:
     :param config: LocalConfig object
     :param manifest: Manifest object
     """
-    if config is None or manifest is None:
-        status = "Not deployed"
-        version = "-"
-        channel = "-"
-        proxy_name = "-"
-    else:
-        status = cfh.get_status()["status"]
-        version = manifest.package_version
-        channel = config.update_channel
-        proxy_name = config.zabbix_proxy_container.proxy_name
+    system = sh.compose_system_status(cfh, config, manifest)
     table = Table(width=cs.CLI_WIDTH,
                   title="System and Deployment Status",
                   show_header=False)
     table.add_column("Host Information", justify="center", width=cs.CLI_WIDTH)
     table.add_column("Deployment Status", justify="center", width=cs.CLI_WIDTH)
     table.add_row("[bright_cyan]System Hostname", "[bright_cyan]Deployment Status")
-    table.add_row(socket.gethostname(), "[green]Deployed" if status == "Deployed" else "[red]Not deployed")
+    table.add_row(system["hostname"], "[green]Deployed" if system["status"] == "Deployed" else "[red]Not deployed")
     table.add_row()
     table.add_row("[bright_cyan]SmartMonitoring-CLI Version", "[bright_cyan]Package Deployment Version")
-    table.add_row(__version__, version)
+    table.add_row(system["cli_version"], system["package_version"])
     table.add_row()
     table.add_row("[bright_cyan]Local IP Address", "[bright_cyan]Update Channel")
-    table.add_row(hf.get_local_ip_address(), channel)
+    table.add_row(system["local_ip"], system["update_channel"])
     table.add_row()
     table.add_row("[bright_cyan]Public IP Address", "[bright_cyan]Proxy Name")
-    table.add_row(hf.get_public_ip_address(), proxy_name)
+    table.add_row(system["public_ip"], system["proxy_name"])
 
     Console().print(table)
 
 
-def __generate_container_table(initializing: bool, containers: list[ContainerConfig] = None) -> Table:
+class _OverheadMeter:
+    def __init__(self):
+        """
+        Measures the cpu time and the memory the dashboard process itself uses
+        """
+        self.process = psutil.Process()
+        self.start_wall = self.last_wall = time.perf_counter()
+        self.start_cpu = self.last_cpu = self.__get_cpu_time()
+        self.peak_rss = 0
+
+    def sample(self) -> str:
+        """
+        Measures the overhead since the last sample
+        :return: CPU usage since the last sample and current RSS as string
+        """
+        wall, cpu = time.perf_counter(), self.__get_cpu_time()
+        percent = (cpu - self.last_cpu) / (wall - self.last_wall) * 100 if wall > self.last_wall else 0.0
+        self.last_wall, self.last_cpu = wall, cpu
+        rss = self.process.memory_info().rss
+        self.peak_rss = max(self.peak_rss, rss)
+        return f'Dashboard overhead: CPU {round(percent, 2)} % | RSS {round(rss / 1024 / 1024, 2)} MB'
+
+    def summary(self) -> str:
+        """
+        Summarizes the overhead of the whole session
+        :return: Average cpu usage and peak RSS as string
+        """
+        wall = time.perf_counter() - self.start_wall
+        percent = (self.__get_cpu_time() - self.start_cpu) / wall * 100 if wall > 0 else 0.0
+        return (f'Dashboard overhead over {round(wall, 1)}s: average CPU {round(percent, 2)} % | '
+                f'peak RSS {round(self.peak_rss / 1024 / 1024, 2)} MB')
+
+    def __get_cpu_time(self) -> float:
+        times = self.process.cpu_times()
+        return times.user + times.system + times.children_user + times.children_system
+
+
+class _DashboardPanel:
+    def __init__(self, name: str, collect: Callable[[], Any], interval: float):
+        """
+        Collects the data of a dashboard panel on its own background thread. The collection is scheduled at a fixed
+        rate, so that a slow collection does not shift the following ones. The renderer reads the latest completed
+        result without waiting for a running collection.
+        :param name: Name of the panel, used for the thread name
+        :param collect: Function that collects the data of the panel
+        :param interval: Time in seconds between the start of two collections
+        """
+        self.name = name
+        self.interval = interval
+        self.__collect = collect
+        self.__lock = threading.Lock()
+        self.__completed = threading.Event()
+        self.__data = None
+        self.__updated = None
+        self.__running_since = None
+        self.__error = None
+
+    def start(self, stopped: threading.Event) -> None:
+        """
+        Starts collecting until the event is set
+        :param stopped: Event that stops the collection
+        """
+        threading.Thread(target=self.__run, args=(stopped,), daemon=True, name=f'dashboard-{self.name}').start()
+
+    def wait_for_data(self, timeout: float) -> None:
+        """
+        Waits until the first collection has completed
+        :param timeout: Max time to wait in seconds
+        """
+        self.__completed.wait(timeout)
+
+    def get_state(self) -> tuple[Any, Optional[float], Optional[str]]:
+        """
+        Get the latest collected data and how old it is
+        :return: Data or None if nothing was collected yet, age of the data in seconds and the reason why the data is
+        stale or None if it is current
+        """
+        now = time.monotonic()
+        with self.__lock:
+            age = now - self.__updated if self.__updated is not None else None
+            if self.__running_since is not None and now - self.__running_since > cs.DASHBOARD_COLLECTOR_TIMEOUT_SECONDS:
+                return self.__data, age, f'collection running for {round(now - self.__running_since)}s'
+            return self.__data, age, self.__error
+
+    def __run(self, stopped: threading.Event) -> None:
+        """
+        Runs the collection at a fixed rate, runs that are missed because a collection took too long are skipped
+        :param stopped: Event that stops the collection
+        """
+        next_run = time.monotonic()
+        while not stopped.is_set():
+            with self.__lock:
+                self.__running_since = time.monotonic()
+            try:
+                data = self.__collect()
+                with self.__lock:
+                    self.__data, self.__updated, self.__error = data, time.monotonic(), None
+            except Exception as e:
+                lg.debug(f'Collecting dashboard panel {self.name} failed: {e}')
+                with self.__lock:
+                    self.__error = f'collection failed: {e}'
+            finally:
+                with self.__lock:
+                    self.__running_since = None
+                self.__completed.set()
+            next_run += self.interval
+            if next_run < time.monotonic():
+                next_run = time.monotonic()
+            stopped.wait(next_run - time.monotonic())
+
+
+def __format_data_age(age: Optional[float], stale: Optional[str]) -> str:
+    """
+    Formats the age of the data of a panel
+    :param age: Age of the data in seconds, None if nothing was collected yet
+    :param stale: Reason why the data is stale, None if it is current
+    :return: Age as string for a table caption
+    """
+    updated = f'updated {round(age, 1)}s ago' if age is not None else "no data yet"
+    if stale is not None:
+        return f'[yellow]STALE - {stale}, {updated}'
+    return f'[bright_black]{updated.capitalize()}'
+
+
+def __generate_container_table(panel: Optional[_DashboardPanel]) -> Table:
     """
     Generates a table with information about the containers of the current deployment
-    :param initializing: Should be true on the first call of this function to initialize the table
-    :param containers: List of ContainerConfig objects for which the table should be generated
+    :param panel: _DashboardPanel that collects the container statistics, None if nothing is deployed
     :return: Returns a Table object with the container information
     """
     table = Table(width=cs.CLI_WIDTH, title="Container Statistics")
-    if containers is None:
+    if panel is None:
         table.add_column("[bright_cyan]SmartMonitoring not deployed, skipping container statistics...",
                          justify="center")
         table.box = None
         return table
-    if initializing:
+    cont_stats, age, stale = panel.get_state()
+    table.caption = __format_data_age(age, stale)
+    if cont_stats is None:
         table.add_column("Loading containers...", justify="center")
         table.box = None
         return table
@@ -103,121 +228,103 @@ def __generate_container_table(initializing: bool, containers: list[ContainerCon
     table.add_column("Image", justify="center")
     table.add_column("Memory Usage", justify="center")
     table.add_column("CPU Usage", justify="center")
-    cont_stats = __get_container_statistics_parallel(containers)
+    table.add_column("Network RX / TX", justify="center")
+    table.add_column("Block I/O Read / Write", justify="center")
     for cont_stat in cont_stats:
         table.add_row(f'{cont_stat["name"]}', f'{cont_stat["status"]}', f'{cont_stat["image"]}',
-                      f'{cont_stat["mem_usg_mb"]}', f'{cont_stat["cpu_usg_present"]}')
+                      f'{cont_stat["mem_usg_mb"]}', f'{cont_stat["cpu_usg_present"]}',
+                      f'{cont_stat.get("net_io", "-")}', f'{cont_stat.get("block_io", "-")}')
     return table
 
 
-def __generate_host_information_table() -> Table:
+def __generate_host_information_table(panel: _DashboardPanel) -> Table:
     """
-    Generates a table with information about the host system
+    Generates a table with information about the host system from the latest sample of the host metrics
+    :param panel: _DashboardPanel that samples the host metrics
     :return: Returns a Table object with the host information
     """
+    rows, age, stale = panel.get_state()
     table = Table(width=cs.CLI_WIDTH,
-                  title="Host Information",
-                  show_header=False)
-    table.add_column("Row 1", justify="center", width=cs.CLI_WIDTH)
-    table.add_column("Row 2", justify="center", width=cs.CLI_WIDTH)
-    table.add_column("Row 3", justify="center", width=cs.CLI_WIDTH)
-    table.add_row("[bright_cyan]OS", "[bright_cyan]CPU Usage", "[bright_cyan]CPU Core Count")
-    table.add_row(platform.platform(), f'{psutil.cpu_percent()} %', f'{psutil.cpu_count()}')
-    table.add_row()
-    table.add_row("[bright_cyan]Disk Space Total",
-                  "[bright_cyan]Disk Space Free",
-                  "[bright_cyan]Disk Usage Percent")
-    table.add_row(f'{round(psutil.disk_usage("/").total / 1073741824, 2)} GB',
-                  f'{round(psutil.disk_usage("/").free / 1073741824, 2)} GB',
-                  f'{psutil.disk_usage("/").percent} %')
-    table.add_row()
-    table.add_row("[bright_cyan]Memory Total",
-                  "[bright_cyan]Memory Free",
-                  "[bright_cyan]Memory Usage Percent")
-    table.add_row(f'{round(psutil.virtual_memory().total / 1073741824, 2)} GB',
-                  f'{round(psutil.virtual_memory().available / 1073741824, 2)} GB',
-                  f'{psutil.virtual_memory().percent} %')
+                  title=f'Host Information - {platform.platform()}',
+                  caption=f'Min / Avg / Max over the last {cs.HOST_METRICS_HISTORY_SAMPLES} samples | '
+                          f'{__format_data_age(age, stale)}')
+    table.add_column("Metric", justify="left")
+    table.add_column("Current", justify="center")
+    table.add_column("Rate", justify="center")
+    table.add_column("Min", justify="center")
+    table.add_column("Avg", justify="center")
+    table.add_column("Max", justify="center")
+    for row in rows or []:
+        table.add_row(f'[bright_cyan]{row["name"]}', row["current"], row["rate"], row["min"], row["avg"], row["max"])
     return table
 
 
-def __get_container_statistics_parallel(conf_containers: list[ContainerConfig]) -> list[dict]:
-    """
-    Gets the container statistics for all containers in the current deployment in parallel
-    :param conf_containers: List of ContainerConfig objects for which the statistics should be retrieved
-    :return: List of dictionaries with the container statistics
-    """
-    with Pool(len(conf_containers)) as p:
-        container_stats = p.map(get_container_stats_process, iter(conf_containers))
-    return container_stats
-
-
-def get_container_stats_process(container_config: ContainerConfig) -> dict:
+def print_live_updating_tables(disable_refresh: bool, containers: list = None, agent: AgentClient = None,
+                               measure_overhead: bool = False, interval: float = cs.DASHBOARD_INTERVAL_SECONDS,
+                               duration: int = cs.DASHBOARD_DURATION_SECONDS) -> None:
     """
-    Gets the container statistics for a single container
-    :param container_config: ContainerConfig object for which the statistics should be retrieved
-    :return: Dictionary with the container statistics
-    """
-    dock = DockerHandler()
-    return dock.get_container_stats(container_config)
-
-
-def print_live_updating_tables(disable_refresh: bool, containers: list = None) -> None:
-    """
-    Prints the host information and container statistics tables in a loop
+    Prints the host information and container statistics tables. The data is collected on background threads, the
+    tables are redrawn from the latest collected data until the duration has elapsed.
     :param disable_refresh: Only print the tables once if true
     :param containers: ContainerConfig objects for which the container statistics should be printed
+    :param agent: AgentClient of a running agent, used to collect the container statistics
+    :param measure_overhead: Shows the cpu and memory usage of the dashboard itself
+    :param interval: Time in seconds between two collections of the data
+    :param duration: Time in seconds after which the dashboard exits
     """
-    if disable_refresh:
-        runs = 1
-    else:
-        runs = 100
+    statistics = sh.ContainerStatistics(containers, agent) if containers else None
+    sampler = None
+
+    def sample_host_metrics() -> list[dict]:
+        # The sampler is created on the collector thread, since asking the engine for its data-root may take a while
+        nonlocal sampler
+        if sampler is None:
+            sampler = HostMetricsSampler(statistics.get_docker_root_dir() if statistics is not None
+                                         else cs.DOCKER_DEFAULT_ROOT_DIR)
+        sampler.sample()
+        return sampler.get_rows()
+
+    host_panel = _DashboardPanel("host", sample_host_metrics, interval)
+    container_panel = _DashboardPanel("containers", statistics.collect, interval) if statistics else None
+    panels = [panel for panel in (host_panel, container_panel) if panel is not None]
+    meter = _OverheadMeter() if measure_overhead else None
+    stopped = threading.Event()
+    for panel in panels:
+        panel.start(stopped)
     try:
-        with Live(__compose_live_tables(True, containers), auto_refresh=False) as live:
-            for run in range(runs):
-                live.update(__compose_live_tables(False, containers), refresh=True)
-                time.sleep(2)
-        if not disable_refresh: print("Timeout reached, exiting...")
+        if disable_refresh:
+            for panel in panels:
+                panel.wait_for_data(cs.DASHBOARD_COLLECTOR_TIMEOUT_SECONDS)
+            Console().print(__compose_live_tables(host_panel, container_panel, meter))
+            return
+        deadline = time.monotonic() + duration
+        with Live(__compose_live_tables(host_panel, container_panel), auto_refresh=False) as live:
+            while time.monotonic() < deadline:
+                stopped.wait(min(interval, cs.DASHBOARD_RENDER_INTERVAL_SECONDS, deadline - time.monotonic()))
+                live.update(__compose_live_tables(host_panel, container_panel, meter), refresh=True)
+        print("Timeout reached, exiting...")
     except KeyboardInterrupt:
         print("Exit Status Dashboard".center(cs.CLI_WIDTH))
+    finally:
+        stopped.set()
+        if statistics is not None: statistics.close()
+        if meter is not None: print(meter.summary())
 
 
-def __compose_live_tables(initialize: bool, containers: list[ContainerConfig] = None) -> Table.grid:
+def __compose_live_tables(host_panel: _DashboardPanel, container_panel: Optional[_DashboardPanel],
+                          meter: Optional[_OverheadMeter] = None) -> Table.grid:
     """
     Composes the host information and container statistics tables into a grid
-    :param initialize: Should be True for the first call to initialize the container table
-    :param containers: ContainerConfig objects for which the container statistics should be printed
+    :param host_panel: _DashboardPanel that samples the host metrics
+    :param container_panel: _DashboardPanel that collects the container statistics, None if nothing is deployed
+    :param meter: _OverheadMeter if the overhead of the dashboard should be shown
     :return: A Table grid object with the host information and container statistics tables
     """
     grid = Table.grid()
     grid.add_column()
-    grid.add_row(__generate_host_information_table())
-    grid.add_row(__generate_container_table(initialize, containers))
+    grid.add_row(__generate_host_information_table(host_panel))
+    grid.add_row(__generate_container_table(container_panel))
+    if meter is not None:
+        grid.add_row(meter.sample())
     grid.add_row("Press Ctrl+C to exit")
     return grid
-
-
-def print_logon_banner(config: LocalConfig = None, manifest: UpdateManifest = None) -> None:
-    """
-    Prints a reduced status dashboard for log-in banners
-    :param config: Configuration object for the current deployment
-    :param manifest: Update manifest object for the current deployment
-    """
-    if config is None or manifest is None:
-        status = "Not deployed"
-        version = "-"
-        channel = "-"
-    else:
-        status = "Deployed"
-        version = manifest.package_version
-        channel = config.update_channel
-    print("".center(cs.CLI_WIDTH - 10, "-"))
-    grid = Table.grid(collapse_padding=False)
-    grid.add_column(justify="left")
-    grid.add_column(justify="right")
-    grid.add_column(justify="center")
-    grid.add_column(justify="left")
-    grid.add_column(justify="right")
-    grid.add_row("Deployment Status: ", status, "        ", "Hostname: ", socket.gethostname())
-    grid.add_row("Package Version: ", version, "        ", "Local IP: ", hf.get_local_ip_address())
-    grid.add_row("Update Channel: ", channel, "         ", "Public IP: ", hf.get_public_ip_address())
-    Console().print(grid)
@@ -0,0 +1,139 @@
+import contextvars
+import logging as lg
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Optional
+
+import smartmonitoring_cli.const_settings as cs
+from smartmonitoring_cli.models.update_manifest import ContainerConfig
+
+
+class DependencyCycleError(Exception):
+    pass
+
+
+def build_dependency_graph(containers: list[ContainerConfig]) -> dict[str, set[str]]:
+    """
+    Builds a graph with the name of each container as key and the names of the containers it depends on as value.
+    Dependencies on containers that are not part of the given list are ignored.
+    :param containers: List of ContainerConfig objects
+    :return: Dict with the dependencies of each container
+    """
+    names = {container.name for container in containers}
+    return {container.name: set(container.depends_on or []) & names for container in containers}
+
+
+def find_dependency_cycle(graph: dict[str, set[str]]) -> Optional[list[str]]:
+    """
+    Searches the dependency graph for a cycle
+    :param graph: Dependency graph as returned by build_dependency_graph
+    :return: List of container names that form a cycle or None if the graph has no cycle
+    """
+    visiting, visited = [], set()
+
+    def visit(name: str) -> Optional[list[str]]:
+        if name in visiting:
+            return visiting[visiting.index(name):] + [name]
+        if name in visited:
+            return None
+        visiting.append(name)
+        for dependency in sorted(graph.get(name, [])):
+            cycle = visit(dependency)
+            if cycle is not None:
+                return cycle
+        visiting.pop()
+        visited.add(name)
+        return None
+
+    for node in sorted(graph):
+        found = visit(node)
+        if found is not None:
+            return found
+    return None
+
+
+def run_in_dependency_order(containers: list[ContainerConfig], function: Callable[[ContainerConfig], None],
+                            action: str, reverse: bool = False) -> None:
+    """
+    Runs a function for each container concurrently. A container is only processed after all containers it depends
+    on have been processed, or in reverse mode, after all containers that depend on it.
+    If the function fails for a container, the containers waiting for it are skipped and the first error is raised
+    after all running operations have finished.
+    :param containers: List of ContainerConfig objects to process
+    :param function: Function that is called with each ContainerConfig object
+    :param action: Name of the action, used for logging
+    :param reverse: Process dependents before their dependencies (e.g. for stopping containers)
+    """
+    if not containers:
+        return
+    graph = build_dependency_graph(containers)
+    cycle = find_dependency_cycle(graph)
+    if cycle is not None:
+        raise DependencyCycleError(f'Dependency cycle found between containers: {" -> ".join(cycle)}')
+    if reverse:
+        graph = {name: {other for other, deps in graph.items() if name in deps} for name in graph}
+    by_name = {container.name: container for container in containers}
+    waiting_on = {name: set(deps) for name, deps in graph.items()}
+    timings = {}
+    errors = []
+    start = time.perf_counter()
+
+    def run(container: ContainerConfig) -> None:
+        started = time.perf_counter()
+        try:
+            function(container)
+        finally:
+            timings[container.name] = (started - start, time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=min(len(containers), cs.MAX_PARALLEL_CONTAINER_OPERATIONS)) as pool:
+        futures = {}
+
+        def submit_ready() -> None:
+            for name in [name for name, deps in waiting_on.items() if not deps]:
+                del waiting_on[name]
+                # Each task runs in a copy of the caller's context, e.g. to forward its logs to the agent client
+                futures[pool.submit(contextvars.copy_context().run, run, by_name[name])] = name
+
+        def skip_waiting_for(failed: str) -> None:
+            for name in [name for name, deps in waiting_on.items() if failed in deps]:
+                del waiting_on[name]
+                lg.warning(f'{action} of container {name} skipped, because {action.lower()} of {failed} failed')
+                skip_waiting_for(name)
+
+        submit_ready()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures.pop(future)
+                if future.exception() is not None:
+                    errors.append(future.exception())
+                    skip_waiting_for(name)
+                    continue
+                for deps in waiting_on.values():
+                    deps.discard(name)
+            submit_ready()
+
+    __log_critical_path(graph, timings, action, time.perf_counter() - start)
+    if errors:
+        raise errors[0]
+
+
+def __log_critical_path(graph: dict[str, set[str]], timings: dict[str, tuple[float, float]], action: str,
+                        total: float) -> None:
+    """
+    Logs the chain of operations that determined the total duration
+    :param graph: Dependency graph that was used to schedule the operations
+    :param timings: Dict with the start and end time of each operation relative to the start of the run
+    :param action: Name of the action
+    :param total: Total duration of the run in seconds
+    """
+    if not timings:
+        return
+    path = []
+    current = max(timings, key=lambda n: timings[n][1])
+    while current is not None:
+        path.insert(0, current)
+        predecessors = [dep for dep in graph.get(current, []) if dep in timings]
+        current = max(predecessors, key=lambda n: timings[n][1]) if predecessors else None
+    chain = " -> ".join(f'{name} ({round(timings[name][1] - timings[name][0], 2)}s)' for name in path)
+    lg.info(f'{action} of {len(timings)} containers finished after {round(total, 2)}s, critical path: {chain}')
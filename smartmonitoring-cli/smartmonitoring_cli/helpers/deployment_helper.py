@@ -1,9 +1,33 @@
 import logging as lg
+import time
+from contextlib import contextmanager
+from dataclasses import replace
+from datetime import datetime
+
+from docker.errors import APIError
+
+import smartmonitoring_cli.const_settings as cs
+import smartmonitoring_cli.helpers.dependency_graph as dg
+import smartmonitoring_cli.helpers.profile_helper as ph
+import smartmonitoring_cli.helpers.readiness_helper as rh
 from smartmonitoring_cli.handlers.data_handler import DataHandler
 from smartmonitoring_cli.handlers.docker_handler import DockerHandler, ContainerCreateError, \
-    ImageDoesNotExist
+    ContainerNotReady, ImageDoesNotExist
 from smartmonitoring_cli.models.local_config import LocalConfig
-from smartmonitoring_cli.models.update_manifest import UpdateManifest
+from smartmonitoring_cli.models.update_manifest import UpdateManifest, ContainerConfig
+
+# Steps of a deployment run and the profile phases that are measured for them
+METRICS_STEP_PHASES = {
+    "manifest_fetch": "Manifest download",
+    "validation": "Validation",
+    "pull": "Image pull",
+    "remove": "Container remove",
+    "create": "Container create",
+    "stop": "Container stop",
+    "start": "Container start",
+    "readiness": "Readiness wait",
+    "cleanup": "Cleanup"
+}
 
 
 def replace_deployment(current_config: LocalConfig,
@@ -13,7 +37,10 @@ def replace_deployment(current_config: LocalConfig,
                        cfh: DataHandler,
                        dock: DockerHandler) -> bool:
     """
-    Replaces the currently running containers with new ones
+    Replaces the currently running containers with new ones. Only containers whose effective spec changed are
+    recreated, all other containers keep running.
+    Each step is recorded in the deployment journal. If the journal of an interrupted replacement is being resumed,
+    the containers are taken from its plan and completed steps are skipped.
     :param current_config: LocalConfig object of the currently running containers
     :param new_config: LocalConfig object for the new containers
     :param current_manifest: UpdateManifest object of the currently running containers
@@ -22,51 +49,329 @@ def replace_deployment(current_config: LocalConfig,
     :param dock: DockerHandler instance
     :return: True if successful, False otherwise
     """
-    cfh.validate_config_against_manifest(new_config, new_manifest)
-    cfh.save_status("Deploying")
+    with __release_journal_on_error(cfh, "replace"):
+        cfh.validate_config_against_manifest(new_config, new_manifest)
+        if not cfh.get_image_registry():
+            # Deployments from before the image registry existed, their images are recorded so that they can be removed
+            cfh.register_image_version(current_manifest)
+        new_spec_hashes = compose_spec_hashes(new_config, new_manifest, cfh)
+        if cfh.journal.resuming:
+            plan = cfh.journal.data["data"]["plan"]
+            obsolete = replace(current_manifest, containers=[c for c in current_manifest.containers
+                                                             if c.name in plan["remove"]])
+            changed = replace(new_manifest, containers=[c for c in new_manifest.containers if c.name in plan["create"]])
+        else:
+            obsolete, changed = __get_changed_containers(current_manifest, new_manifest,
+                                                         cfh.get_installed_spec_hashes(), new_spec_hashes, cfh, dock)
+        if not obsolete.containers and not changed.containers:
+            lg.info("No container spec has changed, all containers keep running")
+            cfh.save_installed_stack(new_config, new_manifest, new_spec_hashes)
+            cfh.register_image_version(new_manifest)
+            cfh.save_status("Deployed", upd_channel=new_config.update_channel, pkg_version=new_manifest.package_version,
+                            metrics=compose_run_metrics("replace", "Deployed"))
+            return True
+        lg.info(f'Containers to recreate: {", ".join(c.name for c in changed.containers) or "none"}, '
+                f'containers to remove: {", ".join(c.name for c in obsolete.containers) or "none"}')
+
+        if not cfh.journal.resuming:
+            cfh.journal.begin("replace", {
+                "current_config": current_config.to_dict(),
+                "new_config": new_config.to_dict(),
+                "current_manifest": current_manifest.to_dict(),
+                "new_manifest": new_manifest.to_dict(),
+                "plan": {"remove": [c.name for c in obsolete.containers],
+                         "create": [c.name for c in changed.containers]}
+            })
+        cfh.save_status("Deploying")
+        cfh.register_image_version(new_manifest, installed=False)
+        try:
+            __run_journaled(cfh, "pull", changed.containers, dock.pull_images)
+        except ImageDoesNotExist as e:
+            cfh.journal.finish()
+            cfh.save_status(status="DeploymentError", error_msg=str(e),
+                            metrics=compose_run_metrics("replace", "DeploymentError"))
+            perform_cleanup(cfh, dock)
+            raise
+
+        if cs.SWAP_CONTAINERS_ON_DEPLOYMENT:
+            if not swap_deployment(new_config, obsolete, changed, dock, cfh):
+                return False
+        else:
+            try:
+                __run_journaled(cfh, "remove", obsolete.containers,
+                                lambda pending: uninstall_application(replace(obsolete, containers=pending), dock))
+                lg.info("Creating new containers")
+                install_deployment(new_config, changed, dock, cfh)
+            except ContainerCreateError as e:
+                cfh.journal.finish()
+                __perform_fallback(cfh, current_config, obsolete, dock, e, changed)
+                return False
+        cfh.save_installed_stack(new_config, new_manifest, new_spec_hashes)
+        cfh.journal.finish()
+        cfh.register_image_version(new_manifest)
+        lg.info("Performing cleanup...")
+        try:
+            perform_cleanup(cfh, dock)
+        except APIError as e:
+            lg.warning(f'Cleanup of unused images failed: {e}')
+        cfh.save_status("Deployed", upd_channel=new_config.update_channel,
+                        pkg_version=new_manifest.package_version, metrics=compose_run_metrics("replace", "Deployed"))
+        lg.info("Containers successfully deployed")
+        return True
+
+
+def discard_interrupted_replacement(cfh: DataHandler, dock: DockerHandler) -> None:
+    """
+    Takes over the journal of an interrupted replacement and discards it. All containers the replacement may have
+    touched are removed, including the temporary containers of a swap, so that the next replacement recreates them.
+    Raises a DeploymentInProgress exception if another process has taken the journal over in the meantime.
+    :param cfh: DataHandler instance
+    :param dock: DockerHandler instance
+    """
+    plan = cfh.journal.resume()["data"]["plan"]
     try:
-        dock.pull_images(new_manifest.containers)
-    except ImageDoesNotExist as e:
-        cfh.save_status(status="DeploymentError", error_msg=str(e))
-        dock.perform_cleanup()
+        for name in plan["create"]:
+            dock.remove_container(f'{name}{cs.SWAP_NEW_CONTAINER_SUFFIX}')
+            dock.remove_container(name)
+        for name in plan["remove"]:
+            dock.remove_container(f'{name}{cs.SWAP_OLD_CONTAINER_SUFFIX}')
+    except APIError:
+        cfh.journal.interrupt()
         raise
+    cfh.journal.finish()
 
+
+def swap_deployment(config: LocalConfig, current_manifest: UpdateManifest, new_manifest: UpdateManifest,
+                    dock: DockerHandler, cfh: DataHandler) -> bool:
+    """
+    Replaces the current containers with new ones with minimal downtime. The new containers are created under
+    temporary names while the current ones are still running. Afterwards the current containers are stopped and the
+    new containers take over their names and are started. Host ports are only bound when a container is started,
+    therefore the new containers never compete with the running ones for ports like 10051.
+    The swap is only successful if all new containers pass their readiness check. If anything fails, the new
+    containers are removed and the current containers are restarted.
+    :param config: LocalConfig object for the new containers
+    :param current_manifest: UpdateManifest object with the containers to replace
+    :param new_manifest: UpdateManifest object with the containers to create
+    :param dock: DockerHandler instance
+    :param cfh: DataHandler instance
+    :return: True if successful, False if the current containers have been restored
+    """
     try:
-        uninstall_application(current_manifest, dock)
-        lg.info("Creating new containers")
-        install_deployment(new_config, new_manifest, dock, cfh)
-    except ContainerCreateError as e:
-        __perform_fallback(cfh, current_config, current_manifest, dock, e, new_manifest)
+        lg.info("Pre-creating new containers while the current containers are still running")
+        new_names = {c.name for c in new_manifest.containers}
+        staged = [__get_staged_container(c, new_names) for c in new_manifest.containers]
+        __create_containers(config, replace(new_manifest, containers=staged), dock, cfh)
+
+        with ph.phase("Container swap"):
+            swap_start = time.perf_counter()
+            __run_journaled(cfh, "stop", current_manifest.containers, dock.stop_containers)
+            for container in current_manifest.containers:
+                if not cfh.journal.is_completed("rename_old", container.name):
+                    dock.rename_container(container.name, __get_swap_name(container, cs.SWAP_OLD_CONTAINER_SUFFIX))
+                    cfh.journal.complete("rename_old", container.name)
+            for container in new_manifest.containers:
+                if not cfh.journal.is_completed("rename_new", container.name):
+                    dock.rename_container(__get_swap_name(container, cs.SWAP_NEW_CONTAINER_SUFFIX), container.name)
+                    cfh.journal.complete("rename_new", container.name)
+            __run_journaled(cfh, "start", new_manifest.containers, dock.start_containers)
+            lg.info(f'Containers swapped, downtime: {round(time.perf_counter() - swap_start, 2)}s')
+        __run_journaled(cfh, "ready", new_manifest.containers,
+                        lambda pending: cfh.save_time_to_ready(rh.wait_until_ready(pending, dock)))
+    except (ContainerCreateError, APIError) as e:
+        renamed = [c.name for c in current_manifest.containers if cfh.journal.is_completed("rename_old", c.name)]
+        cfh.journal.finish()
+        __rollback_swap(current_manifest, new_manifest, renamed, dock, cfh, e)
         return False
-    else:
-        cfh.save_installed_stack(new_config, new_manifest)
-        cfh.save_status("Deployed", upd_channel=new_config.update_channel,
-                        pkg_version=new_manifest.package_version)
-        lg.info("Performing cleanup...")
-        dock.perform_cleanup()
-        lg.info("Containers successfully deployed")
+
+    for container in current_manifest.containers:
+        dock.remove_container(__get_swap_name(container, cs.SWAP_OLD_CONTAINER_SUFFIX))
     return True
 
 
+def __rollback_swap(current_manifest: UpdateManifest, new_manifest: UpdateManifest, renamed: list[str],
+                    dock: DockerHandler, cfh: DataHandler, e: Exception) -> None:
+    """
+    Removes the new containers of a failed swap and restarts the current containers under their original names
+    :param current_manifest: UpdateManifest object with the containers that should have been replaced
+    :param new_manifest: UpdateManifest object with the containers that were attempted to be deployed
+    :param renamed: Names of the current containers that have already been renamed
+    :param dock: DockerHandler instance
+    :param cfh: DataHandler instance
+    :param e: Exception that was raised
+    """
+    lg.error(f"Error while swapping containers: {e}")
+    lg.info("Restoring the previous containers")
+    untouched = {container.name for container in current_manifest.containers} - set(renamed)
+    for container in new_manifest.containers:
+        dock.remove_container(__get_swap_name(container, cs.SWAP_NEW_CONTAINER_SUFFIX))
+        if container.name not in untouched:
+            dock.remove_container(container.name)
+    for name in renamed:
+        dock.rename_container(f'{name}{cs.SWAP_OLD_CONTAINER_SUFFIX}', name)
+    dock.start_containers(current_manifest.containers)
+    cfh.save_status("DeploymentError", error_msg=str(e), metrics=compose_run_metrics("replace", "DeploymentError"))
+    lg.info("Previous containers successfully restored")
+    lg.info("Performing cleanup...")
+    try:
+        perform_cleanup(cfh, dock)
+    except APIError as cleanup_error:
+        lg.warning(f'Cleanup of unused images failed: {cleanup_error}')
+
+
+def __get_staged_container(container: ContainerConfig, new_names: set[str]) -> ContainerConfig:
+    """
+    Returns a new container of a swap under its temporary name. Dependencies on other new containers are pointed to
+    their temporary names as well, so that the staged containers are created in dependency order.
+    :param container: ContainerConfig object of the new container
+    :param new_names: Names of all new containers of the swap
+    :return: ContainerConfig object with the temporary name
+    """
+    depends_on = container.depends_on
+    if depends_on:
+        depends_on = [f'{name}{cs.SWAP_NEW_CONTAINER_SUFFIX}' if name in new_names else name for name in depends_on]
+    return replace(container, name=__get_swap_name(container, cs.SWAP_NEW_CONTAINER_SUFFIX), depends_on=depends_on)
+
+
+def __get_swap_name(container: ContainerConfig, suffix: str) -> str:
+    """
+    Returns the temporary name of a container during a swap
+    :param container: ContainerConfig object
+    :param suffix: One of the swap suffixes from the const settings
+    :return: Temporary container name
+    """
+    return f'{container.name}{suffix}'
+
+
+def perform_cleanup(cfh: DataHandler, dock: DockerHandler, remove_all: bool = False) -> None:
+    """
+    Removes the images of SmartMonitoring that are outside the retention window. The images of the last deployed
+    versions and the prefetched images for the next update are kept, unless the disk is running out of space.
+    Images that do not belong to SmartMonitoring are never touched.
+    :param cfh: DataHandler instance
+    :param dock: DockerHandler instance
+    :param remove_all: Remove all images of SmartMonitoring, e.g. when the deployment is removed
+    """
+    versions = cfh.get_image_registry()
+    record = cfh.get_prefetch_record()
+    prefetched = record["images"] if record is not None else []
+    owned = {image for entry in versions for image in entry["images"]} | set(prefetched)
+
+    retained_versions = 0 if remove_all else cs.IMAGE_RETENTION_VERSIONS
+    if not remove_all and dock.get_disk_usage_percent() >= cs.IMAGE_RETENTION_DISK_PRESSURE_PERCENT:
+        lg.warning(f'Disk usage is above {cs.IMAGE_RETENTION_DISK_PRESSURE_PERCENT}%, '
+                   f'only the images of the current version are kept')
+        retained_versions, prefetched = 1, []
+    # Versions that have never been installed are not retained, their images belong to a failed deployment
+    installed = [entry for entry in versions if entry.get("installed", True)]
+    retained = installed[len(installed) - retained_versions:] if retained_versions else []
+    keep = {image for entry in retained for image in entry["images"]} | set(prefetched)
+
+    lg.debug(f'Keeping images of versions: {[entry["package_version"] for entry in retained]}')
+    dock.perform_cleanup(sorted(owned - keep))
+    if not remove_all:
+        cfh.save_image_registry(retained)
+
+
+def compose_run_metrics(operation: str, result: str) -> dict:
+    """
+    Composes the metrics of the current deployment run from the recorded profile phases. Steps that ran
+    concurrently for several containers are counted with their wall time. The downtime is the window between the
+    first container being stopped and the last container being started, it lasts until now if no container has been
+    started again.
+    :param operation: Name of the operation, e.g. deploy or replace
+    :param result: Status with which the run finished
+    :return: Dict with the duration of each step, the downtime and the downloaded bytes
+    """
+    stopped, started = ph.get_marks("Container stopped"), ph.get_marks("Container started")
+    downtime = 0.0
+    if stopped:
+        restarted = [mark for mark in started if mark >= stopped[0]]
+        downtime = (restarted[-1] if restarted else time.perf_counter()) - stopped[0]
+    metrics = {
+        "operation": operation,
+        "result": result,
+        "finished": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "duration_seconds": round(ph.get_elapsed(), 2),
+        "downtime_seconds": round(downtime, 2),
+        "pull_bytes": int(ph.get_counter("Image pull bytes")),
+        "steps": {step: round(ph.get_phase_wall_time(name), 2) for step, name in METRICS_STEP_PHASES.items()}
+    }
+    lg.debug(f'Deployment metrics: {metrics}')
+    return metrics
+
+
+def compose_spec_hashes(config: LocalConfig, manifest: UpdateManifest, cfh: DataHandler) -> dict:
+    """
+    Composes the hash of the effective spec of each container of a deployment
+    :param config: LocalConfig object
+    :param manifest: UpdateManifest object
+    :param cfh: DataHandler instance
+    :return: Dict with the container name as key and the spec hash as value
+    """
+    return {container.name: cfh.compose_container_spec_hash(config, container) for container in manifest.containers}
+
+
+def __get_changed_containers(current_manifest: UpdateManifest, new_manifest: UpdateManifest,
+                             current_spec_hashes: dict, new_spec_hashes: dict, cfh: DataHandler,
+                             dock: DockerHandler) -> tuple[UpdateManifest, UpdateManifest]:
+    """
+    Determines which containers have to be removed and which have to be created to get from the current to the new
+    deployment. Dynamic secrets that have not been persisted yet are generated on creation, therefore all containers
+    that use such a secret are recreated as well.
+    :param current_manifest: UpdateManifest object of the currently running containers
+    :param new_manifest: UpdateManifest object for the new containers
+    :param current_spec_hashes: Spec hashes of the currently running containers
+    :param new_spec_hashes: Spec hashes of the new containers
+    :param cfh: DataHandler instance
+    :param dock: DockerHandler instance
+    :return: Tuple of two UpdateManifest objects, containing the containers to remove and the containers to create
+    """
+    current_names = {container.name for container in current_manifest.containers}
+    recreate = {container.name for container in new_manifest.containers
+                if container.name not in current_names
+                or current_spec_hashes.get(container.name) != new_spec_hashes[container.name]
+                or not dock.check_if_container_exists(container.name)}
+
+    new_secrets = set(cfh.get_unpersisted_secret_names(new_manifest.dynamic_secrets))
+    for container in new_manifest.containers:
+        if container.name not in recreate and cfh.get_container_secret_names(container) & new_secrets:
+            lg.debug(f'Container {container.name} is recreated, because it uses a newly generated secret')
+            recreate.add(container.name)
+
+    new_names = {container.name for container in new_manifest.containers}
+    obsolete = [container for container in current_manifest.containers
+                if container.name not in new_names or container.name in recreate]
+    changed = [container for container in new_manifest.containers if container.name in recreate]
+    return replace(current_manifest, containers=obsolete), replace(new_manifest, containers=changed)
+
+
 def __perform_fallback(cfh: DataHandler, current_config: LocalConfig, current_manifest: UpdateManifest,
                        dock: DockerHandler, e: Exception, new_manifest: UpdateManifest) -> None:
     """
-    Performs a fallback to the previous deployment
+    Performs a fallback to the previous deployment. If the previous containers can not be restored either, the status
+    is saved with both errors and the error of the fallback is raised.
     :param cfh: DataHandler instance
-    :param current_config: LocalConfig object of the currently running containers
-    :param current_manifest: UpdateManifest object of the currently running containers
+    :param current_config: LocalConfig object of the removed containers
+    :param current_manifest: UpdateManifest object with the removed containers
     :param dock: DockerHandler instance
     :param e: Exception that was raised
-    :param new_manifest: UpdateManifest object that was attempted to be deployed
+    :param new_manifest: UpdateManifest object with the containers that were attempted to be deployed
     """
     lg.error(f"Error while deploying new containers: {e}")
     lg.info("Performing fallback to previous version")
     uninstall_application(new_manifest, dock)
     lg.info("Creating old containers")
-    install_deployment(current_config, current_manifest, dock, cfh)
-    cfh.save_status("DeploymentError", error_msg=str(e))
+    try:
+        install_deployment(current_config, current_manifest, dock, cfh)
+    except (ContainerNotReady, ContainerCreateError) as fallback_error:
+        lg.error(f"Error while restoring the previous containers: {fallback_error}")
+        cfh.save_status("DeploymentError", error_msg=f'{e}, fallback to the previous version failed: {fallback_error}',
+                        metrics=compose_run_metrics("replace", "DeploymentError"))
+        raise
+    cfh.save_status("DeploymentError", error_msg=str(e), metrics=compose_run_metrics("replace", "DeploymentError"))
     lg.info("Performing cleanup...")
-    dock.perform_cleanup()
+    perform_cleanup(cfh, dock)
     lg.info("Old containers successfully created")
 
 
@@ -75,25 +380,88 @@ def install_deployment(config: LocalConfig,
                        dock: DockerHandler,
                        cfh: DataHandler) -> None:
     """
-    Creates the containers for the given config and manifest
+    Creates and starts the containers for the given config and manifest and waits until all of them are ready
+    :param config: LocalConfig object
+    :param manifest: UpdateManifest object
+    :param dock: DockerHandler instance
+    :param cfh: DataHandler instance
+    """
+    __create_containers(config, manifest, dock, cfh)
+    __run_journaled(cfh, "start", manifest.containers, dock.start_containers)
+    __run_journaled(cfh, "ready", manifest.containers,
+                    lambda pending: cfh.save_time_to_ready(rh.wait_until_ready(pending, dock)))
+
+
+@contextmanager
+def __release_journal_on_error(cfh: DataHandler, operation: str):
+    """
+    Releases the deployment journal if a journaled operation fails with an error that is not handled by the operation
+    itself. The journal is marked as interrupted, so that the operation is not reported as in progress anymore and can
+    be resumed explicitly.
+    :param cfh: DataHandler instance
+    :param operation: Name of the operation for the run metrics, e.g. deploy or replace
+    """
+    try:
+        yield
+    except Exception as e:
+        if cfh.journal.interrupt():
+            lg.error(f'Deployment interrupted by an unexpected error: {e}')
+            cfh.save_status("DeploymentError", error_msg=str(e),
+                            metrics=compose_run_metrics(operation, "DeploymentError"))
+        raise
+
+
+def __run_journaled(cfh: DataHandler, step: str, containers: list[ContainerConfig], function) -> None:
+    """
+    Runs a step for all containers that did not complete it before the deployment was interrupted and records the
+    completion in the deployment journal
+    :param cfh: DataHandler instance
+    :param step: Name of the step
+    :param containers: List of ContainerConfig objects
+    :param function: Function that is called with the list of pending ContainerConfig objects
+    """
+    pending = [container for container in containers if not cfh.journal.is_completed(step, container.name)]
+    if len(pending) < len(containers):
+        lg.info(f'Step {step} was already completed for {len(containers) - len(pending)} containers, skipping them')
+    if pending:
+        function(pending)
+    for container in pending:
+        cfh.journal.complete(step, container.name)
+
+
+def __create_containers(config: LocalConfig,
+                        manifest: UpdateManifest,
+                        dock: DockerHandler,
+                        cfh: DataHandler) -> None:
+    """
+    Creates the containers for the given config and manifest without starting them
     :param config: LocalConfig object
     :param manifest: UpdateManifest object
     :param dock: DockerHandler instance
     :param cfh: DataHandler instance
     """
-    env_secrets = cfh.generate_dynamic_secrets(manifest.dynamic_secrets)
-    for container in manifest.containers:
+    env_secrets = cfh.get_dynamic_secrets(manifest.dynamic_secrets)
+
+    def create(container: ContainerConfig) -> None:
+        if cfh.journal.is_completed("create", container.name):
+            lg.info(f'Container {container.name} was already created before the interruption, skipping it')
+            return
         env_vars = cfh.compose_env_variables(config, container, env_secrets)
+        labels = {
+            cs.CONTAINER_LABEL_VERSION: manifest.package_version,
+            cs.CONTAINER_LABEL_SPEC_HASH: cfh.compose_container_spec_hash(config, container)
+        }
         lg.info(f"Deploying container: {container.name} with image: {container.image}...")
 
         # Set local file path based on config file
         if container.files is not None:
             container_files = cfh.compose_mapped_files(container, config)
-            dock.create_container(container, env_vars, container_files)
+            dock.create_container(container, env_vars, container_files, labels)
         else:
-            dock.create_container(container, env_vars)
-    dock.start_containers(manifest.containers)
-    pass
+            dock.create_container(container, env_vars, labels=labels)
+        cfh.journal.complete("create", container.name)
+
+    dg.run_in_dependency_order(manifest.containers, create, "Creation")
 
 
 def uninstall_application(manifest: UpdateManifest, dock: DockerHandler) -> None:
@@ -104,4 +472,3 @@ def uninstall_application(manifest: UpdateManifest, dock: DockerHandler) -> None
     """
     lg.info("Decommission currently running containers")
     dock.remove_containers(manifest.containers)
-    pass
@@ -1,7 +1,8 @@
 import logging as lg
 import os
 import socket
-import requests
+
+import smartmonitoring_cli.const_settings as cs
 
 
 def delete_file_if_exists(filename) -> None:
@@ -27,13 +28,15 @@ def create_folder_if_not_exists(folder: os.path) -> None:
 
 def get_local_ip_address() -> str:
     """
-    Evaluates the local ip address of the device by connecting to google dns
+    Evaluates the local ip address of the device by connecting to google dns. The socket is not sent any data, only
+    the route is looked up. Use the AddressResolver to get a cached address.
     :return: String of the local ip address
     """
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        return str(s.getsockname()[0])
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.settimeout(cs.PUBLIC_IP_CONNECT_TIMEOUT_SECONDS)
+            s.connect(("8.8.8.8", 80))
+            return str(s.getsockname()[0])
     except Exception as e:
         lg.debug("Error getting local ip address: " + str(e))
         return "unknown"
@@ -41,12 +44,16 @@ def get_local_ip_address() -> str:
 
 def get_public_ip_address() -> str:
     """
-    Evaluates the public ip address of the device by connecting a public ip address service
+    Evaluates the public ip address of the device by connecting a public ip address service. The service has to
+    accept the connection and to answer within strict deadlines. Use the AddressResolver to get a cached address.
     :return: Public ip address as string
     """
     import requests
     try:
-        public_ip = requests.get('https://checkip.amazonaws.com').text.strip()
+        response = requests.get('https://checkip.amazonaws.com',
+                                timeout=(cs.PUBLIC_IP_CONNECT_TIMEOUT_SECONDS, cs.PUBLIC_IP_READ_TIMEOUT_SECONDS))
+        response.raise_for_status()
+        public_ip = response.text.strip()
     except Exception as e:
         lg.debug("Error getting public ip address: " + str(e))
         public_ip = "unknown"
@@ -75,6 +82,7 @@ def check_server_connection(url: str) -> bool:
     :param url: URL to check
     :return: True if reachable, False if not
     """
+    import requests
     try:
         requests.get(url, timeout=4)
         lg.debug(f'Connection to {url} successful')
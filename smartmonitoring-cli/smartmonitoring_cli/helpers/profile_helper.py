@@ -0,0 +1,219 @@
+import logging as lg
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import smartmonitoring_cli.const_settings as cs
+
+# Phases, marks and counters are only recorded while profiling is enabled or an operation is recorded, e.g. for the
+# metrics of a deployment. They are only printed if profiling is enabled.
+enabled = False
+output_dir = None
+__recordings = 0
+__phases = deque(maxlen=cs.PROFILE_MAX_ENTRIES)
+__marks = {}
+__counters = {}
+__started = time.perf_counter()
+__lock = threading.Lock()
+__local = threading.local()
+__profiler = None
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Measures the wall time of a phase. Can be used as context manager or as decorator.
+    :param name: Name of the phase
+    """
+    depth = getattr(__local, "depth", 0)
+    __local.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        __local.depth = depth
+        record_phase(name, time.perf_counter() - start, depth, start)
+
+
+def record_phase(name: str, seconds: float, depth: int = 0, start: float = None) -> None:
+    """
+    Records the duration of a phase that was measured elsewhere
+    :param name: Name of the phase
+    :param seconds: Duration of the phase in seconds
+    :param depth: Nesting level of the phase
+    :param start: perf_counter value at the start of the phase, defaults to now minus the duration
+    """
+    if not is_recording():
+        return
+    if start is None: start = time.perf_counter() - seconds
+    with __lock:
+        __phases.append({"name": name, "seconds": seconds, "depth": depth, "start": start})
+
+
+def mark(name: str) -> None:
+    """
+    Records the point in time at which an event happened, e.g. a container was stopped
+    :param name: Name of the event
+    """
+    if not is_recording():
+        return
+    now = time.perf_counter()
+    with __lock:
+        __marks.setdefault(name, deque(maxlen=cs.PROFILE_MAX_ENTRIES)).append(now)
+
+
+def count(name: str, amount: float) -> None:
+    """
+    Adds an amount to a counter, e.g. the downloaded bytes
+    :param name: Name of the counter
+    :param amount: Amount to add
+    """
+    if not is_recording():
+        return
+    with __lock:
+        __counters[name] = __counters.get(name, 0) + amount
+
+
+@contextmanager
+def recording():
+    """
+    Records the phases, marks and counters of an operation. Can be used as context manager or as decorator.
+    The data of the previous operation is discarded when a new operation starts, unless profiling is enabled, in which
+    case everything the process did is kept. Operations of the agent are serialized, so only one is recorded at a time.
+    """
+    global __recordings, __started
+    with __lock:
+        if __recordings == 0 and not enabled:
+            __started = time.perf_counter()
+            __phases.clear()
+            __marks.clear()
+            __counters.clear()
+        __recordings += 1
+    try:
+        yield
+    finally:
+        with __lock:
+            __recordings -= 1
+
+
+def is_recording() -> bool:
+    """
+    Checks if phases, marks and counters are currently recorded
+    :return: True if profiling is enabled or an operation is recorded, False otherwise
+    """
+    return enabled or __recordings > 0
+
+
+def get_marks(name: str) -> list[float]:
+    """
+    Returns the points in time at which an event happened
+    :param name: Name of the event
+    :return: List of perf_counter values in chronological order
+    """
+    with __lock:
+        return sorted(__marks.get(name, []))
+
+
+def get_counter(name: str) -> float:
+    """
+    Returns the value of a counter
+    :param name: Name of the counter
+    :return: Value of the counter, 0 if nothing was counted
+    """
+    with __lock:
+        return __counters.get(name, 0)
+
+
+def get_elapsed() -> float:
+    """
+    Returns the time since the process was started or the current recording was started
+    :return: Elapsed time in seconds
+    """
+    return time.perf_counter() - __started
+
+
+def get_phase_wall_time(name: str) -> float:
+    """
+    Returns the wall time during which at least one phase with the given name was running. Phases that ran
+    concurrently are only counted once.
+    :param name: Name of the phase
+    :return: Wall time in seconds
+    """
+    with __lock:
+        intervals = sorted((e["start"], e["start"] + e["seconds"]) for e in __phases if e["name"] == name)
+    total, current_end = 0.0, None
+    for start, end in intervals:
+        if current_end is None or start > current_end:
+            total += end - start
+            current_end = end
+        elif end > current_end:
+            total += end - current_end
+            current_end = end
+    return total
+
+
+def get_phase_summary() -> list[dict]:
+    """
+    Summarizes all recorded phases by name in order of their first occurrence
+    :return: List of dicts with name, depth, amount of calls and total seconds of each phase
+    """
+    summary = {}
+    with __lock:
+        for entry in sorted(__phases, key=lambda e: e["start"]):
+            if entry["name"] not in summary:
+                summary[entry["name"]] = {"name": entry["name"], "depth": entry["depth"], "calls": 0, "seconds": 0.0}
+            summary[entry["name"]]["calls"] += 1
+            summary[entry["name"]]["seconds"] += entry["seconds"]
+    return list(summary.values())
+
+
+def start_profiling(dump: bool) -> None:
+    """
+    Enables profiling for the current command
+    :param dump: Also collect a cProfile profile and tracemalloc allocations
+    """
+    global enabled, __profiler
+    enabled = True
+    if not dump:
+        return
+    import cProfile
+    import tracemalloc
+    tracemalloc.start()
+    __profiler = cProfile.Profile()
+    __profiler.enable()
+
+
+def finish_profiling() -> None:
+    """Logs the recorded phases and writes the cProfile and tracemalloc results to the output directory"""
+    if not enabled:
+        return
+    lg.info(" PROFILE ".center(cs.CLI_WIDTH, '#'))
+    lg.info(f'{"Phase":<50}{"Calls":>8}{"Seconds":>12}')
+    for entry in get_phase_summary():
+        name = "  " * entry["depth"] + entry["name"]
+        lg.info(f'{name:<50}{entry["calls"]:>8}{round(entry["seconds"], 3):>12}')
+    if __profiler is not None:
+        __dump_profiler_results()
+
+
+def __dump_profiler_results() -> None:
+    """Writes the cProfile statistics and the top tracemalloc allocations to the output directory"""
+    import tracemalloc
+    __profiler.disable()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    prefix = os.path.join(output_dir, f'profile-{datetime.now().strftime("%Y%m%d-%H%M%S")}')
+
+    __profiler.dump_stats(f'{prefix}.prof')
+    lg.info(f'cProfile statistics saved to: {prefix}.prof')
+
+    allocations = snapshot.statistics("lineno")[:cs.PROFILE_TOP_ALLOCATIONS]
+    with open(f'{prefix}-allocations.txt', 'w') as f:
+        for stat in allocations:
+            f.write(f'{stat}\n')
+    lg.info(f'Top {len(allocations)} memory allocations saved to: {prefix}-allocations.txt')
+    for stat in allocations[:5]:
+        lg.info(f'{stat}')
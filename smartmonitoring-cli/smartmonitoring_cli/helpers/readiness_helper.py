@@ -0,0 +1,111 @@
+import asyncio
+import logging as lg
+import re
+import time
+
+import smartmonitoring_cli.const_settings as cs
+import smartmonitoring_cli.helpers.profile_helper as ph
+from smartmonitoring_cli.handlers.docker_handler import DockerHandler, ContainerNotReady
+from smartmonitoring_cli.models.update_manifest import ContainerConfig, ReadinessCheck
+
+
+@ph.phase("Readiness wait")
+def wait_until_ready(containers: list[ContainerConfig], dock: DockerHandler) -> dict[str, float]:
+    """
+    Waits until all given containers pass their readiness check. The checks of all containers are polled
+    concurrently, each with its own deadline. Containers without a readiness check only have to be running.
+    Raises a ContainerNotReady exception if a container is not ready before its deadline or is crash-looping.
+    :param containers: List of ContainerConfig objects of the started containers
+    :param dock: DockerHandler instance
+    :return: Dict with the container name as key and the seconds until it was ready as value
+    """
+    if not containers:
+        return {}
+    lg.info(f'Waiting for {len(containers)} containers to become ready...')
+    return asyncio.run(__wait_for_containers(containers, dock))
+
+
+async def __wait_for_containers(containers: list[ContainerConfig], dock: DockerHandler) -> dict[str, float]:
+    """
+    Polls the readiness checks of all containers concurrently
+    :param containers: List of ContainerConfig objects
+    :param dock: DockerHandler instance
+    :return: Dict with the container name as key and the seconds until it was ready as value
+    """
+    start = time.perf_counter()
+    results = await asyncio.gather(*(__wait_for_container(container, dock, start) for container in containers),
+                                   return_exceptions=True)
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        raise errors[0]
+    return {container.name: seconds for container, seconds in zip(containers, results)}
+
+
+async def __wait_for_container(container: ContainerConfig, dock: DockerHandler, start: float) -> float:
+    """
+    Polls the readiness check of a container with a short, growing backoff until it passes or the deadline is reached
+    :param container: ContainerConfig object
+    :param dock: DockerHandler instance
+    :param start: perf_counter value at which waiting started
+    :return: Seconds until the container was ready
+    """
+    check = container.readiness or ReadinessCheck("running")
+    timeout = check.timeout or cs.READINESS_DEFAULT_TIMEOUT_SECONDS
+    deadline = start + timeout
+    delay = cs.READINESS_INITIAL_BACKOFF_SECONDS
+    while True:
+        attrs = await asyncio.to_thread(dock.get_container_attributes, container.name)
+        if attrs.get("RestartCount", 0) >= cs.READINESS_MAX_RESTARTS:
+            raise ContainerNotReady(f'Container {container.name} is crash-looping, it restarted '
+                                    f'{attrs["RestartCount"]} times')
+        if attrs["State"]["Running"] and await __probe(container, check, attrs, dock):
+            seconds = round(time.perf_counter() - start, 2)
+            lg.info(f'Container {container.name} is ready after {seconds}s')
+            return seconds
+        if time.perf_counter() + delay > deadline:
+            raise ContainerNotReady(f'Container {container.name} did not pass its {check.type} readiness check '
+                                    f'within {timeout}s')
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, cs.READINESS_MAX_BACKOFF_SECONDS)
+
+
+async def __probe(container: ContainerConfig, check: ReadinessCheck, attrs: dict, dock: DockerHandler) -> bool:
+    """
+    Executes the readiness check of a running container once
+    :param container: ContainerConfig object
+    :param check: ReadinessCheck object of the container
+    :param attrs: Current attributes of the container from the docker api
+    :param dock: DockerHandler instance
+    :return: True if the container passed the check, False otherwise
+    """
+    if check.type == "healthcheck":
+        if "Health" not in attrs["State"]:
+            raise ContainerNotReady(f'Image of container {container.name} defines no HEALTHCHECK')
+        return attrs["State"]["Health"]["Status"] == "healthy"
+    if check.type == "tcp":
+        return await __probe_tcp(attrs, check.port)
+    if check.type == "log":
+        logs = await asyncio.to_thread(dock.get_container_logs, container.name)
+        return re.search(check.pattern, logs) is not None
+    return True
+
+
+async def __probe_tcp(attrs: dict, port: int) -> bool:
+    """
+    Tries to open a tcp connection to a port of the container. The container ip is used instead of a published host
+    port, because docker accepts connections on published ports even if the container does not listen yet.
+    :param attrs: Current attributes of the container from the docker api
+    :param port: Port inside the container
+    :return: True if the connection could be established, False otherwise
+    """
+    addresses = [network["IPAddress"] for network in attrs["NetworkSettings"]["Networks"].values()
+                 if network.get("IPAddress")]
+    for address in addresses:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(address, port),
+                                               timeout=cs.READINESS_PROBE_TIMEOUT_SECONDS)
+        except (OSError, asyncio.TimeoutError):
+            continue
+        writer.close()
+        return True
+    return False
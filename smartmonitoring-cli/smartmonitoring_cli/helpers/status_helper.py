@@ -0,0 +1,205 @@
+import json
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+import smartmonitoring_cli.const_settings as cs
+from smartmonitoring_cli import __version__
+from smartmonitoring_cli.handlers.address_handler import AddressResolver
+from smartmonitoring_cli.handlers.agent_handler import AgentClient, AgentUnavailable, AgentRequestError
+from smartmonitoring_cli.handlers.data_handler import DataHandler
+from smartmonitoring_cli.models.local_config import LocalConfig
+from smartmonitoring_cli.models.update_manifest import UpdateManifest, ContainerConfig
+
+# The status dashboard and the machine-readable status output are composed from the same data model:
+# the system status, the values of the host metrics sampler and the container statistics.
+
+OPENMETRICS_PREFIX = "smartmonitoring"
+OPENMETRICS_HOST_USAGE_NAMES = {"cpu": "CPU", "memory": "Memory", "disk": "Disk"}
+OPENMETRICS_CONTAINER_METRICS = [
+    ("mem_bytes", "memory_usage_bytes", "Memory usage in bytes"),
+    ("cpu_percent", "cpu_usage_percent", "CPU usage in percent"),
+    ("net_rx_rate", "net_rx_bytes_per_second", "Received bytes per second"),
+    ("net_tx_rate", "net_tx_bytes_per_second", "Transmitted bytes per second"),
+    ("blk_read_rate", "blk_read_bytes_per_second", "Block I/O read bytes per second"),
+    ("blk_write_rate", "blk_write_bytes_per_second", "Block I/O written bytes per second")
+]
+
+
+class ContainerStatistics:
+    def __init__(self, containers: list[ContainerConfig], agent: AgentClient = None):
+        """
+        Collects the container statistics for a whole status session. The statistics are requested from the agent
+        if one is running, otherwise they are collected on one long-lived thread pool with a single docker client.
+        :param containers: List of ContainerConfig objects for which the statistics should be collected
+        :param agent: AgentClient of a running agent
+        """
+        self.containers = containers
+        self.agent = agent
+        self.dock = None
+        self.pool = ThreadPoolExecutor(max_workers=len(containers), thread_name_prefix="container-stats")
+
+    def collect(self) -> list[dict]:
+        """
+        Gets the statistics of all containers
+        :return: List of dictionaries with the container statistics
+        """
+        if self.agent is not None:
+            try:
+                return self.agent.request("status", timeout=cs.AGENT_STATUS_TIMEOUT_SECONDS)["containers"]
+            except (AgentUnavailable, AgentRequestError):
+                pass
+        self.__get_docker_handler().invalidate_snapshot()
+        return self.dock.get_containers_stats(self.containers, self.pool)
+
+    def get_docker_root_dir(self) -> str:
+        """
+        Get the data-root of the docker engine
+        :return: Path of the data-root, the default if the engine can not be asked
+        """
+        from docker.errors import APIError
+        try:
+            return self.__get_docker_handler().get_docker_root_dir()
+        except (APIError, OSError):
+            return cs.DOCKER_DEFAULT_ROOT_DIR
+
+    def close(self) -> None:
+        """Shuts the thread pool down"""
+        self.pool.shutdown(wait=False)
+
+    def __get_docker_handler(self):
+        """
+        Creates the docker client on first use, it is not needed if the agent answers all requests
+        :return: DockerHandler instance
+        """
+        if self.dock is None:
+            from smartmonitoring_cli.handlers.docker_handler import DockerHandler
+            self.dock = DockerHandler()
+        return self.dock
+
+
+def compose_system_status(cfh: DataHandler, config: LocalConfig = None, manifest: UpdateManifest = None) -> dict:
+    """
+    Composes the information about the system and deployment status, the ip addresses are taken from the cache
+    :param cfh: A DataHandler instance
+    :param config: LocalConfig object, None if nothing is deployed
+    :param manifest: Manifest object, None if nothing is deployed
+    :return: Dict with hostname, versions, deployment status, update channel, proxy name and ip addresses
+    """
+    if config is None or manifest is None:
+        status, version, channel, proxy_name = "Not deployed", "-", "-", "-"
+    else:
+        status = cfh.get_status()["status"]
+        version = manifest.package_version
+        channel = config.update_channel
+        proxy_name = config.zabbix_proxy_container.proxy_name
+    resolver = AddressResolver(cfh)
+    return {
+        "hostname": socket.gethostname(),
+        "cli_version": __version__,
+        "status": status,
+        "package_version": version,
+        "update_channel": channel,
+        "proxy_name": proxy_name,
+        "local_ip": resolver.get_local_ip_address(),
+        "public_ip": resolver.get_public_ip_address()
+    }
+
+
+def compose_status_report(system: dict, host_metrics: list[dict], containers: Optional[list[dict]]) -> dict:
+    """
+    Composes the status report that is emitted as json or openmetrics
+    :param system: System status as composed by compose_system_status
+    :param host_metrics: Values of the HostMetricsSampler
+    :param containers: Container statistics, None if nothing is deployed
+    :return: Dict with the whole status
+    """
+    return {
+        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "system": system,
+        "host": host_metrics,
+        "containers": [{"name": container["name"], "status": container["status"], "image": container["image"],
+                        **container.get("metrics", {})} for container in containers or []]
+    }
+
+
+def format_json(report: dict) -> str:
+    """
+    Formats the status report as json document
+    :param report: Status report as composed by compose_status_report
+    :return: Json document as string
+    """
+    return json.dumps(report, indent=2)
+
+
+def format_openmetrics(report: dict) -> str:
+    """
+    Formats the status report in the openmetrics text format
+    :param report: Status report as composed by compose_status_report
+    :return: Openmetrics exposition as string, terminated by # EOF
+    """
+    families = {}
+    system = report["system"]
+    __add_sample(families, "deployment", "info", "Deployment of the host", 1,
+                 {key: system[key] for key in ("hostname", "cli_version", "status", "package_version",
+                                               "update_channel", "proxy_name")})
+    __add_sample(families, "deployed", "gauge", "1 if the stack is deployed", int(system["status"] == "Deployed"))
+    for metric in report["host"]:
+        labels = metric["labels"]
+        if metric["unit"] == "percent":
+            name = OPENMETRICS_HOST_USAGE_NAMES[metric["key"]]
+            __add_sample(families, f'host_{metric["key"]}_usage_percent', "gauge", f'{name} usage in percent',
+                         metric["value"], labels)
+            if metric["key"] != "cpu":
+                __add_sample(families, f'host_{metric["key"]}_size_bytes', "gauge", f'{name} size in bytes',
+                             metric["total"], labels)
+            continue
+        __add_sample(families, f'host_{metric["key"]}_bytes', "counter", f'{metric["name"]} bytes',
+                     metric["total"], labels)
+        __add_sample(families, f'host_{metric["key"]}_bytes_per_second', "gauge", f'{metric["name"]} rate',
+                     metric["value"], labels)
+    for container in report["containers"]:
+        labels = {"name": container["name"]}
+        __add_sample(families, "container_running", "gauge", "1 if the container is running",
+                     int(container["status"] == "running"), {**labels, "status": container["status"]})
+        for key, metric_name, help_text in OPENMETRICS_CONTAINER_METRICS:
+            __add_sample(families, f'container_{metric_name}', "gauge", help_text, container.get(key), labels)
+
+    lines = []
+    for name, family in families.items():
+        lines.append(f'# TYPE {name} {family["type"]}')
+        lines.append(f'# HELP {name} {family["help"]}')
+        lines.extend(family["samples"])
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def __add_sample(families: dict, key: str, metric_type: str, help_text: str, value: Optional[float],
+                 labels: dict = None) -> None:
+    """
+    Adds a sample to its metric family, samples without value are skipped
+    :param families: Dict with the metric families by name
+    :param key: Name of the metric without prefix
+    :param metric_type: Openmetrics type, gauge, counter or info
+    :param help_text: Description of the metric family
+    :param value: Value of the sample
+    :param labels: Labels of the sample
+    """
+    if value is None:
+        return
+    name = f'{OPENMETRICS_PREFIX}_{key}'
+    family = families.setdefault(name, {"type": metric_type, "help": help_text, "samples": []})
+    suffix = {"counter": "_total", "info": "_info"}.get(metric_type, "")
+    label_text = ",".join(f'{label}="{__escape_label_value(str(label_value))}"'
+                          for label, label_value in (labels or {}).items())
+    family["samples"].append(f'{name}{suffix}{{{label_text}}} {value}' if label_text else f'{name}{suffix} {value}')
+
+
+def __escape_label_value(value: str) -> str:
+    """
+    Escapes a label value for the openmetrics text format
+    :param value: Label value
+    :return: Escaped label value
+    """
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
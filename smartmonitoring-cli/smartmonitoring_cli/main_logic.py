@@ -1,23 +1,20 @@
 import logging as lg
 import os
 import sys
-from datetime import datetime, timedelta
 from pathlib import Path
-
-from packaging import version
-from rich.console import Console
-from rich.table import Table
+from typing import TYPE_CHECKING
 
 import smartmonitoring_cli.const_settings as cs
-import smartmonitoring_cli.helpers.cli_helper as cli
-import smartmonitoring_cli.helpers.deployment_helper as deph
 import smartmonitoring_cli.helpers.helper_functions as hf
 import smartmonitoring_cli.helpers.log_helper as lh
 from smartmonitoring_cli.handlers.data_handler import ConfigError, ManifestError, \
     ValueNotFoundInConfig, InstalledStackInvalid
 from smartmonitoring_cli.handlers.data_handler import DataHandler
-from smartmonitoring_cli.handlers.docker_handler import DockerHandler, ContainerCreateError, \
-    ImageDoesNotExist
+
+# Modules that pull in heavy dependencies (docker, rich, pyfiglet, psutil, packaging) are imported inside the
+# methods that need them, to keep the start-up time of lightweight commands low.
+if TYPE_CHECKING:
+    from smartmonitoring_cli.handlers.docker_handler import DockerHandler
 
 PARENT_FOLDER = os.path.dirname(os.path.dirname(__file__))
 
@@ -39,8 +36,98 @@ class MainLogic:
         self.status_file = Path(os.path.join(self.smartmonitoring_var_dir, cs.STATUS_FILE_NAME))
         self.config_file = Path(os.path.join(self.smartmonitoring_config_dir, cs.LOCAL_CONF_FILE_NAME))
 
-        self.cfh = DataHandler(self.config_file, self.stack_file, self.status_file)
-        pass
+        self.agent_socket = Path(os.path.join(self.smartmonitoring_var_dir, cs.AGENT_SOCKET_FILE_NAME))
+
+        self.cfh = DataHandler(self.config_file, self.stack_file, self.status_file, self.smartmonitoring_var_dir)
+        self.__dock = None
+        self.__stats = None
+
+    def __get_docker_handler(self) -> 'DockerHandler':
+        """
+        Returns the DockerHandler of this instance and connects to the local docker instance on first use.
+        :return: DockerHandler instance
+        """
+        if self.__dock is None:
+            import smartmonitoring_cli.helpers.profile_helper as ph
+            with ph.phase("Imports"):
+                from smartmonitoring_cli.handlers.docker_handler import DockerHandler
+            self.__dock = DockerHandler()
+        return self.__dock
+
+    def __invalidate_container_snapshot(self) -> None:
+        """
+        Discards the container snapshot of the DockerHandler, so that each agent command works with the current state
+        """
+        if self.__dock is not None:
+            self.__dock.invalidate_snapshot()
+
+    def execute(self, command: str, function, kwargs: dict = None) -> None:
+        """
+        Executes a command on the resident agent if one is running, otherwise executes the function in-process.
+        :param command: Name of the agent command
+        :param function: Function to execute if no agent is running
+        :param kwargs: Keyword arguments for the command and the function
+        """
+        from smartmonitoring_cli.handlers.agent_handler import AgentClient
+        if kwargs is None: kwargs = {}
+        client = AgentClient(self.agent_socket)
+        if client.is_running():
+            lg.debug(f'SmartMonitoring agent is running, executing {command} on the agent')
+            client.request(command, **kwargs)
+            return
+        lg.debug(f'No SmartMonitoring agent running, executing {command} in-process')
+        function(**kwargs)
+
+    def run_agent(self) -> None:
+        """Runs the resident agent, which keeps the docker connection and the installed stack in memory."""
+        import signal
+        import smartmonitoring_cli.helpers.profile_helper as ph
+        from smartmonitoring_cli.handlers.agent_handler import AgentServer
+
+        def terminate(signum, frame):
+            raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, terminate)
+        def recorded(function):
+            def run(**kwargs):
+                with ph.recording():
+                    self.__invalidate_container_snapshot()
+                    return function(**kwargs)
+            return run
+
+        commands = {
+            "status": self.get_agent_status,
+            "update": recorded(self.update_application),
+            "restart": recorded(self.restart_application),
+            "prefetch": recorded(self.prefetch_images),
+            "rollback": recorded(self.rollback_application),
+            "apply-config": recorded(lambda: self.validate_and_apply_config(silent=True))
+        }
+        from smartmonitoring_cli.handlers.events_handler import EventsWatcher
+        server = AgentServer(self.agent_socket, commands, read_only_commands=["status"])
+        # The socket is bound under a restrictive umask, before the events watcher starts to write the status file
+        server.bind()
+        EventsWatcher(self.__get_docker_handler(), self.cfh).start()
+        server.serve_forever()
+
+    def get_agent_status(self) -> dict:
+        """
+        Collects the deployment status and the statistics of all containers.
+        :return: Dict with the content of the status file and a list of container statistics
+        """
+        if not self.__check_if_deployed():
+            return {"status": None, "containers": []}
+        config, manifest = self.cfh.get_installed_stack()
+        self.__invalidate_container_snapshot()
+        if self.__stats is None:
+            from smartmonitoring_cli.handlers.stats_handler import StatsCollector
+            self.__stats = StatsCollector(self.__get_docker_handler())
+        self.__stats.watch(manifest.containers)
+        self.__stats.wait_for_samples(cs.STATS_FIRST_SAMPLE_TIMEOUT_SECONDS)
+        return {
+            "status": self.cfh.get_status() if self.status_file.exists() else None,
+            "containers": [self.__stats.get_stats(container) for container in manifest.containers]
+        }
 
     def setup_logging(self, debug: bool, silent: bool, only_critical: bool = False) -> None:
         """
@@ -109,6 +196,9 @@ class MainLogic:
             if debug: raise e
 
         if debug: return
+        from rich.console import Console
+        from rich.table import Table
+        import smartmonitoring_cli.helpers.cli_helper as cli
         cli.print_logo()
         table = Table(width=cs.CLI_WIDTH,
                       title="Configuration and Manifest Validation")
@@ -132,6 +222,8 @@ class MainLogic:
         """
         if not self.__check_preconditions("applying new configuration skipped"):
             return
+        import smartmonitoring_cli.helpers.cli_helper as cli
+        import smartmonitoring_cli.helpers.deployment_helper as deph
         current_config, manifest = self.cfh.get_installed_stack()
         try:
             lg.info("Validating new local configuration...")
@@ -150,75 +242,188 @@ class MainLogic:
             lg.info("Applying new configuration skipped")
             return
         lg.info("Applying new local configuration")
-        deph.replace_deployment(current_config, new_config, manifest, manifest, self.cfh, DockerHandler())
+        try:
+            deph.replace_deployment(current_config, new_config, manifest, manifest, self.cfh,
+                                    self.__get_docker_handler())
+        finally:
+            self.refresh_banner_snapshot()
 
-    def print_status(self, disable_refresh: bool, banner_version: bool) -> None:
+    def print_status(self, disable_refresh: bool, banner_version: bool, measure_overhead: bool = False,
+                     interval: float = cs.DASHBOARD_INTERVAL_SECONDS,
+                     duration: int = cs.DASHBOARD_DURATION_SECONDS, output_format: str = None) -> None:
         """
         Prints different information as status-dashboard.
         :param disable_refresh: Print status only once
         :param banner_version: Prints a reduced version of the status dashboard for login banners
+        :param measure_overhead: Shows the cpu and memory usage of the dashboard itself
+        :param interval: Time in seconds between two collections of the dashboard data
+        :param duration: Time in seconds after which the dashboard exits
+        :param output_format: "json" or "openmetrics" to print the status machine-readable instead of the dashboard
         """
+        if output_format is not None:
+            self.__print_machine_readable_status(output_format)
+            return
+        if banner_version:
+            # The login banner is rendered from a pre-computed snapshot, without any network or docker requests
+            import smartmonitoring_cli.helpers.banner_helper as bh
+            bh.print_logon_banner(self.cfh.get_banner_snapshot())
+            return
+        import smartmonitoring_cli.helpers.cli_helper as cli
+        from smartmonitoring_cli.handlers.agent_handler import AgentClient
         cli.print_logo()
         if self.__check_if_deployed():
             config, manifest = self.cfh.get_installed_stack()
-            if not banner_version:
-                cli.print_system_status(self.cfh, config, manifest)
-                cli.print_live_updating_tables(disable_refresh, manifest.containers)
-            else:
-                cli.print_logon_banner(config, manifest)
+            agent = AgentClient(self.agent_socket)
+            cli.print_system_status(self.cfh, config, manifest)
+            cli.print_live_updating_tables(disable_refresh, manifest.containers,
+                                           agent if agent.is_running() else None, measure_overhead, interval, duration)
         else:
-            if not banner_version:
-                cli.print_system_status(self.cfh)
-                cli.print_live_updating_tables(disable_refresh)
+            cli.print_system_status(self.cfh)
+            cli.print_live_updating_tables(disable_refresh, measure_overhead=measure_overhead, interval=interval,
+                                           duration=duration)
+
+    def __print_machine_readable_status(self, output_format: str) -> None:
+        """
+        Prints the status as one json document or in the openmetrics text format. Nothing is rendered and the ip
+        addresses are taken from their cache, so that the output is cheap enough to be scraped every few seconds.
+        :param output_format: "json" or "openmetrics"
+        """
+        import smartmonitoring_cli.helpers.status_helper as sh
+        from smartmonitoring_cli.handlers.agent_handler import AgentClient
+        from smartmonitoring_cli.handlers.host_metrics_handler import HostMetricsSampler
+        config, manifest, statistics = None, None, None
+        if self.__check_if_deployed():
+            config, manifest = self.cfh.get_installed_stack()
+            agent = AgentClient(self.agent_socket)
+            statistics = sh.ContainerStatistics(manifest.containers, agent if agent.is_running() else None)
+        # Without an agent a docker client is needed anyway, with an agent the default data-root avoids importing it
+        docker_root = statistics.get_docker_root_dir() if statistics is not None and statistics.agent is None \
+            else cs.DOCKER_DEFAULT_ROOT_DIR
+        sampler = HostMetricsSampler(docker_root)
+        try:
+            containers = statistics.collect() if statistics is not None else None
+        finally:
+            if statistics is not None: statistics.close()
+        sampler.sample()
+        system = sh.compose_system_status(self.cfh, config, manifest)
+        report = sh.compose_status_report(system, sampler.get_values(), containers)
+        print(sh.format_json(report) if output_format == "json" else sh.format_openmetrics(report), end="")
+
+    def refresh_banner_snapshot(self) -> None:
+        """Re-computes the snapshot the login banner is rendered from. Errors are logged but not raised."""
+        import smartmonitoring_cli.helpers.banner_helper as bh
+        import smartmonitoring_cli.helpers.cli_helper as cli
+        from smartmonitoring_cli.handlers.address_handler import AddressResolver
+        lg.debug("Refreshing login banner snapshot...")
+        try:
+            if self.__check_if_deployed():
+                config, manifest = self.cfh.get_installed_stack()
+                status = self.cfh.get_status()["status"] if self.status_file.exists() else "Deployed"
+                version, channel = manifest.package_version, config.update_channel
             else:
-                cli.print_logon_banner()
+                status, version, channel = "Not deployed", "-", "-"
+            resolver = AddressResolver(self.cfh)
+            snapshot = bh.compose_banner_snapshot(cli.render_logo(), status, version, channel,
+                                                  resolver.get_local_ip_address(),
+                                                  resolver.get_public_ip_address(wait=True))
+            self.cfh.save_banner_snapshot(snapshot)
+        except Exception as e:
+            lg.warning(f'Error refreshing login banner snapshot: {e}')
 
     def restart_application(self) -> None:
         """Restarts all containers of the current deployment."""
         if not self.__check_preconditions("restart skipped"):
             return
 
+        from smartmonitoring_cli.handlers.journal_handler import DeploymentInProgress
         lg.info("Restarting smartmonitoring deployment")
         config, manifest = self.cfh.get_installed_stack()
-        dock = DockerHandler()
-        dock.restart_containers(manifest.containers)
+        dock = self.__get_docker_handler()
+        # The restart is journaled, so that the events watcher does not record the containers as crashed
+        try:
+            self.cfh.journal.begin("restart", {"containers": [container.name for container in manifest.containers]})
+        except DeploymentInProgress as e:
+            lg.warning(f'A Deployment is already in progress. Please try again later. {e}')
+            return
+        try:
+            dock.restart_containers(manifest.containers)
+        finally:
+            self.cfh.journal.finish()
         lg.info("All containers restarted successfully")
 
     def deploy_application(self) -> None:
         """Creates the initial Deployment."""
+        if self.__check_if_deployment_in_progress():
+            lg.warning("A Deployment is already in progress. Please try again later.")
+            return
         if self.__check_if_deployed():
             lg.warning("SmartMonitoring is already deployed, deployment skipped")
             return
         if not hf.check_internet_connection():
             lg.error("No internet connection, deployment skipped")
             return
+        import smartmonitoring_cli.helpers.deployment_helper as deph
+        from smartmonitoring_cli.handlers.docker_handler import ContainerCreateError, ImageDoesNotExist
+        from smartmonitoring_cli.models.local_config import LocalConfig
+        from smartmonitoring_cli.models.update_manifest import UpdateManifest
         lg.info("Performing SmartMonitoring deployment to local docker host")
-        lg.info("Retrieving local configuration and update manifest...")
-        config, manifest = self.cfh.get_config_and_manifest()
-        dock = DockerHandler()
+        from smartmonitoring_cli.handlers.journal_handler import DeploymentInProgress
+        try:
+            interrupted = self.cfh.journal.get_interrupted()
+            if interrupted is not None and interrupted["operation"] == "deploy":
+                lg.warning(f'Resuming deployment of process {interrupted["pid"]} that was interrupted after '
+                           f'{interrupted["completed_steps"]} completed steps')
+                data = self.cfh.journal.resume()["data"]
+                config, manifest = LocalConfig.from_dict(data["config"]), UpdateManifest.from_dict(data["manifest"])
+            else:
+                lg.info("Retrieving local configuration and update manifest...")
+                config, manifest = self.cfh.get_config_and_manifest()
+                self.cfh.journal.begin("deploy", {"config": config.to_dict(), "manifest": manifest.to_dict()})
+        except DeploymentInProgress as e:
+            # Another process has started the deployment in the meantime, its status is left untouched
+            lg.warning(f'A Deployment is already in progress. Please try again later. {e}')
+            return
+        dock = self.__get_docker_handler()
         self.cfh.save_status("Deploying")
         try:
             self.cfh.validate_config_against_manifest(config, manifest)
+            self.cfh.register_image_version(manifest, installed=False)
             dock.pull_images(manifest.containers)
             dock.create_inter_network()
             deph.install_deployment(config, manifest, dock, self.cfh)
-            self.cfh.save_installed_stack(config, manifest)
-            self.cfh.save_status("Deployed", upd_channel=config.update_channel, pkg_version=manifest.package_version)
+            self.cfh.save_installed_stack(config, manifest, deph.compose_spec_hashes(config, manifest, self.cfh))
+            self.cfh.journal.finish()
+            self.cfh.register_image_version(manifest)
+            self.cfh.save_status("Deployed", upd_channel=config.update_channel, pkg_version=manifest.package_version,
+                                 metrics=deph.compose_run_metrics("deploy", "Deployed"))
             lg.info("SmartMonitoring application successfully deployed")
         except (ContainerCreateError, ImageDoesNotExist, ValueNotFoundInConfig) as e:
-            self.cfh.save_status(status="DeploymentError", error_msg=str(e))
+            self.cfh.journal.finish()
+            self.cfh.save_status(status="DeploymentError", error_msg=str(e),
+                                 metrics=deph.compose_run_metrics("deploy", "DeploymentError"))
             raise e
+        except Exception as e:
+            # The journal is kept, the deployment can be resumed by running deploy again
+            self.cfh.journal.interrupt()
+            lg.error(f'Deployment interrupted by an unexpected error: {e}')
+            self.cfh.save_status(status="DeploymentError", error_msg=str(e),
+                                 metrics=deph.compose_run_metrics("deploy", "DeploymentError"))
+            raise e
+        finally:
+            self.refresh_banner_snapshot()
 
     def remove_application(self) -> None:
         """Removes the current Deployment."""
         if not self.__check_preconditions("removal skipped"):
             return
+        import smartmonitoring_cli.helpers.deployment_helper as deph
         lg.info("Removing SmartMonitoring deployment from local docker host")
         config, manifest = self.cfh.get_installed_stack()
-        dock = DockerHandler()
+        dock = self.__get_docker_handler()
         deph.uninstall_application(manifest, dock)
+        dock.remove_volumes(manifest.containers)
         dock.remove_inter_network()
-        dock.perform_cleanup()
+        deph.perform_cleanup(self.cfh, dock, remove_all=True)
         self.cfh.remove_var_data_files()
         lg.info("SmartMonitoring application successfully removed")
 
@@ -227,25 +432,108 @@ class MainLogic:
         Updates the current Deployment if a new version is available in the manifest.
         :param force: Applies the manifest version even if the version is not newer than the current version
         """
-        if not self.__check_preconditions("update skipped"):
+        if not self.__check_preconditions("update skipped", on_interrupted="resume"):
             return
         if not hf.check_internet_connection():
             lg.error("No internet connection, update skipped")
             return
+        import smartmonitoring_cli.helpers.deployment_helper as deph
 
-        lg.info("Retrieving local configuration and update manifest...")
+        # The login banner is refreshed on every update run, also if no newer version is available
+        try:
+            lg.info("Retrieving local configuration and update manifest...")
+            config, current_manifest = self.cfh.get_installed_stack()
+            new_manifest = self.cfh.get_update_manifest(config)
+
+            if not force and not self.__check_version_is_newer(current_manifest.package_version,
+                                                               new_manifest.package_version):
+                lg.warning("No newer SmartMonitoring Deployment is available, update skipped")
+                return
+            if force or self.__check_version_is_newer(current_manifest.package_version, new_manifest.package_version):
+                lg.info(
+                    f"Update SmartMonitoring Deployment from {current_manifest.package_version} to {new_manifest.package_version}")
+                record = self.cfh.get_prefetch_record()
+                if record is not None and record["package_version"] == new_manifest.package_version:
+                    lg.info(f'Images of version {new_manifest.package_version} have been prefetched at '
+                            f'{record["prefetched_at"]}')
+                if deph.replace_deployment(config, config, current_manifest, new_manifest, self.cfh,
+                                           self.__get_docker_handler()):
+                    lg.info(f"SmartMonitoring Deployment successfully updated to version {new_manifest.package_version}")
+        finally:
+            self.refresh_banner_snapshot()
+
+    def rollback_application(self) -> None:
+        """
+        Restores the stack that was installed before the current one. Only local images are used, neither the update
+        manifest nor any image is downloaded. If a replacement of the deployment has been interrupted, it is discarded
+        instead and the stack that was running before it is restored.
+        """
+        if not self.__check_preconditions("rollback skipped", on_interrupted="ignore"):
+            return
+        import time
+        import smartmonitoring_cli.helpers.deployment_helper as deph
+        start = time.perf_counter()
+        if self.__check_if_deployment_interrupted():
+            self.__discard_interrupted_deployment()
+            return
+        previous = self.cfh.get_previous_stack()
+        if previous is None:
+            lg.error("No previous deployment found, rollback skipped")
+            return
         config, current_manifest = self.cfh.get_installed_stack()
-        new_manifest = self.cfh.get_update_manifest(config)
+        previous_config, previous_manifest = previous
+        dock = self.__get_docker_handler()
+        missing = dock.get_missing_images(previous_manifest.containers)
+        if missing:
+            lg.error(f'The following images of version {previous_manifest.package_version} are no longer available '
+                     f'locally: {missing}, rollback skipped')
+            return
+        lg.info(f'Rolling back SmartMonitoring Deployment from {current_manifest.package_version} to '
+                f'{previous_manifest.package_version}')
+        try:
+            if deph.replace_deployment(config, previous_config, current_manifest, previous_manifest, self.cfh, dock):
+                lg.info(f'SmartMonitoring Deployment successfully rolled back to version '
+                        f'{previous_manifest.package_version} in {round(time.perf_counter() - start, 2)}s')
+        finally:
+            self.refresh_banner_snapshot()
 
-        if not force and not self.__check_version_is_newer(current_manifest.package_version,
-                                                           new_manifest.package_version):
-            lg.warning("No newer SmartMonitoring Deployment is available, update skipped")
+    def watch_events(self) -> None:
+        """
+        Watches the docker events of the containers and records crashes, oom kills, restarts and health changes in the
+        status file. A running agent already watches the events, therefore the watcher is not started twice.
+        """
+        from smartmonitoring_cli.handlers.agent_handler import AgentClient
+        from smartmonitoring_cli.handlers.events_handler import EventsWatcher
+        if AgentClient(self.agent_socket).is_running():
+            lg.warning("SmartMonitoring agent is running and already watches the container events, watcher skipped")
             return
-        if force or self.__check_version_is_newer(current_manifest.package_version, new_manifest.package_version):
-            lg.info(
-                f"Update SmartMonitoring Deployment from {current_manifest.package_version} to {new_manifest.package_version}")
-            if deph.replace_deployment(config, config, current_manifest, new_manifest, self.cfh, DockerHandler()):
-                lg.info(f"SmartMonitoring Deployment successfully updated to version {new_manifest.package_version}")
+        import signal
+
+        def terminate(signum, frame):
+            raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, terminate)
+        EventsWatcher(self.__get_docker_handler(), self.cfh).run()
+
+    def prefetch_images(self) -> None:
+        """
+        Pulls all missing images of the update manifest in advance, so that a later update does not have to download
+        anything during the maintenance action.
+        """
+        if not self.__check_if_deployed():
+            lg.warning("SmartMonitoring is not deployed, prefetch skipped")
+            return
+        if not hf.check_internet_connection():
+            lg.error("No internet connection, prefetch skipped")
+            return
+        lg.info("Retrieving local configuration and update manifest...")
+        config, current_manifest = self.cfh.get_installed_stack()
+        new_manifest = self.cfh.get_update_manifest(config)
+        images = list(dict.fromkeys(container.image for container in new_manifest.containers))
+        pulled = self.__get_docker_handler().pull_images(new_manifest.containers)
+        self.cfh.save_prefetch_record(new_manifest.package_version, config.update_channel, images, pulled)
+        lg.info(f'All {len(images)} images of version {new_manifest.package_version} are present, '
+                f'{len(pulled)} of them have been pulled')
 
     def __check_version_is_newer(self, current_version: str, new_version: str) -> bool:
         """
@@ -254,6 +542,7 @@ class MainLogic:
         :param new_version: String of new version
         :return: True if the new version is newer, False otherwise
         """
+        from packaging import version
         if version.parse(current_version) < version.parse(new_version):
             lg.debug(f"Current version: {current_version} is older than new version: {new_version}")
             return True
@@ -280,40 +569,101 @@ class MainLogic:
 
     def __check_if_deployment_in_progress(self) -> bool:
         """
-        Checks if the application is currently being deployed.
-        If the status is "Deploying" for more than the specified time, the deployment is considered to
-        be stuck and False is returned.
+        Checks if the application is currently being deployed by a running process, based on the owner of the
+        deployment journal.
         :return: True if the application is currently being deployed, False otherwise
         """
         lg.debug("Checking if SmartMonitoring deployment is currently in progress...")
-        if not self.status_file.exists():
-            lg.debug("No deployment in progress")
-            return False
+        if self.cfh.journal.is_owner_alive():
+            lg.debug(f'Deployment currently in progress, journal: {self.cfh.journal.journal_file}')
+            return True
+        lg.debug("No deployment in progress")
+        return False
 
-        data = self.cfh.get_status()
-        if data["status"] != "Deploying":
-            lg.debug("No deployment in progress...")
-            return False
+    def __check_if_deployment_interrupted(self) -> bool:
+        """
+        Checks if a replacement of the deployment has been interrupted and not been resumed yet
+        :return: True if an interrupted replacement exists, False otherwise
+        """
+        interrupted = self.cfh.journal.get_interrupted()
+        return interrupted is not None and interrupted["operation"] == "replace"
 
-        if data["status"] == "Deploying":
-            error_time = datetime.strptime(data["deployment_start"], "%Y-%m-%d %H:%M:%S") + timedelta(minutes=cs.DEPLOYMENT_REPAIR_TIMEOUT_MINUTES)
-            if error_time < datetime.now():
-                lg.debug(f"Last deployment started over {cs.DEPLOYMENT_REPAIR_TIMEOUT_MINUTES} Minutes ago, therefore "
-                         f"it is considered to be stuck and no longer in progress")
-                return False
-        lg.debug(f'Deployment currently in progress, started at: {data["deployment_start"]}')
-        return True
+    def __resume_interrupted_deployment(self) -> None:
+        """
+        Resumes a replacement of the deployment whose process died, from the last completed step of its journal.
+        If the replacement has already been resumed too often, its journal is discarded.
+        """
+        interrupted = self.cfh.journal.get_interrupted()
+        if interrupted is None or interrupted["operation"] != "replace":
+            return
+        import smartmonitoring_cli.helpers.deployment_helper as deph
+        from smartmonitoring_cli.models.local_config import LocalConfig
+        from smartmonitoring_cli.models.update_manifest import UpdateManifest
+        if interrupted["resumes"] >= cs.DEPLOYMENT_MAX_RESUMES:
+            lg.error(f'Interrupted deployment from {interrupted["time"]} has already been resumed '
+                     f'{interrupted["resumes"]} times, it is discarded')
+            self.cfh.journal.resume()
+            self.cfh.journal.finish()
+            self.cfh.save_status("DeploymentError", error_msg="Interrupted deployment could not be resumed")
+            return
+        lg.warning(f'Resuming deployment of process {interrupted["pid"]} that was interrupted after '
+                   f'{interrupted["completed_steps"]} completed steps')
+        data = self.cfh.journal.resume()["data"]
+        try:
+            deph.replace_deployment(LocalConfig.from_dict(data["current_config"]),
+                                    LocalConfig.from_dict(data["new_config"]),
+                                    UpdateManifest.from_dict(data["current_manifest"]),
+                                    UpdateManifest.from_dict(data["new_manifest"]),
+                                    self.cfh, self.__get_docker_handler())
+        finally:
+            self.refresh_banner_snapshot()
+
+    def __discard_interrupted_deployment(self) -> None:
+        """
+        Discards an interrupted replacement of the deployment and restores the stack that was running before it.
+        The containers the replacement has touched are removed and recreated from the installed stack, which is not
+        changed until a replacement has finished.
+        """
+        import smartmonitoring_cli.helpers.deployment_helper as deph
+        from smartmonitoring_cli.handlers.journal_handler import DeploymentInProgress
+        dock = self.__get_docker_handler()
+        try:
+            deph.discard_interrupted_replacement(self.cfh, dock)
+        except DeploymentInProgress as e:
+            lg.warning(f'A Deployment is already in progress. Please try again later. {e}')
+            return
+        config, manifest = self.cfh.get_installed_stack()
+        lg.info(f'Restoring SmartMonitoring Deployment {manifest.package_version} that was running before the '
+                f'interrupted deployment')
+        try:
+            deph.replace_deployment(config, config, manifest, manifest, self.cfh, dock)
+        finally:
+            self.refresh_banner_snapshot()
 
-    def __check_preconditions(self, message: str) -> bool:
+    def __check_preconditions(self, message: str, on_interrupted: str = "skip") -> bool:
         """
-        Checks if the preconditions for the deployment are met.
+        Checks if the preconditions for the deployment are met. An interrupted replacement of the deployment is only
+        resumed if this is requested, other actions are skipped until it has been resumed or discarded by a rollback.
         :param message: Action that is skipped if the preconditions are not met
+        :param on_interrupted: "resume" an interrupted replacement, "ignore" it if the action handles it itself or
+        "skip" the action if one exists
         :return: True if the preconditions are met, False otherwise
         """
-        if not self.__check_if_deployed():
-            lg.warning(f'SmartMonitoring is not deployed, {message}')
-            return False
+        from smartmonitoring_cli.handlers.journal_handler import DeploymentInProgress
         if self.__check_if_deployment_in_progress():
             lg.warning("A Deployment is already in progress. Please try again later.")
             return False
+        try:
+            if on_interrupted == "resume":
+                self.__resume_interrupted_deployment()
+            elif on_interrupted == "skip" and self.__check_if_deployment_interrupted():
+                lg.warning(f'A Deployment has been interrupted, run update to resume it or rollback to discard it, '
+                           f'{message}')
+                return False
+        except DeploymentInProgress as e:
+            lg.warning(f'A Deployment is already in progress. Please try again later. {e}')
+            return False
+        if not self.__check_if_deployed():
+            lg.warning(f'SmartMonitoring is not deployed, {message}')
+            return False
         return True
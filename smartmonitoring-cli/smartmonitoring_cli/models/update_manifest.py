@@ -122,6 +122,50 @@ class Port:
         return result
 
 
+@dataclass
+class Volume:
+    name: str
+    container_path: str
+
+    @staticmethod
+    def from_dict(obj: Any) -> 'Volume':
+        assert isinstance(obj, dict)
+        name = from_str(obj.get("name"))
+        container_path = from_str(obj.get("container_path"))
+        return Volume(name, container_path)
+
+    def to_dict(self) -> dict:
+        result: dict = {}
+        result["name"] = from_str(self.name)
+        result["container_path"] = from_str(self.container_path)
+        return result
+
+
+@dataclass
+class ReadinessCheck:
+    type: str
+    port: Optional[int] = None
+    pattern: Optional[str] = None
+    timeout: Optional[int] = None
+
+    @staticmethod
+    def from_dict(obj: Any) -> 'ReadinessCheck':
+        assert isinstance(obj, dict)
+        type = from_str(obj.get("type"))
+        port = from_union([from_int, from_none], obj.get("port"))
+        pattern = from_union([from_str, from_none], obj.get("pattern"))
+        timeout = from_union([from_int, from_none], obj.get("timeout"))
+        return ReadinessCheck(type, port, pattern, timeout)
+
+    def to_dict(self) -> dict:
+        result: dict = {}
+        result["type"] = from_str(self.type)
+        result["port"] = from_union([from_int, from_none], self.port)
+        result["pattern"] = from_union([from_str, from_none], self.pattern)
+        result["timeout"] = from_union([from_int, from_none], self.timeout)
+        return result
+
+
 @dataclass
 class ContainerConfig:
     name: str
@@ -132,6 +176,9 @@ class ContainerConfig:
     files: Optional[List[MappedFile]] = None
     ports: Optional[List[Port]] = None
     commands: Optional[List[str]] = None
+    depends_on: Optional[List[str]] = None
+    readiness: Optional[ReadinessCheck] = None
+    volumes: Optional[List[Volume]] = None
 
     @staticmethod
     def from_dict(obj: Any) -> 'ContainerConfig':
@@ -144,7 +191,11 @@ class ContainerConfig:
         files = from_union([lambda x: from_list(MappedFile.from_dict, x), from_none], obj.get("files"))
         ports = from_union([lambda x: from_list(Port.from_dict, x), from_none], obj.get("ports"))
         commands = from_union([lambda x: from_list(from_str, x), from_none], obj.get("commands"))
-        return ContainerConfig(name, hostname, image, privileged, config, files, ports, commands)
+        depends_on = from_union([lambda x: from_list(from_str, x), from_none], obj.get("depends_on"))
+        readiness = from_union([ReadinessCheck.from_dict, from_none], obj.get("readiness"))
+        volumes = from_union([lambda x: from_list(Volume.from_dict, x), from_none], obj.get("volumes"))
+        return ContainerConfig(name, hostname, image, privileged, config, files, ports, commands, depends_on,
+                               readiness, volumes)
 
     def to_dict(self) -> dict:
         result: dict = {}
@@ -156,6 +207,10 @@ class ContainerConfig:
         result["files"] = from_union([lambda x: from_list(lambda x: to_class(MappedFile, x), x), from_none], self.files)
         result["ports"] = from_union([lambda x: from_list(lambda x: to_class(Port, x), x), from_none], self.ports)
         result["commands"] = from_union([lambda x: from_list(from_str, x), from_none], self.commands)
+        result["depends_on"] = from_union([lambda x: from_list(from_str, x), from_none], self.depends_on)
+        result["readiness"] = from_union([lambda x: to_class(ReadinessCheck, x), from_none], self.readiness)
+        result["volumes"] = from_union([lambda x: from_list(lambda x: to_class(Volume, x), x), from_none],
+                                       self.volumes)
         return result
 
 
@@ -0,0 +1,41 @@
+import subprocess
+import sys
+from pathlib import Path
+
+# Dependencies that are only imported by the commands that use them
+HEAVY_MODULES = ["docker", "rich", "yaml", "cerberus", "requests"]
+
+# Max time in milliseconds that importing the CLI entry point may take
+IMPORT_BUDGET_MS = 200
+
+
+def get_import_times() -> dict[str, int]:
+    """
+    Imports the CLI entry point in a fresh interpreter with -X importtime
+    :return: Dict with the module name as key and its cumulative import time in microseconds as value
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import smartmonitoring_cli.cli"],
+                            cwd=Path(__file__).parent.parent, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Only top level imports are not already included in the cumulative time of another module
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative)
+        else:
+            times.setdefault(name.strip(), 0)
+    return times
+
+
+def test_heavy_modules_are_not_imported():
+    times = get_import_times()
+    eager = [name for name in times if name.split(".")[0] in HEAVY_MODULES]
+    assert not eager, f'Imported eagerly by the CLI entry point: {", ".join(eager)}'
+
+
+def test_import_time_within_budget():
+    times = get_import_times()
+    total_ms = sum(cumulative for name, cumulative in times.items() if name.startswith("smartmonitoring_cli")) / 1000
+    assert total_ms <= IMPORT_BUDGET_MS, f'Importing the CLI took {total_ms} ms, budget is {IMPORT_BUDGET_MS} ms'